@@ -0,0 +1,62 @@
+"""Thumbnails and responsive widths for gallery photos.
+
+``render_derivatives`` runs in ProcessPoolExecutor workers, so this module
+only depends on Pillow and the standard library; importing ``server`` in
+every worker would repeat its startup side effects.
+"""
+
+import json
+import os
+from pathlib import Path
+
+from PIL import Image, ImageOps
+
+FORMAT = "WEBP"
+EXTENSION = ".webp"
+MANIFEST = "manifest.json"
+
+
+def _save_atomic(image, path: Path, quality: int):
+    tmp = path.with_name(path.name + ".tmp")
+    image.save(tmp, FORMAT, quality=quality, method=4)
+    os.replace(tmp, path)
+
+
+def render_derivatives(source: str, out_dir: str, widths, thumb_size: int, quality: int) -> dict:
+    """Write WebP derivatives of ``source`` into ``out_dir`` and return its manifest.
+
+    Produces one image per width below the source width (``w320.webp``, ...)
+    and a square ``thumb.webp``. Files that already exist are kept, so only
+    newly configured sizes are rendered. The manifest (source dimensions plus
+    name -> width/height per variant) is written last; its presence means
+    the set is complete.
+    """
+    out = Path(out_dir)
+    out.mkdir(parents=True, exist_ok=True)
+    with Image.open(source) as original:
+        image = ImageOps.exif_transpose(original)
+        image = image.convert("RGBA" if image.mode in ("RGBA", "LA", "P", "PA") else "RGB")
+        width, height = image.size
+
+        variants = {}
+        for target in sorted(set(widths)):
+            if target >= width:
+                continue
+            size = (target, max(1, round(height * target / width)))
+            name = f"w{target}"
+            path = out / (name + EXTENSION)
+            if not path.exists():
+                _save_atomic(image.resize(size, Image.Resampling.LANCZOS), path, quality)
+            variants[name] = {"width": size[0], "height": size[1]}
+
+        thumb = out / ("thumb" + EXTENSION)
+        side = min(thumb_size, width, height)
+        if not thumb.exists():
+            _save_atomic(ImageOps.fit(image, (side, side), Image.Resampling.LANCZOS), thumb, quality)
+        variants["thumb"] = {"width": side, "height": side}
+
+    manifest = {"width": width, "height": height, "variants": variants}
+    tmp = out / (MANIFEST + ".tmp")
+    tmp.write_text(json.dumps(manifest))
+    os.replace(tmp, out / MANIFEST)
+    return manifest
@@ -0,0 +1,424 @@
+#!/usr/bin/env python3
+"""Maintenance commands for the wedding card backend.
+
+Run from the backend directory, e.g. ``python manage.py migrate-inline-photos``.
+Commands read the same settings as the server (.env, MONGO_URL, DB_NAME,
+JSON_STORE_MODE, BLOB_DIR). In journal mode the server owns the JSON files,
+so stop it before running a command that writes to them.
+"""
+
+import asyncio
+import json
+import time
+from pathlib import Path
+from typing import List, Optional
+
+import typer
+from pydantic import ValidationError
+from pymongo import ReplaceOne, UpdateOne
+from pymongo.errors import BulkWriteError
+
+import server
+
+cli = typer.Typer(no_args_is_help=True)
+
+
+@cli.callback()
+def main():
+    """Maintenance commands for the wedding card backend."""
+
+
+async def connect_mongo() -> bool:
+    """Connect once, without the server's retry loop; False if Mongo is off or down."""
+    if not server.MONGO_ENABLED:
+        return False
+    return await server.connect_to_mongo()
+
+
+async def _migrate_inline_photos(dry_run: bool) -> dict:
+    totals = {"weddings": 0, "photos": 0, "skipped": 0}
+
+    def externalize(wedding):
+        photos = wedding.get("gallery_photos") or []
+        inline = sum(server.decode_inline_photo(photo) is not None for photo in photos)
+        if not inline:
+            return photos, None, 0
+        return photos, (photos if dry_run else server.externalize_inline_photos(photos)), inline
+
+    async def migrate(source, wedding, save):
+        photos, migrated, inline = await asyncio.to_thread(externalize, wedding)
+        if not inline:
+            return
+        if not dry_run and not await save(wedding["id"], photos, migrated):
+            # Edited since we read it; the next write externalizes it anyway.
+            totals["skipped"] += 1
+            typer.echo(f"   {source}: wedding {wedding['id']} changed during migration, skipped")
+            return
+        totals["weddings"] += 1
+        totals["photos"] += inline
+        typer.echo(f"   {source}: wedding {wedding['id']}: {inline} inline photo(s)")
+
+    if await connect_mongo():
+        async def save_mongo(wedding_id, old, new):
+            result = await server.db.weddings.update_one(
+                {"id": wedding_id, "gallery_photos": old},
+                {"$set": {"gallery_photos": new}, "$inc": {"version": 1}},
+            )
+            return result.modified_count == 1
+
+        cursor = server.db.weddings.find(
+            {"gallery_photos": {"$regex": "^data:"}}, {"_id": 0, "id": 1, "gallery_photos": 1}
+        )
+        async for wedding in cursor:
+            await migrate("mongo", wedding, save_mongo)
+        await server.close_mongo_connection()
+
+    store = server.weddings_store
+
+    async def save_json(wedding_id, old, new):
+        updated = await store.update_one_async(
+            "id", wedding_id, {"$set": {"gallery_photos": new}, "$inc": {"version": 1}},
+            where=lambda doc: doc.get("gallery_photos") == old,
+        )
+        return updated is not None
+
+    await asyncio.to_thread(store.load)
+    for wedding in (await asyncio.to_thread(store.all)).values():
+        await migrate("json", wedding, save_json)
+    await asyncio.to_thread(store.close)
+    return totals
+
+
+@cli.command("migrate-inline-photos")
+def migrate_inline_photos(
+    dry_run: bool = typer.Option(False, "--dry-run", help="Only report what would be migrated."),
+):
+    """Move inline data-URL gallery photos into the blob store.
+
+    Migrates MongoDB (when reachable) and the JSON fallback file; the
+    documents keep /api/blobs/<sha256> URLs in place of the image data.
+    """
+    totals = asyncio.run(_migrate_inline_photos(dry_run))
+    verb = "would move" if dry_run else "moved"
+    typer.echo(f"✅ {verb} {totals['photos']} photo(s) from {totals['weddings']} wedding(s)"
+               f" into {server.BLOB_DIR}, {totals['skipped']} skipped")
+
+
+# JSON file -> MongoDB migration
+MIGRATION_SOURCES = {
+    # collection -> (file, model, required fields that cannot be made up)
+    "users": (server.USERS_FILE, server.User, ("username", "password")),
+    "weddings": (server.WEDDINGS_FILE, server.WeddingData, ("user_id",)),
+}
+DEFAULT_CHECKPOINT = server.ROOT_DIR / ".migrate-json-checkpoint.json"
+
+
+def iter_json_object(path: Path, chunk_size: int = 1 << 20):
+    """Yield the (key, value) pairs of a top-level JSON object.
+
+    The file is read in chunks and each value is parsed with ``raw_decode``
+    as soon as it is complete, so memory is bounded by the largest record,
+    not the file size.
+    """
+    decoder = json.JSONDecoder()
+    with open(path, encoding="utf-8") as f:
+        buffer, pos, eof = "", 0, False
+
+        def more():
+            nonlocal buffer, pos, eof
+            chunk = f.read(chunk_size)
+            eof = not chunk
+            buffer, pos = buffer[pos:] + chunk, 0
+
+        def skip_whitespace():
+            nonlocal pos
+            while True:
+                while pos < len(buffer) and buffer[pos] in " \t\r\n":
+                    pos += 1
+                if pos < len(buffer) or eof:
+                    return
+                more()
+
+        def expect(char):
+            nonlocal pos
+            skip_whitespace()
+            if pos >= len(buffer) or buffer[pos] != char:
+                raise ValueError(f"{path.name}: expected {char!r} at offset {f.tell() - len(buffer) + pos}")
+            pos += 1
+
+        def decode():
+            nonlocal pos
+            skip_whitespace()
+            while True:
+                try:
+                    value, end = decoder.raw_decode(buffer, pos)
+                    # A value ending at the buffer edge may continue in the next chunk
+                    if end < len(buffer) or eof:
+                        pos = end
+                        return value
+                except json.JSONDecodeError:
+                    if eof:
+                        raise
+                more()
+
+        expect("{")
+        skip_whitespace()
+        if pos < len(buffer) and buffer[pos] == "}":
+            return
+        while True:
+            key = decode()
+            expect(":")
+            yield key, decode()
+            skip_whitespace()
+            if pos < len(buffer) and buffer[pos] == "}":
+                return
+            expect(",")
+
+
+def iter_json_store(path: Path):
+    """Documents of a JSON fallback file: snapshot first, then journaled puts.
+
+    Journal records supersede the snapshot copy of the same id, as on load.
+    Only the journals (bounded by compaction) are held in memory.
+    """
+    latest = {}
+    for _, journal_path in server.JournalWriter.existing_journals(path):
+        with open(journal_path, "rb") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue  # torn final record
+                if record.get("op") == "put":
+                    latest.pop(record["doc"]["id"], None)
+                    latest[record["doc"]["id"]] = record["doc"]
+    if path.exists():
+        for doc_id, doc in iter_json_object(path):
+            if doc_id not in latest:
+                yield doc
+    yield from latest.values()
+
+
+def source_signature(path: Path) -> list:
+    files = [path] + [p for _, p in server.JournalWriter.existing_journals(path)]
+    return [[p.name, p.stat().st_size, p.stat().st_mtime_ns] for p in files if p.exists()]
+
+
+def normalize(model, doc, required=()):
+    """Validate ``doc`` against ``model``, repairing what can be repaired.
+
+    Returns (document, fixed) or (None, reason). Unknown keys (such as the
+    session_id the old full-replace update saved) and nulls in fields with
+    a non-null default are dropped; other required text fields missing from
+    partial documents become "". The ``required`` fields are never made up.
+    """
+    if not isinstance(doc, dict) or not doc.get("id"):
+        return None, "missing id"
+    data, fixed = {}, False
+    for key, value in doc.items():
+        field = model.model_fields.get(key)
+        if field is None or (value is None and field.default is not None):
+            fixed = True
+            continue
+        data[key] = value
+    for key, field in model.model_fields.items():
+        if key not in data and key not in required and field.is_required() and field.annotation is str:
+            data[key] = ""
+            fixed = True
+    if "created_at" not in data and "updated_at" in data:
+        data["created_at"] = data["updated_at"]
+        fixed = True
+    try:
+        return model.model_validate(data).model_dump(), fixed
+    except ValidationError as e:
+        return None, "; ".join(f"{'.'.join(map(str, err['loc']))}: {err['msg']}" for err in e.errors())
+
+
+def migration_op(collection: str, doc: dict):
+    if collection == "users":
+        # Users never change in place, and Mongo may already hold a newer
+        # copy (e.g. a rehashed password): only insert missing ones.
+        return UpdateOne({"id": doc["id"]}, {"$setOnInsert": doc}, upsert=True)
+    # Same guard as the fallback replay: never overwrite a newer version.
+    return ReplaceOne(
+        {"id": doc["id"], "$or": [{"version": {"$lte": doc["version"]}}, {"version": {"$exists": False}}]},
+        doc, upsert=True,
+    )
+
+
+async def _migrate_collection(collection, batch_size, concurrency, ordered, dry_run, skip, save_checkpoint):
+    path, model, required = MIGRATION_SOURCES[collection]
+    stats = {"read": 0, "skipped": skip, "invalid": 0, "fixed": 0, "written": 0, "conflicts": 0, "errors": 0,
+             "aborted": 0}
+    slots = asyncio.Semaphore(concurrency)
+    tasks = set()
+    done_batches, committed = {}, {"next": 0, "records": skip}
+    started = time.perf_counter()
+
+    async def write(batch_no, ops, end):
+        try:
+            result = await server.db[collection].bulk_write(ops, ordered=ordered)
+            stats["written"] += result.upserted_count + result.matched_count
+        except BulkWriteError as e:
+            written = e.details.get("nUpserted", 0) + e.details.get("nMatched", 0)
+            errors = e.details.get("writeErrors", [])
+            stats["written"] += written
+            for error in errors:
+                # 11000: a newer wedding version or a duplicate username is in Mongo
+                stats["conflicts" if error.get("code") == 11000 else "errors"] += 1
+            # An ordered batch stops at its first error
+            stats["aborted"] += len(ops) - written - len(errors)
+        finally:
+            slots.release()
+        # The checkpoint only moves past batches that are all written
+        done_batches[batch_no] = end
+        while committed["next"] in done_batches:
+            committed["records"] = done_batches.pop(committed["next"])
+            committed["next"] += 1
+        save_checkpoint(committed["records"])
+
+    def report_invalid(position, reason):
+        stats["invalid"] += 1
+        if stats["invalid"] <= 20:
+            typer.echo(f"   {collection} record {position}: skipped ({reason})")
+
+    batch, batch_no, position = [], 0, 0
+    for raw in iter_json_store(path):
+        position += 1
+        if position <= skip:
+            continue
+        stats["read"] += 1
+        doc, fixed = normalize(model, raw, required)
+        if doc is None:
+            report_invalid(position, fixed)
+            continue
+        stats["fixed"] += fixed
+        if dry_run:
+            continue
+        batch.append(migration_op(collection, doc))
+        if len(batch) >= batch_size:
+            await slots.acquire()
+            tasks.add(asyncio.create_task(write(batch_no, batch, position)))
+            batch, batch_no = [], batch_no + 1
+            tasks = {t for t in tasks if not t.done()}
+    if batch:
+        await slots.acquire()
+        tasks.add(asyncio.create_task(write(batch_no, batch, position)))
+    await asyncio.gather(*tasks)
+
+    seconds = time.perf_counter() - started
+    stats["seconds"] = round(seconds, 3)
+    stats["docs_per_second"] = round(stats["read"] / seconds, 1) if seconds else 0.0
+    return stats
+
+
+async def _migrate_json_to_mongo(collections, batch_size, concurrency, ordered, dry_run, resume, checkpoint_path):
+    if not dry_run and not await connect_mongo():
+        typer.echo("❌ Could not connect to MongoDB (check MONGO_URL)", err=True)
+        raise typer.Exit(1)
+
+    checkpoint = {}
+    if resume and checkpoint_path.exists():
+        checkpoint = json.loads(checkpoint_path.read_text())
+
+    results = {}
+    try:
+        for collection in collections:
+            path = MIGRATION_SOURCES[collection][0]
+            signature = source_signature(path)
+            skip = 0
+            previous = checkpoint.get(collection)
+            if previous:
+                if previous["signature"] == signature:
+                    skip = previous["committed"]
+                else:
+                    typer.echo(f"   {collection}: {path.name} changed since the checkpoint, starting over")
+
+            def save_checkpoint(records, collection=collection, signature=signature):
+                if dry_run:
+                    return
+                checkpoint[collection] = {"signature": signature, "committed": records}
+                server.save_json_file(checkpoint_path, checkpoint)
+
+            typer.echo(f"🚚 {collection}: {path.name}" + (f" (resuming after record {skip})" if skip else ""))
+            stats = await _migrate_collection(
+                collection, batch_size, concurrency, ordered, dry_run, skip, save_checkpoint
+            )
+            results[collection] = stats
+            typer.echo(f"   {collection}: read {stats['read']}, fixed {stats['fixed']}, invalid {stats['invalid']}, "
+                       f"written {stats['written']}, conflicts {stats['conflicts']}, errors {stats['errors']}, "
+                       f"aborted {stats['aborted']} "
+                       f"in {stats['seconds']}s ({stats['docs_per_second']} docs/s)")
+    finally:
+        if not dry_run:
+            await server.close_mongo_connection()
+    return results
+
+
+@cli.command("migrate-json-to-mongo")
+def migrate_json_to_mongo(
+    collections: List[str] = typer.Option(
+        ["users", "weddings"], "--collection", "-c", help="Collection(s) to migrate."
+    ),
+    batch_size: int = typer.Option(500, min=1, help="Documents per bulk_write."),
+    concurrency: int = typer.Option(4, min=1, help="bulk_write batches in flight."),
+    ordered: bool = typer.Option(
+        False, "--ordered/--unordered",
+        help="Ordered batches stop at their first error; use --concurrency 1 for a strictly ordered run.",
+    ),
+    dry_run: bool = typer.Option(False, "--dry-run", help="Only read and validate; write nothing."),
+    resume: bool = typer.Option(False, "--resume", help="Skip the records committed by the last run."),
+    checkpoint: Path = typer.Option(DEFAULT_CHECKPOINT, help="Where --resume progress is kept."),
+    mongo_url: Optional[str] = typer.Option(None, help="Defaults to MONGO_URL."),
+):
+    """Copy users.json/weddings.json (and their journals) into MongoDB.
+
+    Records are streamed from the files, normalized to the User/WeddingData
+    models and upserted by id. Weddings only replace a Mongo copy with the
+    same or an older version; users are only inserted if missing.
+    """
+    unknown = set(collections) - MIGRATION_SOURCES.keys()
+    if unknown:
+        raise typer.BadParameter(f"unknown collection(s): {', '.join(sorted(unknown))}")
+    if mongo_url:
+        server.MONGO_URL = mongo_url
+        server.MONGO_ENABLED = True
+    results = asyncio.run(_migrate_json_to_mongo(
+        collections, batch_size, concurrency, ordered, dry_run, resume, checkpoint
+    ))
+    verb = "checked" if dry_run else "migrated"
+    total = sum(stats["read"] for stats in results.values())
+    typer.echo(f"✅ {verb} {total} record(s)")
+
+
+async def _rebuild_rsvp_stats(wedding_ids) -> dict:
+    results = {}
+    if await connect_mongo():
+        results["mongo"] = await server.rebuild_rsvp_stats_in_mongo(wedding_ids)
+        await server.close_mongo_connection()
+    store = server.rsvp_stats_store
+    results["json"] = await server.rebuild_rsvp_stats_in_json(wedding_ids)
+    await asyncio.to_thread(store.close)
+    return results
+
+
+@cli.command("rebuild-rsvp-stats")
+def rebuild_rsvp_stats(
+    wedding_ids: Optional[List[str]] = typer.Option(
+        None, "--wedding-id", "-w", help="Only recount these weddings (default: all)."
+    ),
+):
+    """Recount the per-wedding RSVP stats from the stored RSVPs.
+
+    The stats are normally kept current incrementally; this repairs them
+    after a crash or a manual edit left them out of step. Rebuilds MongoDB
+    (when reachable) and the JSON fallback files.
+    """
+    results = asyncio.run(_rebuild_rsvp_stats(set(wedding_ids) if wedding_ids else None))
+    for source, count in results.items():
+        typer.echo(f"   {source}: {count} wedding(s) with RSVPs")
+    typer.echo("✅ RSVP stats rebuilt")
+
+
+if __name__ == "__main__":
+    cli()
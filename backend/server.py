@@ -1,57 +1,719 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Depends, status
+from fastapi import FastAPI, APIRouter, HTTPException, Depends, Header, Request, Response, status, UploadFile, File
+from fastapi.responses import JSONResponse, StreamingResponse, FileResponse, RedirectResponse
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
+from starlette.datastructures import Headers, MutableHeaders
 import os
 import logging
+from logging.handlers import QueueHandler, QueueListener
+import atexit
 from pathlib import Path
-from pydantic import BaseModel, Field
-from typing import List, Optional
+from pydantic import BaseModel, Field, TypeAdapter, ValidationError
+from typing import List, Literal, Optional, get_args, get_origin
+from collections import Counter, OrderedDict, deque
+from collections.abc import Hashable
 import uuid
 from datetime import datetime
 import json
+import hashlib
+import hmac
+import secrets
+import base64
+import binascii
+import io
+import re
+import tempfile
+import unicodedata
+import gzip
+import bisect
+import itertools
+import math
+import sqlite3
 from motor.motor_asyncio import AsyncIOMotorClient
 import asyncio
-from bson import ObjectId
+import threading
+import time
+import random
+import queue
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+import multiprocessing
+from bson import ObjectId, Decimal128
+import orjson
+from passlib.context import CryptContext
+from pymongo import DeleteMany, ReplaceOne, ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError, ConnectionFailure, DuplicateKeyError, ExecutionTimeout, WTimeoutError
+
+try:
+    import imaging
+except ImportError:  # Pillow is optional; without it photos are served as uploaded
+    imaging = None
+try:
+    import brotli
+except ImportError:  # brotli is optional; without it only gzip is offered
+    brotli = None
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
+# Configure logging
+# Records are handed to a QueueListener thread, so formatting and stdout
+# writes never run on the event loop. LOG_LEVEL=DEBUG turns on per-lookup
+# events. Only this module's logger gets the handler; the root logger is
+# left to whoever embeds the app (uvicorn, pytest, manage.py).
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO').upper()
+
+class KeyValueFormatter(logging.Formatter):
+    """Appends the structured fields of ``log_event`` records as key=value."""
+
+    @staticmethod
+    def _format_value(value):
+        if isinstance(value, (dict, list, tuple)):
+            return json.dumps(value, default=str, separators=(',', ':'))
+        text = str(value)
+        if not text or any(c in text for c in ' ="'):
+            text = json.dumps(text)
+        return text
+
+    def formatMessage(self, record):
+        message = super().formatMessage(record)
+        fields = getattr(record, "fields", None)
+        if fields:
+            message += " " + " ".join(f"{k}={self._format_value(v)}" for k, v in fields.items())
+        return message
+
+class DeferredQueueHandler(QueueHandler):
+    """QueueHandler that leaves formatting to the listener thread.
+
+    The stock ``prepare`` formats the record in the calling thread, which is
+    exactly the work we want off the event loop. The queue never leaves the
+    process, so the record can be passed through as is.
+    """
+
+    def prepare(self, record):
+        return record
+
+def configure_logging(logger: logging.Logger) -> QueueListener:
+    log_queue = queue.SimpleQueue()
+    stream_handler = logging.StreamHandler()
+    stream_handler.setFormatter(
+        KeyValueFormatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    )
+    listener = QueueListener(log_queue, stream_handler, respect_handler_level=True)
+    logger.handlers = [DeferredQueueHandler(log_queue)]
+    logger.setLevel(LOG_LEVEL)
+    logger.propagate = False
+    listener.start()
+    atexit.register(listener.stop)
+    return listener
+
+logger = logging.getLogger(__name__)
+log_listener = configure_logging(logger)
+
+def log_event(level: int, event: str, **fields):
+    """Log a structured ``event`` with key/value ``fields``.
+
+    The level check comes first so disabled events cost one comparison.
+    """
+    if logger.isEnabledFor(level):
+        logger.log(level, event, extra={"fields": fields})
+
 # MongoDB setup
 MONGO_URL = os.getenv('MONGO_URL', 'mongodb://localhost:27017')
 DB_NAME = os.getenv('DB_NAME', 'weddingcard')
 
+def _env_bool(value: str) -> bool:
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+def _env_write_concern(value: str):
+    return int(value) if value.isdigit() else value
+
+# Optional Motor client tuning: (env var, client option, parser). Unset
+# variables keep the driver defaults; size MONGO_MAX_POOL_SIZE to the
+# number of concurrent requests a worker is expected to serve.
+MONGO_CLIENT_ENV_OPTIONS = [
+    ('MONGO_MAX_POOL_SIZE', 'maxPoolSize', int),
+    ('MONGO_MIN_POOL_SIZE', 'minPoolSize', int),
+    ('MONGO_MAX_IDLE_TIME_MS', 'maxIdleTimeMS', int),
+    ('MONGO_WAIT_QUEUE_TIMEOUT_MS', 'waitQueueTimeoutMS', int),
+    ('MONGO_SERVER_SELECTION_TIMEOUT_MS', 'serverSelectionTimeoutMS', int),
+    ('MONGO_CONNECT_TIMEOUT_MS', 'connectTimeoutMS', int),
+    ('MONGO_SOCKET_TIMEOUT_MS', 'socketTimeoutMS', int),
+    ('MONGO_COMPRESSORS', 'compressors', str),
+    ('MONGO_READ_PREFERENCE', 'readPreference', str),
+    ('MONGO_READ_CONCERN', 'readConcernLevel', str),
+    ('MONGO_WRITE_CONCERN', 'w', _env_write_concern),
+    ('MONGO_WRITE_CONCERN_JOURNAL', 'journal', _env_bool),
+    ('MONGO_RETRY_WRITES', 'retryWrites', _env_bool),
+    ('MONGO_APP_NAME', 'appname', str),
+]
+
+def mongo_client_options() -> dict:
+    options = {}
+    for env_name, option, parse in MONGO_CLIENT_ENV_OPTIONS:
+        value = os.getenv(env_name)
+        if value:
+            options[option] = parse(value)
+    return options
+
+# Indexes the query helpers rely on: (collection, keys, options).
+# create_index is idempotent, so these are (re)applied on every connect.
+MONGO_INDEXES = [
+    ("users", [("id", 1)], {"unique": True}),
+    # Login and registration look users up by username.
+    ("users", [("username", 1)], {"unique": True}),
+    ("weddings", [("id", 1)], {"unique": True}),
+    # One wedding per user; also what makes concurrent creates safe.
+    ("weddings", [("user_id", 1)], {"unique": True}),
+    ("weddings", [("custom_url", 1)], {}),
+    ("rsvps", [("id", 1)], {"unique": True}),
+    # The owner's RSVP listing pages through this in order.
+    ("rsvps", [("wedding_id", 1), ("created_at", 1), ("id", 1)], {}),
+    # One stats document per wedding, keyed by the wedding id
+    ("rsvp_stats", [("id", 1)], {"unique": True}),
+    # Slug registry: the slug is the id, so each one has a single owner
+    ("slugs", [("id", 1)], {"unique": True}),
+    ("slugs", [("wedding_id", 1)], {}),
+    ("guestbook", [("id", 1)], {"unique": True}),
+    # Guestbook pages are read newest first
+    ("guestbook", [("wedding_id", 1), ("created_at", -1), ("id", -1)], {}),
+]
+
+# Representative queries whose plans are logged with LOG_LEVEL=DEBUG.
+MONGO_EXPLAIN_QUERIES = [
+    ("users", {"id": ""}),
+    ("users", {"username": ""}),
+    ("weddings", {"id": ""}),
+    ("weddings", {"user_id": ""}),
+    ("weddings", {"custom_url": ""}),
+    ("rsvps", {"wedding_id": ""}),
+    ("guestbook", {"wedding_id": ""}),
+    ("slugs", {"id": ""}),
+]
+
 # MongoDB client
 client = None
 db = None
+# True once connected, indexed and caught up on fallback writes; until then
+# requests are served from the JSON store.
+mongo_ready = False
+# An empty MONGO_URL runs on the JSON store only.
+MONGO_ENABLED = bool(MONGO_URL)
+MONGO_CONNECT_RETRY_INITIAL_SECONDS = float(os.getenv('MONGO_CONNECT_RETRY_INITIAL_SECONDS', '1'))
+MONGO_CONNECT_RETRY_MAX_SECONDS = float(os.getenv('MONGO_CONNECT_RETRY_MAX_SECONDS', '60'))
+# Whether /api/health/ready waits for Mongo, or also reports ready while
+# serving from the JSON fallback.
+READY_REQUIRES_MONGO = os.getenv('READY_REQUIRES_MONGO', 'false').lower() in ('1', 'true', 'yes')
 
 # JSON file for fallback storage
 USERS_FILE = ROOT_DIR / 'users.json'
 WEDDINGS_FILE = ROOT_DIR / 'weddings.json'
+RSVPS_FILE = ROOT_DIR / 'rsvps.json'
+RSVP_STATS_FILE = ROOT_DIR / 'rsvp_stats.json'
+SLUGS_FILE = ROOT_DIR / 'slugs.json'
+# Fallback writes the replay could not apply, one JSON record per line
+REPLAY_CONFLICTS_FILE = Path(os.getenv('REPLAY_CONFLICTS_FILE', ROOT_DIR / 'replay_conflicts.jsonl'))
+# Guestbook entries are only ever appended: guestbook.journal.<n> files
+GUESTBOOK_LOG = ROOT_DIR / 'guestbook'
+# "snapshot" rewrites the whole file on each save; "journal" appends each
+# save to a log that is compacted into the file in the background.
+JSON_STORE_MODE = os.getenv('JSON_STORE_MODE', 'snapshot')
+JSON_JOURNAL_MAX_BATCH = int(os.getenv('JSON_JOURNAL_MAX_BATCH', '512'))
+JSON_COMPACT_INTERVAL_SECONDS = float(os.getenv('JSON_COMPACT_INTERVAL_SECONDS', '30'))
+JSON_COMPACT_MIN_BYTES = int(os.getenv('JSON_COMPACT_MIN_BYTES', str(1024 * 1024)))
 
-# Helper function to convert MongoDB documents to JSON serializable format
-def serialize_mongo_doc(doc):
-    if doc is None:
+# Public wedding read cache
+WEDDING_CACHE_MAX_ENTRIES = int(os.getenv('WEDDING_CACHE_MAX_ENTRIES', '2048'))
+WEDDING_CACHE_TTL_SECONDS = float(os.getenv('WEDDING_CACHE_TTL_SECONDS', '60'))
+# Lets browsers and a caching proxy in front of us absorb repeat reads.
+PUBLIC_CACHE_CONTROL = os.getenv(
+    'PUBLIC_CACHE_CONTROL', 'public, max-age=30, stale-while-revalidate=300'
+)
+
+# Response compression
+COMPRESSION_MIN_BYTES = int(os.getenv('COMPRESSION_MIN_BYTES', '1024'))
+COMPRESSION_GZIP_LEVEL = int(os.getenv('COMPRESSION_GZIP_LEVEL', '6'))
+COMPRESSION_BROTLI_QUALITY = int(os.getenv('COMPRESSION_BROTLI_QUALITY', '5'))
+# Cached public payloads are compressed once per cache entry, so they can
+# afford denser settings than per-request compression. Brotli 11 costs ~100x
+# the CPU of brotli 5 (~45 ms for a typical wedding, see
+# benchmarks/bench_compression.py), so the dense pass runs on
+# PRECOMPRESS_WORKERS background threads; until it lands, the payload is
+# served at the per-request settings. At most PRECOMPRESS_MAX_PENDING passes
+# wait; above PRECOMPRESS_MAX_BYTES the per-request settings are final.
+PRECOMPRESS_GZIP_LEVEL = int(os.getenv('PRECOMPRESS_GZIP_LEVEL', '9'))
+PRECOMPRESS_BROTLI_QUALITY = int(os.getenv('PRECOMPRESS_BROTLI_QUALITY', '11'))
+PRECOMPRESS_MAX_BYTES = int(os.getenv('PRECOMPRESS_MAX_BYTES', str(128 * 1024)))
+PRECOMPRESS_WORKERS = int(os.getenv('PRECOMPRESS_WORKERS', '1'))
+PRECOMPRESS_MAX_PENDING = int(os.getenv('PRECOMPRESS_MAX_PENDING', '64'))
+
+# Password hashing (passlib scheme names; the first one hashes new passwords)
+PASSWORD_SCHEMES = [s.strip() for s in os.getenv('PASSWORD_SCHEMES', 'pbkdf2_sha256').split(',') if s.strip()]
+PASSWORD_HASH_WORKERS = int(os.getenv('PASSWORD_HASH_WORKERS', str(os.cpu_count() or 1)))
+# Hash/verify jobs allowed to wait for a worker before logins get a 503
+PASSWORD_HASH_MAX_QUEUE = int(os.getenv('PASSWORD_HASH_MAX_QUEUE', str(4 * PASSWORD_HASH_WORKERS)))
+
+# Admission control
+# Token buckets per client IP and route class; a rate of 0 turns a class off.
+RATE_LIMIT_ENABLED = os.getenv('RATE_LIMIT_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+RATE_LIMIT_PUBLIC_PER_SECOND = float(os.getenv('RATE_LIMIT_PUBLIC_PER_SECOND', '10'))
+RATE_LIMIT_PUBLIC_BURST = int(os.getenv('RATE_LIMIT_PUBLIC_BURST', '50'))
+RATE_LIMIT_AUTH_PER_SECOND = float(os.getenv('RATE_LIMIT_AUTH_PER_SECOND', '0.2'))
+RATE_LIMIT_AUTH_BURST = int(os.getenv('RATE_LIMIT_AUTH_BURST', '10'))
+RATE_LIMIT_RSVP_PER_SECOND = float(os.getenv('RATE_LIMIT_RSVP_PER_SECOND', '1'))
+RATE_LIMIT_RSVP_BURST = int(os.getenv('RATE_LIMIT_RSVP_BURST', '20'))
+RATE_LIMIT_GUESTBOOK_PER_SECOND = float(os.getenv('RATE_LIMIT_GUESTBOOK_PER_SECOND', '2'))
+RATE_LIMIT_GUESTBOOK_BURST = int(os.getenv('RATE_LIMIT_GUESTBOOK_BURST', '30'))
+RATE_LIMIT_CUSTOM_URL_PER_SECOND = float(os.getenv('RATE_LIMIT_CUSTOM_URL_PER_SECOND', '5'))
+RATE_LIMIT_CUSTOM_URL_BURST = int(os.getenv('RATE_LIMIT_CUSTOM_URL_BURST', '30'))
+# "memory" keeps buckets per process; "sqlite" shares them between the
+# workers on one host through RATE_LIMIT_SQLITE_PATH.
+RATE_LIMIT_BACKEND = os.getenv('RATE_LIMIT_BACKEND', 'memory')
+RATE_LIMIT_SQLITE_PATH = os.getenv('RATE_LIMIT_SQLITE_PATH', str(Path(tempfile.gettempdir()) / 'weddingcard-ratelimit.db'))
+RATE_LIMIT_MAX_KEYS = int(os.getenv('RATE_LIMIT_MAX_KEYS', '100000'))
+# Reverse proxies in front of the app; the client address is taken from
+# X-Forwarded-For that many entries from the right. 0 uses the peer address.
+RATE_LIMIT_PROXY_HOPS = int(os.getenv('RATE_LIMIT_PROXY_HOPS', '0'))
+# Requests handled at once per worker (0 = unlimited), and how many may
+# wait for a slot, for at most MAX_QUEUE_WAIT_SECONDS, before getting a 503.
+MAX_CONCURRENT_REQUESTS = int(os.getenv('MAX_CONCURRENT_REQUESTS', '64'))
+MAX_QUEUED_REQUESTS = int(os.getenv('MAX_QUEUED_REQUESTS', '128'))
+MAX_QUEUE_WAIT_SECONDS = float(os.getenv('MAX_QUEUE_WAIT_SECONDS', '2'))
+
+# RSVP ingestion
+# Submissions are buffered and written in batches of up to
+# RSVP_FLUSH_BATCH_SIZE, at least every RSVP_FLUSH_INTERVAL_SECONDS; beyond
+# RSVP_MAX_PENDING unwritten submissions new ones get a 503.
+RSVP_FLUSH_BATCH_SIZE = int(os.getenv('RSVP_FLUSH_BATCH_SIZE', '500'))
+RSVP_FLUSH_INTERVAL_SECONDS = float(os.getenv('RSVP_FLUSH_INTERVAL_SECONDS', '0.25'))
+RSVP_MAX_PENDING = int(os.getenv('RSVP_MAX_PENDING', '20000'))
+RSVP_MAX_GUESTS = int(os.getenv('RSVP_MAX_GUESTS', '10'))
+RSVP_PAGE_SIZE_MAX = 200
+
+# Custom URL slugs
+# Old slugs a wedding keeps as redirects after renames; older ones are freed
+SLUG_MAX_ALIASES = int(os.getenv('SLUG_MAX_ALIASES', '5'))
+# How often a worker reloads the taken-slug set to see other workers' claims
+SLUG_SET_REFRESH_SECONDS = float(os.getenv('SLUG_SET_REFRESH_SECONDS', '60'))
+
+# Guestbook
+GUESTBOOK_PAGE_SIZE = int(os.getenv('GUESTBOOK_PAGE_SIZE', '20'))
+GUESTBOOK_PAGE_SIZE_MAX = 100
+# Newest page per wedding, kept in memory; posts on this worker drop it at
+# once, the TTL bounds how stale other workers can be.
+GUESTBOOK_CACHE_MAX_ENTRIES = int(os.getenv('GUESTBOOK_CACHE_MAX_ENTRIES', '1024'))
+GUESTBOOK_CACHE_TTL_SECONDS = float(os.getenv('GUESTBOOK_CACHE_TTL_SECONDS', '5'))
+# Browsers revalidate every time (a cheap 304) so guests see new entries
+GUESTBOOK_CACHE_CONTROL = 'public, no-cache'
+
+# Admin export/import (disabled unless ADMIN_TOKEN is set)
+ADMIN_TOKEN = os.getenv('ADMIN_TOKEN', '')
+ADMIN_EXPORT_BATCH_SIZE = int(os.getenv('ADMIN_EXPORT_BATCH_SIZE', '1000'))
+ADMIN_IMPORT_BATCH_SIZE = int(os.getenv('ADMIN_IMPORT_BATCH_SIZE', '1000'))
+
+# Gallery photo blobs
+BLOB_DIR = Path(os.getenv('BLOB_DIR', str(ROOT_DIR / 'blobs')))
+BLOB_MAX_BYTES = int(os.getenv('BLOB_MAX_BYTES', str(15 * 1024 * 1024)))
+BLOB_CHUNK_BYTES = 256 * 1024
+# Prepended to the /api/blobs/... references stored in documents; set it to
+# the backend's public origin when the frontend is served from another host.
+BLOB_PUBLIC_BASE_URL = os.getenv('BLOB_PUBLIC_BASE_URL', '').rstrip('/')
+# A blob's URL is its content hash, so it can be cached forever.
+BLOB_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+# Responsive WebP widths and square thumbnail rendered for each photo (needs
+# Pillow). DERIVATIVE_WORKERS=0 turns the pipeline off.
+DERIVATIVE_WIDTHS = tuple(int(w) for w in os.getenv('DERIVATIVE_WIDTHS', '320,640,1280').split(',') if w.strip())
+DERIVATIVE_THUMB_SIZE = int(os.getenv('DERIVATIVE_THUMB_SIZE', '256'))
+DERIVATIVE_QUALITY = int(os.getenv('DERIVATIVE_QUALITY', '80'))
+DERIVATIVE_WORKERS = int(os.getenv('DERIVATIVE_WORKERS', str(os.cpu_count() or 1)))
+# Photos waiting for a worker beyond this are picked up again on a later read
+DERIVATIVE_MAX_PENDING = int(os.getenv('DERIVATIVE_MAX_PENDING', '256'))
+
+# Fast JSON encoding
+# Documents are read with {"_id": 0} projections, so there is no per-request
+# copy to strip _id; orjson encodes datetimes natively and the default hook
+# covers the BSON types that can still appear inside documents.
+def _json_default(value):
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, Decimal128):
+        return str(value.to_decimal())
+    if isinstance(value, (set, frozenset)):
+        return list(value)
+    raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
+
+def encode_json(content) -> bytes:
+    return orjson.dumps(content, default=_json_default, option=orjson.OPT_NON_STR_KEYS)
+
+class FastJSONResponse(Response):
+    """JSON response rendered straight to bytes with orjson.
+
+    Returning an instance from a route also bypasses FastAPI's
+    ``jsonable_encoder`` pass over the content.
+    """
+
+    media_type = "application/json"
+
+    def render(self, content) -> bytes:
+        return encode_json(content)
+
+# Response compression
+COMPRESSIBLE_TYPES = ("application/json", "text/", "application/javascript", "image/svg+xml")
+# Bodies above this are compressed off the event loop
+COMPRESSION_THREAD_BYTES = 256 * 1024
+
+def negotiate_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    """The best of br/gzip allowed by an Accept-Encoding header, or None."""
+    if not accept_encoding:
         return None
-    
-    if isinstance(doc, dict):
-        result = {}
-        for key, value in doc.items():
-            if key == '_id':
-                continue  # Skip MongoDB _id field
-            elif isinstance(value, ObjectId):
-                result[key] = str(value)
-            elif isinstance(value, dict):
-                result[key] = serialize_mongo_doc(value)
-            elif isinstance(value, list):
-                result[key] = [serialize_mongo_doc(item) if isinstance(item, dict) else item for item in value]
-            else:
-                result[key] = value
-        return result
-    
-    return doc
+    weights = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.partition(";")
+        q = 1.0
+        params = params.strip().replace(" ", "")
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        weights[name.strip().lower()] = q
+    best, best_q = None, 0.0
+    for encoding in (("br",) if brotli is not None else ()) + ("gzip",):
+        q = weights.get(encoding, weights.get("*", 0.0))
+        if q > best_q:
+            best, best_q = encoding, q
+    return best
+
+def compress_body(body: bytes, encoding: str, precompress: bool = False) -> bytes:
+    precompress = precompress and len(body) <= PRECOMPRESS_MAX_BYTES
+    if encoding == "br":
+        return brotli.compress(
+            body, quality=PRECOMPRESS_BROTLI_QUALITY if precompress else COMPRESSION_BROTLI_QUALITY
+        )
+    return gzip.compress(
+        body, compresslevel=PRECOMPRESS_GZIP_LEVEL if precompress else COMPRESSION_GZIP_LEVEL, mtime=0
+    )
+
+class CompressionMiddleware:
+    """gzip/brotli for compressible responses of at least ``minimum_size`` bytes.
+
+    Only single-message bodies are compressed. Streamed responses (photo
+    blobs) and responses that already have a Content-Encoding (precompressed
+    public weddings) pass through untouched.
+    """
+
+    def __init__(self, app, minimum_size: int = COMPRESSION_MIN_BYTES):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = negotiate_encoding(Headers(scope=scope).get("accept-encoding"))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start_message = None
+
+        async def send_compressed(message):
+            nonlocal start_message
+            if message["type"] == "http.response.start":
+                start_message = message
+                return
+            if start_message is not None:
+                headers = MutableHeaders(raw=start_message["headers"])
+                body = message.get("body", b"")
+                if (not message.get("more_body") and len(body) >= self.minimum_size
+                        and "content-encoding" not in headers
+                        and headers.get("content-type", "").startswith(COMPRESSIBLE_TYPES)):
+                    if len(body) > COMPRESSION_THREAD_BYTES:
+                        body = await asyncio.to_thread(compress_body, body, encoding)
+                    else:
+                        body = compress_body(body, encoding)
+                    headers["Content-Encoding"] = encoding
+                    headers["Content-Length"] = str(len(body))
+                    headers.add_vary_header("Accept-Encoding")
+                    message = {**message, "body": body}
+                await send(start_message)
+                start_message = None
+            await send(message)
+
+        await self.app(scope, receive, send_compressed)
+
+# Admission control
+# Unauthenticated routes are rate limited per client IP with token buckets
+# (one per route class), and every request other than health probes and
+# metrics needs one of MAX_CONCURRENT_REQUESTS slots. Requests over their
+# bucket get a 429; requests that find the slot queue full, or wait longer
+# than MAX_QUEUE_WAIT_SECONDS, get a 503. Both carry Retry-After.
+# (path pattern, methods or None for all, route class, tokens per second,
+# burst); the first match wins
+RATE_LIMIT_ROUTE_CLASSES = [
+    (re.compile(r"/api/auth/"), None, "auth", RATE_LIMIT_AUTH_PER_SECOND, RATE_LIMIT_AUTH_BURST),
+    (re.compile(r"/api/wedding/public/"), None, "public", RATE_LIMIT_PUBLIC_PER_SECOND, RATE_LIMIT_PUBLIC_BURST),
+    (re.compile(r"/api/wedding/[^/]+/rsvp$"), None, "rsvp", RATE_LIMIT_RSVP_PER_SECOND, RATE_LIMIT_RSVP_BURST),
+    # Only posting; guests paging through the entries don't use it up
+    (re.compile(r"/api/wedding/[^/]+/guestbook$"), ("POST",), "guestbook",
+     RATE_LIMIT_GUESTBOOK_PER_SECOND, RATE_LIMIT_GUESTBOOK_BURST),
+    (re.compile(r"/api/custom-url/"), None, "custom_url",
+     RATE_LIMIT_CUSTOM_URL_PER_SECOND, RATE_LIMIT_CUSTOM_URL_BURST),
+]
+ADMISSION_EXEMPT_PATHS = ("/api/health/", "/api/metrics")
+
+class MemoryRateLimitBackend:
+    """Token buckets in a bounded LRU dict; limits are per worker process."""
+
+    blocking = False
+
+    def __init__(self, max_keys: int = RATE_LIMIT_MAX_KEYS):
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()  # key -> (tokens, updated)
+
+    def take(self, key: str, rate: float, burst: int) -> float:
+        """Take a token from ``key``'s bucket; seconds until one is available, 0 if taken."""
+        now = time.monotonic()
+        tokens, updated = self._buckets.pop(key, (burst, now))
+        tokens = min(burst, tokens + (now - updated) * rate)
+        wait = 0.0
+        if tokens >= 1:
+            tokens -= 1
+        else:
+            wait = (1 - tokens) / rate
+        self._buckets[key] = (tokens, now)
+        while len(self._buckets) > self.max_keys:
+            # The least recently seen client; its bucket has likely refilled
+            self._buckets.popitem(last=False)
+        return wait
+
+    def __len__(self):
+        return len(self._buckets)
+
+class SqliteRateLimitBackend:
+    """Token buckets in a SQLite file shared by the workers on one host.
+
+    Each take is one write transaction. The buckets are disposable, so the
+    file is not fsynced; when the database is locked for longer than
+    ``busy_timeout`` the request is let through.
+    """
+
+    blocking = True
+    PRUNE_EVERY = 10000
+
+    def __init__(self, path: str, busy_timeout: float = 0.05, idle_seconds: float = 3600):
+        self.path = path
+        self.busy_timeout = busy_timeout
+        self.idle_seconds = idle_seconds
+        self._local = threading.local()
+        self._takes = 0
+        self.errors = 0
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=self.busy_timeout, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=OFF")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS buckets "
+                "(key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)"
+            )
+            self._local.conn = conn
+        return conn
+
+    def take(self, key: str, rate: float, burst: int) -> float:
+        now = time.time()  # shared between processes, unlike monotonic()
+        try:
+            conn = self._connection()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = conn.execute("SELECT tokens, updated FROM buckets WHERE key = ?", (key,)).fetchone()
+                tokens, updated = row if row else (burst, now)
+                tokens = min(burst, tokens + max(0.0, now - updated) * rate)
+                wait = 0.0
+                if tokens >= 1:
+                    tokens -= 1
+                else:
+                    wait = (1 - tokens) / rate
+                conn.execute("INSERT OR REPLACE INTO buckets (key, tokens, updated) VALUES (?, ?, ?)",
+                             (key, tokens, now))
+                self._takes += 1
+                if self._takes % self.PRUNE_EVERY == 0:
+                    conn.execute("DELETE FROM buckets WHERE updated < ?", (now - self.idle_seconds,))
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            return wait
+        except sqlite3.Error as e:
+            self.errors += 1
+            log_event(logging.WARNING, "ratelimit.backend_error", error=str(e))
+            return 0.0
+
+def create_rate_limit_backend(name: str):
+    if name == "memory":
+        return MemoryRateLimitBackend()
+    if name == "sqlite":
+        return SqliteRateLimitBackend(RATE_LIMIT_SQLITE_PATH)
+    raise ValueError(f"Unknown RATE_LIMIT_BACKEND: {name!r}")
+
+class ConcurrencyLimiter:
+    """At most ``limit`` holders at once and ``max_queue`` FIFO waiters."""
+
+    def __init__(self, limit: int, max_queue: int, max_wait: float):
+        self.limit = limit
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self.in_flight = 0
+        self._waiters = deque()
+        self.queued = 0
+        self.shed = 0
+        self.timed_out = 0
+
+    async def acquire(self) -> bool:
+        if self.in_flight < self.limit and not self._waiters:
+            self.in_flight += 1
+            return True
+        if len(self._waiters) >= self.max_queue:
+            self.shed += 1
+            return False
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        self.queued += 1
+        try:
+            await asyncio.wait_for(waiter, self.max_wait)
+        except asyncio.TimeoutError:
+            self.timed_out += 1
+            return False
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                self.release()  # the slot was handed over just before the cancel
+            raise
+        finally:
+            if not waiter.done() or waiter.cancelled():
+                try:
+                    self._waiters.remove(waiter)
+                except ValueError:
+                    pass
+        return True
+
+    def release(self):
+        # Hand the slot straight to the next live waiter, so in_flight
+        # never drops below the limit while requests are queued.
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.in_flight -= 1
+
+    def stats(self):
+        return {
+            "limit": self.limit,
+            "max_queue": self.max_queue,
+            "in_flight": self.in_flight,
+            "waiting": len(self._waiters),
+            "queued": self.queued,
+            "shed": self.shed,
+            "timed_out": self.timed_out,
+        }
+
+def client_address(scope) -> str:
+    if RATE_LIMIT_PROXY_HOPS > 0:
+        forwarded = Headers(scope=scope).get("x-forwarded-for")
+        if forwarded:
+            hops = [part.strip() for part in forwarded.split(",") if part.strip()]
+            if hops:
+                return hops[max(0, len(hops) - RATE_LIMIT_PROXY_HOPS)]
+    client = scope.get("client")
+    return client[0] if client else "unknown"
+
+def route_class(path: str, method: str = "GET"):
+    for pattern, methods, name, rate, burst in RATE_LIMIT_ROUTE_CLASSES:
+        if pattern.match(path) and (methods is None or method in methods):
+            return (name, rate, burst) if rate > 0 else None
+    return None
+
+class AdmissionMiddleware:
+    """Per-client token buckets followed by the global concurrency limit.
+
+    Uses the module-level ``rate_limit_backend`` and ``concurrency_limiter``;
+    setting either to None turns that check off.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"].startswith(ADMISSION_EXEMPT_PATHS):
+            await self.app(scope, receive, send)
+            return
+
+        backend = rate_limit_backend
+        if backend is not None:
+            matched = route_class(scope["path"], scope["method"])
+            if matched is not None:
+                name, rate, burst = matched
+                key = f"{name}:{client_address(scope)}"
+                if backend.blocking:
+                    wait = await asyncio.to_thread(backend.take, key, rate, burst)
+                else:
+                    wait = backend.take(key, rate, burst)
+                if wait > 0:
+                    rate_limited[name] += 1
+                    response = JSONResponse(
+                        {"detail": "Too many requests"},
+                        status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                        headers={"Retry-After": str(math.ceil(wait))},
+                    )
+                    await response(scope, receive, send)
+                    return
+
+        limiter = concurrency_limiter
+        if limiter is None:
+            await self.app(scope, receive, send)
+            return
+        if not await limiter.acquire():
+            response = JSONResponse(
+                {"detail": "Server is busy, please try again"},
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                headers={"Retry-After": "1"},
+            )
+            await response(scope, receive, send)
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            limiter.release()
+
+rate_limit_backend = create_rate_limit_backend(RATE_LIMIT_BACKEND) if RATE_LIMIT_ENABLED else None
+concurrency_limiter = (
+    ConcurrencyLimiter(MAX_CONCURRENT_REQUESTS, MAX_QUEUED_REQUESTS, MAX_QUEUE_WAIT_SECONDS)
+    if MAX_CONCURRENT_REQUESTS > 0 else None
+)
+# route class -> requests refused with a 429
+rate_limited = Counter()
+
+def admission_stats():
+    backend = rate_limit_backend
+    return {
+        "rate_limit": {
+            "backend": type(backend).__name__ if backend is not None else None,
+            "limited": dict(rate_limited),
+            **({"backend_errors": backend.errors} if isinstance(backend, SqliteRateLimitBackend) else {}),
+        },
+        "concurrency": concurrency_limiter.stats() if concurrency_limiter is not None else None,
+    }
 
 # Create the main app without a prefix
 app = FastAPI()
+PROCESS_STARTED_AT = time.monotonic()
+# Set once the JSON stores are loaded; MongoDB may still be connecting.
+app_ready = False
+mongo_connect_task = None
+mongo_connect_status = {"attempts": 0}
+# Milliseconds from import to "serving" and to "MongoDB connected"
+startup_timings = {"ready_ms": None, "mongo_connected_ms": None}
 
 # Create a router with the /api prefix
 api_router = APIRouter(prefix="/api")
@@ -59,20 +721,325 @@ api_router = APIRouter(prefix="/api")
 # Simple session storage (in production, use Redis or similar)
 active_sessions = {}
 
+# Mongo circuit breaker
+# Errors that say "the cluster is unreachable or degraded", as opposed to
+# errors about a particular operation (duplicate keys, bad queries, ...).
+MONGO_CONNECTIVITY_ERRORS = (ConnectionFailure, ExecutionTimeout, WTimeoutError)
+MONGO_BREAKER_FAILURE_THRESHOLD = int(os.getenv('MONGO_BREAKER_FAILURE_THRESHOLD', '5'))
+MONGO_BREAKER_WINDOW_SECONDS = float(os.getenv('MONGO_BREAKER_WINDOW_SECONDS', '30'))
+MONGO_BREAKER_PROBE_INTERVAL_SECONDS = float(os.getenv('MONGO_BREAKER_PROBE_INTERVAL_SECONDS', '5'))
+
+class CircuitBreaker:
+    """Routes traffic away from Mongo while it is failing.
+
+    ``closed``: calls go to Mongo. After ``failure_threshold`` connectivity
+    failures within ``window_seconds`` the breaker opens. ``open``: callers
+    go straight to the JSON fallback instead of each waiting out the server
+    selection timeout, while a background task pings Mongo every
+    ``probe_interval`` seconds. ``recovering``: a ping succeeded and
+    ``on_recover`` (the fallback replay) is running; traffic stays on the
+    fallback until it finishes and ``drained()`` confirms nothing was
+    written to the fallback meanwhile, then the breaker closes.
+    """
+
+    CLOSED, OPEN, RECOVERING = "closed", "open", "recovering"
+
+    def __init__(self, failure_threshold: int, window_seconds: float, probe_interval: float,
+                 probe, on_recover, drained):
+        self.failure_threshold = failure_threshold
+        self.window_seconds = window_seconds
+        self.probe_interval = probe_interval
+        self._probe = probe
+        self._on_recover = on_recover
+        self._drained = drained
+        self.state = self.CLOSED
+        self._failures = deque()
+        self._probe_task = None
+        self.transitions = {}
+        self.short_circuited = 0
+        self.last_error = None
+        self.last_transition_at = None
+
+    def allow(self) -> bool:
+        if self.state == self.CLOSED:
+            return True
+        self.short_circuited += 1
+        return False
+
+    def record_failure(self, error: Exception):
+        if not isinstance(error, MONGO_CONNECTIVITY_ERRORS) or self.state != self.CLOSED:
+            return
+        now = time.monotonic()
+        self._failures.append(now)
+        while self._failures and now - self._failures[0] > self.window_seconds:
+            self._failures.popleft()
+        self.last_error = str(error)
+        if len(self._failures) >= self.failure_threshold:
+            self._transition(self.OPEN)
+            self._probe_task = asyncio.create_task(self._probe_until_recovered())
+
+    def _transition(self, new_state: str):
+        key = f"{self.state}->{new_state}"
+        self.transitions[key] = self.transitions.get(key, 0) + 1
+        log_event(logging.WARNING if new_state == self.OPEN else logging.INFO,
+                  "mongo.breaker_transition", transition=key, last_error=self.last_error)
+        self.state = new_state
+        self.last_transition_at = datetime.utcnow()
+        self._failures.clear()
+
+    async def _probe_until_recovered(self):
+        while True:
+            await asyncio.sleep(self.probe_interval)
+            try:
+                await self._probe()
+            except Exception as e:
+                self.last_error = str(e)
+                continue
+            self._transition(self.RECOVERING)
+            try:
+                await self._on_recover()
+                while not self._drained():
+                    await self._on_recover()
+            except Exception as e:
+                self.last_error = str(e)
+                log_event(logging.WARNING, "mongo.recovery_failed", error=str(e))
+                self._transition(self.OPEN)
+                continue
+            self._transition(self.CLOSED)
+            return
+
+    def stop(self):
+        if self._probe_task is not None:
+            self._probe_task.cancel()
+            self._probe_task = None
+
+    def stats(self):
+        return {
+            "state": self.state,
+            "failure_threshold": self.failure_threshold,
+            "window_seconds": self.window_seconds,
+            "recent_failures": len(self._failures),
+            "short_circuited": self.short_circuited,
+            "transitions": dict(self.transitions),
+            "last_transition_at": self.last_transition_at.isoformat() if self.last_transition_at else None,
+            "last_error": self.last_error,
+        }
+
+# Ids written to the JSON fallback while Mongo was configured but not in use
+# (not yet connected, or failing), per collection; copied into Mongo once it
+# connects or the breaker recovers. Kept in
+# memory, so writes from before a restart are left to the migration tooling.
+pending_replay = {"users": set(), "weddings": set(), "rsvps": set(), "guestbook": set(), "slugs": set()}
+replayed_writes = {"users": 0, "weddings": 0, "rsvps": 0, "guestbook": 0, "slugs": 0}
+# Replayed docs Mongo refused, kept in REPLAY_CONFLICTS_FILE for review
+replay_conflicts = {"users": 0, "weddings": 0, "rsvps": 0, "guestbook": 0, "slugs": 0}
+
+# Weddings whose Mongo RSVP stats missed an update (the RSVPs went to the
+# JSON fallback, or the $inc failed); recounted by the replay.
+stale_rsvp_stats = set()
+
+replay_task = None
+
+def fallback_writes_drained() -> bool:
+    return not any(pending_replay.values()) and not stale_rsvp_stats
+
+def note_fallback_write(collection: str, doc_id: str):
+    if MONGO_ENABLED:
+        pending_replay[collection].add(doc_id)
+        if mongo_ready and mongo_breaker.state == CircuitBreaker.CLOSED:
+            # A write that chose the fallback before Mongo came back and
+            # finished after the replay drained: copy it over now.
+            schedule_replay()
+
+def schedule_replay():
+    global replay_task
+    if replay_task is None or replay_task.done():
+        replay_task = asyncio.create_task(replay_in_background())
+
+async def replay_in_background():
+    try:
+        await replay_fallback_writes()
+    except Exception as e:
+        log_event(logging.WARNING, "mongo.replay_failed", error=str(e))
+
+def mongo_available() -> bool:
+    return mongo_ready and mongo_breaker.allow()
+
+def mongo_failed(op: str, error: Exception):
+    """Handle an exception from a Mongo call that has a JSON fallback.
+
+    Connectivity errors return, so the caller falls back to the JSON store.
+    Anything else (a bad query, a rejected document) would fail the same way
+    next time and means Mongo did not take the write, so it is re-raised
+    rather than papered over with a fallback write that diverges from Mongo.
+    """
+    if not isinstance(error, MONGO_CONNECTIVITY_ERRORS):
+        log_event(logging.ERROR, "mongo.op_error", op=op, error=str(error))
+        raise error
+    log_event(logging.WARNING, "mongo.op_failed", op=op, error=str(error))
+    mongo_breaker.record_failure(error)
+
+def _restore_datetimes(doc: dict) -> dict:
+    # The JSON store keeps datetimes as str(); give Mongo real dates back.
+    restored = dict(doc)
+    for field in ("created_at", "updated_at"):
+        if isinstance(restored.get(field), str):
+            try:
+                restored[field] = datetime.fromisoformat(restored[field])
+            except ValueError:
+                pass
+    return restored
+
+async def replay_fallback_writes():
+    """Copy the pending fallback writes into Mongo until none are left.
+
+    Writes keep going to the JSON store while this runs, so it loops until
+    a pass finds nothing new. It returns without awaiting after that
+    check, so callers that switch reads to Mongo right after it cannot
+    let a write slip in between.
+    """
+    stores = {"users": users_store, "weddings": weddings_store, "rsvps": rsvps_store,
+              "guestbook": guestbook_log, "slugs": slugs_store}
+    while not fallback_writes_drained():
+        for collection, ids in pending_replay.items():
+            for doc_id in list(ids):
+                # Taken off before reading, so a write to the same doc
+                # during the await below queues it again.
+                ids.discard(doc_id)
+                try:
+                    await replay_doc(collection, stores[collection].get(doc_id))
+                except BaseException:
+                    ids.add(doc_id)
+                    raise
+        if stale_rsvp_stats:
+            # Recount from the RSVPs Mongo now has, replayed ones included
+            wedding_ids = set(stale_rsvp_stats)
+            stale_rsvp_stats.difference_update(wedding_ids)
+            try:
+                await rebuild_rsvp_stats_in_mongo(wedding_ids)
+            except BaseException:
+                stale_rsvp_stats.update(wedding_ids)
+                raise
+    log_event(logging.INFO, "mongo.replay_done", replayed=dict(replayed_writes))
+    wedding_cache.clear()
+    guestbook_cache.clear()
+
+async def replay_doc(collection: str, doc: Optional[dict]):
+    if doc is None:
+        return
+    query = {"id": doc["id"]}
+    if collection == "weddings":
+        # Never overwrite a newer copy written by another worker.
+        query["$or"] = [{"version": {"$lte": _wedding_version(doc)}},
+                        {"version": {"$exists": False}}]
+    elif collection == "slugs":
+        # Never take over a slug another wedding claimed in Mongo
+        query["$or"] = [{"wedding_id": doc.get("wedding_id")}, {"wedding_id": None}]
+    try:
+        await db[collection].replace_one(query, _restore_datetimes(doc), upsert=True)
+        replayed_writes[collection] += 1
+    except MONGO_CONNECTIVITY_ERRORS:
+        # Mongo went away again: the doc stays pending for the next replay
+        raise
+    except Exception as e:
+        # Mongo rejected this doc: a newer version, another owner, a clash
+        # on a unique field (e.g. the user's wedding from another worker) or
+        # a doc it refuses outright. Retrying would fail the same way.
+        replay_conflicts[collection] += 1
+        log_event(logging.WARNING, "mongo.replay_conflict", collection=collection,
+                  doc_id=doc["id"], error=str(e))
+        await asyncio.to_thread(record_replay_conflict, collection, doc, str(e))
+
+def record_replay_conflict(collection: str, doc: dict, error: str):
+    record = {"collection": collection, "error": error, "at": datetime.utcnow(), "doc": doc}
+    with open(REPLAY_CONFLICTS_FILE, 'a') as f:
+        f.write(json.dumps(record, separators=(',', ':'), default=str) + '\n')
+
+async def ping_mongo():
+    await client.admin.command('ping')
+
+mongo_breaker = CircuitBreaker(
+    MONGO_BREAKER_FAILURE_THRESHOLD,
+    MONGO_BREAKER_WINDOW_SECONDS,
+    MONGO_BREAKER_PROBE_INTERVAL_SECONDS,
+    probe=ping_mongo,
+    on_recover=replay_fallback_writes,
+    drained=fallback_writes_drained,
+)
+
 # MongoDB connection functions
 async def connect_to_mongo():
-    global client, db
+    global client, db, mongo_ready
+    options = mongo_client_options()
     try:
-        client = AsyncIOMotorClient(MONGO_URL)
+        client = AsyncIOMotorClient(MONGO_URL, **options)
         db = client[DB_NAME]
         # Test the connection
         await client.admin.command('ping')
-        print(f"✅ Connected to MongoDB: {DB_NAME}")
-        return True
+        await ensure_indexes()
+        if logger.isEnabledFor(logging.DEBUG):
+            await log_query_plans()
+        # Copy over what was written to the JSON store while disconnected
+        # before any request reads from Mongo.
+        if not fallback_writes_drained():
+            await replay_fallback_writes()
     except Exception as e:
-        print(f"❌ Failed to connect to MongoDB: {e}")
-        print("📋 Falling back to JSON file storage")
+        log_event(logging.WARNING, "mongo.connect_failed", error=str(e), fallback="json")
+        if client is not None:
+            client.close()
+        client = db = None
         return False
+    mongo_ready = True
+    await refresh_slug_set()
+    startup_timings["mongo_connected_ms"] = round((time.monotonic() - PROCESS_STARTED_AT) * 1000, 1)
+    log_event(logging.INFO, "mongo.connected", db=DB_NAME, options=options,
+              after_ms=startup_timings["mongo_connected_ms"])
+    return True
+
+async def connect_to_mongo_with_retry():
+    """Keep trying to connect in the background with exponential backoff."""
+    delay = MONGO_CONNECT_RETRY_INITIAL_SECONDS
+    while True:
+        mongo_connect_status["attempts"] += 1
+        if await connect_to_mongo():
+            return
+        # Jitter keeps a fleet of workers from reconnecting in lockstep
+        sleep_for = delay * random.uniform(0.5, 1.0)
+        log_event(logging.INFO, "mongo.connect_retry", attempt=mongo_connect_status["attempts"],
+                  retry_in_seconds=round(sleep_for, 2))
+        await asyncio.sleep(sleep_for)
+        delay = min(delay * 2, MONGO_CONNECT_RETRY_MAX_SECONDS)
+
+async def ensure_indexes():
+    # Each index is created on its own so that one failure (e.g. existing
+    # duplicates blocking a unique index) does not block the others.
+    for collection, keys, options in MONGO_INDEXES:
+        index = f"{collection}." + ",".join(field for field, _ in keys)
+        try:
+            name = await db[collection].create_index(keys, **options)
+            log_event(logging.DEBUG, "mongo.index_ready", index=index, name=name)
+        except Exception as e:
+            log_event(logging.WARNING, "mongo.index_failed", index=index, error=str(e))
+
+def _plan_summary(plan: dict):
+    stages, indexes = [], []
+    while plan:
+        stages.append(plan.get("stage"))
+        if plan.get("indexName"):
+            indexes.append(plan["indexName"])
+        plan = plan.get("inputStage") or (plan.get("inputStages") or [None])[0]
+    return stages, indexes
+
+async def log_query_plans():
+    for collection, query in MONGO_EXPLAIN_QUERIES:
+        try:
+            explain = await db[collection].find(query).explain()
+            stages, indexes = _plan_summary(explain["queryPlanner"]["winningPlan"])
+            level = logging.WARNING if "COLLSCAN" in stages else logging.DEBUG
+            log_event(level, "mongo.query_plan", collection=collection, fields=list(query),
+                      stages=stages, indexes=indexes)
+        except Exception as e:
+            log_event(logging.DEBUG, "mongo.explain_failed", collection=collection, error=str(e))
 
 async def close_mongo_connection():
     global client
@@ -81,37 +1048,69 @@ async def close_mongo_connection():
 
 # Database helper functions
 async def get_user_from_db(user_id: str):
-    if db is not None:
+    if mongo_available():
         try:
-            user = await db.users.find_one({"id": user_id})
-            return serialize_mongo_doc(user)
+            return await db.users.find_one({"id": user_id}, {"_id": 0})
         except Exception as e:
-            print(f"Failed to get user from MongoDB: {e}")
+            mongo_failed("get_user", e)
     
     # Fallback to JSON
-    users = load_json_file(USERS_FILE)
-    return users.get(user_id)
+    return users_store.get(user_id)
 
-async def save_user_to_db(user_data: dict):
-    if db is not None:
+async def get_user_by_username_from_db(username: str):
+    if mongo_available():
         try:
-            await db.users.replace_one(
-                {"id": user_data["id"]}, 
-                user_data, 
-                upsert=True
-            )
+            return await db.users.find_one({"username": username}, {"_id": 0})
+        except Exception as e:
+            mongo_failed("get_user_by_username", e)
+    
+    # Fallback to JSON
+    return users_store.find_one("username", username)
+
+async def create_user_in_db(user_data: dict) -> bool:
+    """Insert ``user_data`` unless its username is taken; False if it is."""
+    if mongo_available():
+        try:
+            # The unique username index rejects a concurrent registration
+            await db.users.insert_one(dict(user_data))
             return True
+        except DuplicateKeyError:
+            return False
         except Exception as e:
-            print(f"Failed to save user to MongoDB: {e}")
+            mongo_failed("create_user", e)
+    
+    # Fallback to JSON; the check and the insert are one atomic step
+    if not await users_store.insert_if_absent_async("username", user_data["username"], user_data):
+        return False
+    note_fallback_write("users", user_data["id"])
+    return True
+
+async def update_user_fields_in_db(user_id: str, fields: dict, expected: dict = None) -> bool:
+    """``$set`` fields on a user, only if it still matches ``expected``."""
+    query = {"id": user_id, **(expected or {})}
+    if mongo_available():
+        try:
+            result = await db.users.update_one(query, {"$set": fields})
+            return result.modified_count == 1
+        except Exception as e:
+            mongo_failed("update_user", e)
     
     # Fallback to JSON
-    users = load_json_file(USERS_FILE)
-    users[user_data["id"]] = user_data
-    save_json_file(USERS_FILE, users)
+    updated = await users_store.update_one_async(
+        "id", user_id, {"$set": fields},
+        where=lambda doc: all(doc.get(k) == v for k, v in (expected or {}).items()),
+    )
+    if updated is None:
+        return False
+    note_fallback_write("users", user_id)
     return True
 
-async def get_wedding_from_db(wedding_id: str = None, user_id: str = None, custom_url: str = None):
-    if db is not None:
+async def get_wedding_from_db(wedding_id: str = None, user_id: str = None, custom_url: str = None,
+                              projection: dict = None):
+    # The projection is applied by the query itself, so unwanted fields
+    # never leave Mongo (or get copied out of the JSON store).
+    projection = {"_id": 0, **(projection or {})}
+    if mongo_available():
         try:
             query = {}
             if wedding_id:
@@ -121,67 +1120,116 @@ async def get_wedding_from_db(wedding_id: str = None, user_id: str = None, custo
             elif custom_url:
                 query["custom_url"] = custom_url
             
-            print(f"🔍 MongoDB query: {query}")
-            wedding = await db.weddings.find_one(query)
-            print(f"📋 MongoDB result: {wedding}")
-            return serialize_mongo_doc(wedding)
+            wedding = await db.weddings.find_one(query, projection)
+            log_event(logging.DEBUG, "wedding.lookup", source="mongo", query=query,
+                      found=wedding is not None)
+            return wedding
         except Exception as e:
-            print(f"Failed to get wedding from MongoDB: {e}")
+            mongo_failed("get_wedding", e)
     
     # Fallback to JSON
-    print("📂 Falling back to JSON file search")
-    weddings = load_json_file(WEDDINGS_FILE)
-    
+    wedding = None
     if wedding_id:
-        return weddings.get(wedding_id)
+        wedding = weddings_store.get(wedding_id, projection)
     elif user_id:
-        for w_id, w_data in weddings.items():
-            if w_data.get("user_id") == user_id:
-                return w_data
+        wedding = weddings_store.find_one("user_id", user_id, projection)
     elif custom_url:
-        print(f"🔍 Searching JSON for custom_url: {custom_url}")
-        for w_id, w_data in weddings.items():
-            print(f"📋 Checking wedding {w_id}: custom_url = {w_data.get('custom_url')}")
-            if w_data.get("custom_url") == custom_url:
-                print(f"✅ Found match in JSON!")
-                return w_data
-        print(f"❌ No match found in JSON")
-    
-    return None
+        wedding = weddings_store.find_one("custom_url", custom_url, projection)
+    log_event(logging.DEBUG, "wedding.lookup", source="json", wedding_id=wedding_id,
+              user_id=user_id, custom_url=custom_url, found=wedding is not None)
+    return wedding
 
-async def save_wedding_to_db(wedding_data: dict):
-    if db is not None:
+class VersionConflictError(Exception):
+    """The wedding changed since the version the client last read."""
+
+    def __init__(self, current_version: int):
+        super().__init__(f"Wedding is at version {current_version}")
+        self.current_version = current_version
+
+async def create_wedding_in_db(wedding_data: dict) -> bool:
+    """Insert ``wedding_data`` unless the user already has a wedding.
+
+    One atomic upsert instead of a read followed by a write, so two
+    concurrent creates cannot both succeed. Returns False if one existed.
+    """
+    user_id = wedding_data["user_id"]
+    if mongo_available():
         try:
-            await db.weddings.replace_one(
-                {"id": wedding_data["id"]}, 
-                wedding_data, 
-                upsert=True
+            existing = await db.weddings.find_one_and_update(
+                {"user_id": user_id},
+                {"$setOnInsert": {k: v for k, v in wedding_data.items() if k != "user_id"}},
+                projection={"_id": 1},
+                upsert=True,
+                return_document=ReturnDocument.BEFORE,
             )
-            print(f"✅ Wedding saved to MongoDB: {wedding_data['id']}")
-            return True
+            created = existing is None
+            if created:
+                wedding_cache.invalidate(wedding_data["id"])
+            return created
+        except DuplicateKeyError:
+            # Lost the race against a concurrent create (unique user_id index)
+            return False
         except Exception as e:
-            print(f"Failed to save wedding to MongoDB: {e}")
+            mongo_failed("create_wedding", e)
     
     # Fallback to JSON
-    print(f"💾 Saving wedding to JSON file: {wedding_data['id']}")
-    weddings = load_json_file(WEDDINGS_FILE)
-    weddings[wedding_data["id"]] = wedding_data
-    save_json_file(WEDDINGS_FILE, weddings)
-    return True
+    created = await weddings_store.insert_if_absent_async("user_id", user_id, wedding_data)
+    if created:
+        wedding_cache.invalidate(wedding_data["id"])
+        note_fallback_write("weddings", wedding_data["id"])
+    return created
+
+def _wedding_version(wedding: dict) -> int:
+    # Documents written before versioning count as version 0.
+    return wedding.get("version") or 0
 
-async def get_all_users_from_db():
-    if db is not None:
+async def update_wedding_fields_in_db(user_id: str, update: dict, expected_version: int = None):
+    """Apply a field-level ``update`` to a user's wedding and return the result.
+
+    Only the touched fields travel to Mongo (or get journaled on the JSON
+    path); the rest of the document is left as it is. Every update bumps
+    ``version``; with ``expected_version`` the update only applies if the
+    stored version still matches, otherwise VersionConflictError is raised.
+    Returns None if the user has no wedding.
+    """
+    update = {**update, "$inc": {"version": 1}}
+    if mongo_available():
         try:
-            users = {}
-            async for user in db.users.find():
-                serialized_user = serialize_mongo_doc(user)
-                users[serialized_user["id"]] = serialized_user
-            return users
+            query = {"user_id": user_id}
+            if expected_version is not None:
+                query["version"] = {"$in": [0, None]} if expected_version == 0 else expected_version
+            wedding = await db.weddings.find_one_and_update(
+                query,
+                update,
+                projection={"_id": 0},
+                return_document=ReturnDocument.AFTER,
+            )
+            if wedding:
+                wedding_cache.invalidate(wedding["id"])
+            elif expected_version is not None:
+                current = await db.weddings.find_one({"user_id": user_id}, {"_id": 0, "version": 1})
+                if current is not None:
+                    raise VersionConflictError(_wedding_version(current))
+            return wedding
+        except VersionConflictError:
+            raise
         except Exception as e:
-            print(f"Failed to get users from MongoDB: {e}")
+            mongo_failed("update_wedding", e)
     
     # Fallback to JSON
-    return load_json_file(USERS_FILE)
+    wedding = await weddings_store.update_one_async(
+        "user_id", user_id, update,
+        where=None if expected_version is None
+        else lambda doc: _wedding_version(doc) == expected_version,
+    )
+    if wedding:
+        wedding_cache.invalidate(wedding["id"])
+        note_fallback_write("weddings", wedding["id"])
+    elif expected_version is not None:
+        current = weddings_store.find_one("user_id", user_id)
+        if current is not None:
+            raise VersionConflictError(_wedding_version(current))
+    return wedding
 
 # Models
 class UserRegister(BaseModel):
@@ -195,7 +1243,7 @@ class UserLogin(BaseModel):
 class User(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     username: str
-    password: str  # Simple plain text password
+    password: str  # passlib hash; records from before hashing hold the plaintext
     created_at: datetime = Field(default_factory=datetime.utcnow)
 
 class WeddingData(BaseModel):
@@ -220,6 +1268,8 @@ class WeddingData(BaseModel):
     important_info: Optional[dict] = {}
     created_at: datetime = Field(default_factory=datetime.utcnow)
     updated_at: datetime = Field(default_factory=datetime.utcnow)
+    # Bumped on every update; clients may send it back for optimistic locking
+    version: int = 1
 
 class WeddingDataCreate(BaseModel):
     couple_name_1: str
@@ -235,6 +1285,21 @@ class WeddingDataCreate(BaseModel):
     faqs: List[dict] = []
     theme: str = "classic"
 
+class RSVPCreate(BaseModel):
+    name: str = Field(..., min_length=1, max_length=200)
+    email: Optional[str] = Field(None, max_length=254)
+    phone: Optional[str] = Field(None, max_length=40)
+    attendance: Literal["yes", "no"]
+    guests: int = Field(1, ge=1, le=RSVP_MAX_GUESTS)
+    meal_choice: Optional[str] = Field(None, max_length=50)
+    dietary: Optional[str] = Field(None, max_length=500)
+    message: Optional[str] = Field(None, max_length=2000)
+
+class GuestbookEntryCreate(BaseModel):
+    name: str = Field(..., min_length=1, max_length=100)
+    relationship: Optional[str] = Field(None, max_length=100)
+    message: str = Field(..., min_length=1, max_length=2000)
+
 class AuthResponse(BaseModel):
     session_id: str
     user_id: str
@@ -251,147 +1316,1805 @@ def load_json_file(filename):
     except:
         return {}
 
-def save_json_file(filename, data):
-    with open(filename, 'w') as f:
+def write_json_tmp(filename, data):
+    """Write ``data`` to a synced sibling temp file and return its path."""
+    tmp_path = filename.with_name(filename.name + '.tmp')
+    with open(tmp_path, 'w') as f:
         json.dump(data, f, indent=2, default=str)
+        f.flush()
+        os.fsync(f.fileno())
+    return tmp_path
 
-# Simple authentication helper functions
-def create_simple_session(user_id: str) -> str:
-    session_id = str(uuid.uuid4())
-    active_sessions[session_id] = {
-        "user_id": user_id,
-        "created_at": datetime.utcnow()
-    }
-    return session_id
+def save_json_file(filename, data):
+    # Write to a sibling temp file and rename over the original so a crash
+    # mid-write can never leave a truncated file behind.
+    os.replace(write_json_tmp(filename, data), filename)
 
-def get_current_user_simple(session_id: str = None):
-    if not session_id or session_id not in active_sessions:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Invalid session"
-        )
-    
-    session = active_sessions[session_id]
-    # This will be handled as async in the route functions
-    return session["user_id"]
+def _update_matches(item, condition):
+    if isinstance(condition, dict) and isinstance(item, dict):
+        return all(item.get(k) == v for k, v in condition.items())
+    return item == condition
 
-# Auth Routes - Simple String Comparison
-@api_router.post("/auth/register", response_model=AuthResponse)
-async def register(user_data: UserRegister):
-    users = await get_all_users_from_db()
-    
-    # Check if user already exists (simple string comparison)
-    for user_id, user_info in users.items():
-        if user_info["username"] == user_data.username:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Username already registered"
-            )
-    
-    # Create new user with plain text password
-    user = User(
-        username=user_data.username,
-        password=user_data.password  # Store plain text password (naive approach)
-    )
-    
-    # Save to database
-    await save_user_to_db(user.dict())
-    
-    # Create simple session
-    session_id = create_simple_session(user.id)
-    
-    return AuthResponse(
-        session_id=session_id,
-        user_id=user.id,
-        username=user.username,
-        success=True
-    )
+def apply_update_ops(doc: dict, update: dict) -> dict:
+    """Apply the ``$set``/``$unset``/``$push``/``$pull``/``$inc`` subset of
+    Mongo's update language to a copy of ``doc``, for the JSON fallback.
 
-@api_router.post("/auth/login", response_model=AuthResponse)
-async def login(user_data: UserLogin):
-    users = await get_all_users_from_db()
-    
-    # Simple string comparison authentication
-    for user_id, user_info in users.items():
-        if (user_info["username"] == user_data.username and 
-            user_info["password"] == user_data.password):  # Plain text comparison
-            
-            # Create simple session
-            session_id = create_simple_session(user_id)
-            
-            return AuthResponse(
-                session_id=session_id,
-                user_id=user_id,
-                username=user_info["username"],
-                success=True
-            )
-    
-    raise HTTPException(
-        status_code=status.HTTP_401_UNAUTHORIZED,
-        detail="Incorrect username or password"
-    )
+    Lists are replaced rather than mutated, because readers may hold
+    shallow copies that share them.
+    """
+    doc = dict(doc)
+    for key, value in update.get("$set", {}).items():
+        doc[key] = value
+    for key in update.get("$unset", {}):
+        doc.pop(key, None)
+    for key, value in update.get("$push", {}).items():
+        values = value["$each"] if isinstance(value, dict) and "$each" in value else [value]
+        doc[key] = list(doc.get(key) or []) + list(values)
+    for key, condition in update.get("$pull", {}).items():
+        doc[key] = [item for item in doc.get(key) or [] if not _update_matches(item, condition)]
+    for key, amount in update.get("$inc", {}).items():
+        # Dotted keys increment inside (copies of) nested dicts
+        target = doc
+        *parents, leaf = key.split(".")
+        for parent in parents:
+            nested = dict(target.get(parent) or {})
+            target[parent] = nested
+            target = nested
+        target[leaf] = (target.get(leaf) or 0) + amount
+    return doc
 
-# Simple Wedding Data Routes using MongoDB
-@api_router.post("/wedding")
-async def create_wedding_data(request_data: dict):
-    session_id = request_data.get('session_id')
-    if not session_id:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Session ID required"
-        )
-    
-    user_id = get_current_user_simple(session_id)
-    existing_wedding = await get_wedding_from_db(user_id=user_id)
-    
-    if existing_wedding:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="User already has a wedding card. Use update endpoint instead."
-        )
-    
-    # Remove session_id from the data before creating wedding
-    wedding_create_data = {k: v for k, v in request_data.items() if k != 'session_id'}
-    
-    wedding = WeddingData(
-        user_id=user_id,
-        **wedding_create_data
-    )
-    
-    await save_wedding_to_db(wedding.dict())
-    return wedding.dict()
+def project_doc(doc: dict, projection: dict = None) -> dict:
+    """Copy of ``doc`` shaped by a Mongo-style projection.
 
-@api_router.put("/wedding")
-async def update_wedding_data(request_data: dict):
-    session_id = request_data.get('session_id')
-    if not session_id:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Session ID required"
+    Supports inclusion (``{"a": 1}``) or exclusion (``{"a": 0}``) of
+    top-level fields, like ``find_one(query, projection)`` does.
+    """
+    if not projection:
+        return dict(doc)
+    included = {k for k, v in projection.items() if v}
+    if included:
+        return {k: doc[k] for k in included if k in doc}
+    return {k: v for k, v in doc.items() if k not in projection}
+
+class JournalWriter:
+    """Append-only journal for a JsonStore, written from a background thread.
+
+    Records are queued by ``append`` and written in batches: everything that
+    queued up while the previous ``fsync`` was running is written and synced
+    together (group commit). Each call gets a Future that resolves once its
+    record is durable.
+    """
+
+    def __init__(self, base_path: Path, generation: int):
+        self.base_path = base_path
+        self.generation = generation
+        self._file = open(self._path_for(generation), 'ab')
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(
+            target=self._run, name=f"journal-{base_path.name}", daemon=True
         )
-    
-    user_id = get_current_user_simple(session_id)
-    existing_wedding = await get_wedding_from_db(user_id=user_id)
-    
-    if not existing_wedding:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
+        self._thread.start()
+
+    def _path_for(self, generation):
+        return self.base_path.with_name(f"{self.base_path.name}.journal.{generation:06d}")
+
+    @staticmethod
+    def existing_journals(base_path: Path):
+        """Journal files for ``base_path`` as (generation, path), oldest first."""
+        prefix = f"{base_path.name}.journal."
+        journals = []
+        for path in base_path.parent.glob(prefix + '*'):
+            suffix = path.name[len(prefix):]
+            if suffix.isdigit():
+                journals.append((int(suffix), path))
+        return sorted(journals)
+
+    def size(self):
+        return self._file.tell()
+
+    def append(self, line: bytes) -> Future:
+        future = Future()
+        self._queue.put(("append", line, future))
+        return future
+
+    def rotate(self) -> Future:
+        """Seal the current journal and start a new generation.
+
+        Resolves to the list of sealed journal paths once every record queued
+        before the rotation has been written to them.
+        """
+        future = Future()
+        self._queue.put(("rotate", None, future))
+        return future
+
+    def close(self):
+        future = Future()
+        self._queue.put(("close", None, future))
+        future.result()
+        self._thread.join()
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < JSON_JOURNAL_MAX_BATCH:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            pending = []
+            for kind, payload, future in batch:
+                if kind == "append":
+                    try:
+                        self._file.write(payload)
+                        pending.append(future)
+                    except Exception as e:
+                        future.set_exception(e)
+                    continue
+
+                # Control messages act as barriers: sync what came before them.
+                self._sync(pending)
+                pending = []
+                if kind == "rotate":
+                    self._file.close()
+                    sealed = [path for gen, path in self.existing_journals(self.base_path)
+                              if gen <= self.generation]
+                    self.generation += 1
+                    self._file = open(self._path_for(self.generation), 'ab')
+                    future.set_result(sealed)
+                elif kind == "close":
+                    self._file.close()
+                    future.set_result(None)
+                    return
+            self._sync(pending)
+
+    def _sync(self, futures):
+        if not futures:
+            return
+        try:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+        except Exception as e:
+            for future in futures:
+                future.set_exception(e)
+            return
+        for future in futures:
+            future.set_result(True)
+
+class JsonStore:
+    """Resident, indexed view of one of the JSON fallback files.
+
+    The file is parsed once and kept in memory. Lookups by ``id`` and by the
+    configured secondary fields are dict hits instead of linear scans. The
+    file's mtime/size are re-checked on each access, so edits made by another
+    process (or by hand) are picked up without a restart.
+
+    With ``journal=True`` the JSON file becomes a snapshot: saves append one
+    compact record to a journal instead of rewriting the whole file, and
+    ``compact`` periodically folds the journal back into the snapshot. Loading
+    replays snapshot plus journal. In this mode the process owns the files, so
+    external edits are not watched for.
+    """
+
+    def __init__(self, path: Path, indexes=(), journal: bool = False):
+        self.path = path
+        self.index_fields = tuple(indexes)
+        self.journaled = journal
+        self._journal = None
+        self._docs = {}
+        # field -> value -> {doc_id: None}; an insertion-ordered dict keeps
+        # "first match" semantics identical to the old file-order scan.
+        self._indexes = {field: {} for field in self.index_fields}
+        self._signature = None
+        # Bumped by every local write; the snapshot on disk holds writes up
+        # to _saved_generation. While they differ, memory is newer than the
+        # file and must not be replaced by a reload.
+        self._generation = 0
+        self._saved_generation = 0
+        self._loaded = False
+        self._lock = threading.RLock()
+        # Serializes snapshot writes so a newer snapshot is never overwritten
+        # by an older one.
+        self._write_lock = threading.Lock()
+
+    def _file_signature(self):
+        try:
+            st = self.path.stat()
+        except FileNotFoundError:
+            return None
+        return (st.st_mtime_ns, st.st_size)
+
+    def _ensure_fresh(self):
+        if self._loaded and self.journaled:
+            return
+        if self._loaded and self._saved_generation != self._generation:
+            return
+        signature = self._file_signature()
+        if self._loaded and signature == self._signature:
+            return
+        docs = load_json_file(self.path) if signature else {}
+        self._docs = {}
+        self._indexes = {field: {} for field in self.index_fields}
+        for doc_id, doc in docs.items():
+            self._docs[doc_id] = doc
+            self._index(doc_id, doc)
+        self._signature = signature
+        if self.journaled:
+            self._replay_journals()
+        self._loaded = True
+
+    def _replay_journals(self):
+        journals = JournalWriter.existing_journals(self.path)
+        for _, journal_path in journals:
+            with open(journal_path, 'rb') as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # A torn final record from a crash mid-append.
+                        continue
+                    if record.get("op") == "put":
+                        self._apply(record["doc"])
+        next_generation = journals[-1][0] + 1 if journals else 1
+        self._journal = JournalWriter(self.path, next_generation)
+
+    def _apply(self, doc):
+        previous = self._docs.get(doc["id"])
+        if previous is not None:
+            self._unindex(doc["id"], previous)
+        self._docs[doc["id"]] = doc
+        self._index(doc["id"], doc)
+
+    def _index(self, doc_id, doc):
+        for field, index in self._indexes.items():
+            value = doc.get(field)
+            if isinstance(value, Hashable):
+                index.setdefault(value, {})[doc_id] = None
+
+    def _unindex(self, doc_id, doc):
+        for field, index in self._indexes.items():
+            value = doc.get(field)
+            if isinstance(value, Hashable) and value in index:
+                index[value].pop(doc_id, None)
+                if not index[value]:
+                    del index[value]
+
+    def get(self, doc_id, projection: dict = None):
+        with self._lock:
+            self._ensure_fresh()
+            doc = self._docs.get(doc_id)
+            return project_doc(doc, projection) if doc is not None else None
+
+    def find_one(self, field, value, projection: dict = None):
+        with self._lock:
+            self._ensure_fresh()
+            doc = self._find_locked(field, value)
+            return project_doc(doc, projection) if doc is not None else None
+
+    def find_many(self, field, value, projection: dict = None) -> list:
+        """Every doc with ``field == value`` (``field`` must be indexed)."""
+        with self._lock:
+            self._ensure_fresh()
+            ids = self._indexes[field].get(value, ())
+            return [project_doc(self._docs[doc_id], projection) for doc_id in ids]
+
+    def load(self):
+        """Load (and in journal mode replay) the store ahead of first use."""
+        with self._lock:
+            self._ensure_fresh()
+
+    def all(self):
+        with self._lock:
+            self._ensure_fresh()
+            return dict(self._docs)
+
+    def put(self, doc: dict):
+        """Store ``doc`` in memory and persist it.
+
+        In journal mode this returns a Future that resolves once the record
+        is durable; otherwise the snapshot is rewritten before returning.
+        """
+        with self._lock:
+            self._ensure_fresh()
+            durable = self._store_locked(doc)
+        if durable is None:
+            self._write_snapshot()
+        return durable
+
+    async def put_async(self, doc: dict):
+        """``put`` without blocking the event loop on file I/O."""
+        with self._lock:
+            self._ensure_fresh()
+            durable = self._store_locked(doc)
+        await self._persist(durable)
+
+    async def insert_if_absent_async(self, field: str, value, doc: dict) -> bool:
+        """Atomically store ``doc`` unless a doc with ``field == value`` exists."""
+        with self._lock:
+            self._ensure_fresh()
+            if self._find_locked(field, value) is not None:
+                return False
+            durable = self._store_locked(doc)
+        await self._persist(durable)
+        return True
+
+    async def put_many_async(self, docs: list, unique=()) -> list:
+        """Store a batch of docs with a single persist; returns rejected indexes.
+
+        A doc is rejected when a doc with another ``id`` already has the same
+        value in one of the ``unique`` fields (the JSON analogue of Mongo's
+        unique indexes).
+        """
+        rejected, durables = [], []
+        with self._lock:
+            self._ensure_fresh()
+            for i, doc in enumerate(docs):
+                if any((other := self._find_locked(field, doc.get(field))) is not None
+                       and other["id"] != doc["id"] for field in unique):
+                    rejected.append(i)
+                    continue
+                durables.append(self._store_locked(doc))
+        if durables:
+            if self._journal is None:
+                await asyncio.to_thread(self._write_snapshot)
+            else:
+                await asyncio.gather(*(asyncio.wrap_future(durable) for durable in durables))
+        return rejected
+
+    async def update_one_async(self, field: str, value, update: dict, where=None):
+        """Apply a Mongo-style ``update`` to the first doc with ``field == value``.
+
+        The document is changed in place in memory and only that document is
+        journaled. ``where`` is an optional predicate the current document
+        must satisfy (checked atomically with the update). Returns the updated
+        document, or None if nothing matched.
+        """
+        with self._lock:
+            self._ensure_fresh()
+            doc = self._find_locked(field, value)
+            if doc is None or (where is not None and not where(doc)):
+                return None
+            doc = apply_update_ops(doc, update)
+            durable = self._store_locked(doc)
+        await self._persist(durable)
+        return dict(doc)
+
+    def _find_locked(self, field, value):
+        if field == "id":
+            return self._docs.get(value)
+        ids = self._indexes[field].get(value)
+        return self._docs[next(iter(ids))] if ids else None
+
+    def _store_locked(self, doc):
+        # Store what a reload from disk would give back (datetimes as str).
+        doc = {k: str(v) if isinstance(v, datetime) else v for k, v in doc.items()}
+        self._apply(doc)
+        self._generation += 1
+        if self._journal is None:
+            return None
+        record = {"op": "put", "doc": doc}
+        return self._journal.append(
+            json.dumps(record, separators=(',', ':'), default=str).encode() + b'\n'
+        )
+
+    async def _persist(self, durable):
+        if durable is not None:
+            await asyncio.wrap_future(durable)
+        else:
+            await asyncio.to_thread(self._write_snapshot)
+
+    def _write_snapshot(self):
+        with self._write_lock:
+            with self._lock:
+                docs = dict(self._docs)
+                generation = self._generation
+            tmp_path = write_json_tmp(self.path, docs)
+            # Rename and record the new signature together, so a reader
+            # never sees our own file as an external edit.
+            with self._lock:
+                os.replace(tmp_path, self.path)
+                self._signature = self._file_signature()
+                self._saved_generation = max(self._saved_generation, generation)
+
+    def compact(self, min_bytes: int = 0):
+        """Fold the journal into the snapshot file and drop sealed journals."""
+        with self._write_lock:
+            with self._lock:
+                self._ensure_fresh()
+                if self._journal is None or self._journal.size() < min_bytes:
+                    return False
+                docs = dict(self._docs)
+                rotated = self._journal.rotate()
+            save_json_file(self.path, docs)
+            for journal_path in rotated.result():
+                journal_path.unlink(missing_ok=True)
+            with self._lock:
+                self._signature = self._file_signature()
+        return True
+
+    def close(self):
+        """Compact and stop the journal writer (journal mode only)."""
+        if self._journal is None:
+            return
+        self.compact()
+        self._journal.close()
+        # Nothing was written since the compaction; don't leave it behind.
+        current = self._journal._path_for(self._journal.generation)
+        if current.exists() and current.stat().st_size == 0:
+            current.unlink()
+        self._journal = None
+        self._loaded = False
+
+users_store = JsonStore(USERS_FILE, indexes=("username",),
+                        journal=JSON_STORE_MODE == "journal")
+weddings_store = JsonStore(WEDDINGS_FILE, indexes=("user_id", "custom_url"),
+                           journal=JSON_STORE_MODE == "journal")
+rsvps_store = JsonStore(RSVPS_FILE, indexes=("wedding_id",),
+                        journal=JSON_STORE_MODE == "journal")
+rsvp_stats_store = JsonStore(RSVP_STATS_FILE, journal=JSON_STORE_MODE == "journal")
+slugs_store = JsonStore(SLUGS_FILE, indexes=("wedding_id",), journal=JSON_STORE_MODE == "journal")
+json_stores = (users_store, weddings_store, rsvps_store, rsvp_stats_store, slugs_store)
+compaction_task = None
+
+async def compact_json_stores_periodically():
+    while True:
+        await asyncio.sleep(JSON_COMPACT_INTERVAL_SECONDS)
+        for store in json_stores:
+            try:
+                await asyncio.to_thread(store.compact, JSON_COMPACT_MIN_BYTES)
+            except Exception as e:
+                log_event(logging.ERROR, "json_store.compact_failed", file=store.path.name, error=str(e))
+
+def guestbook_key(entry: dict) -> tuple:
+    return (entry["created_at"], entry["id"])
+
+class GuestbookLog:
+    """Guestbook entries for the JSON fallback, in an append-only log.
+
+    Entries are never edited, so a post appends one line through a
+    JournalWriter (group-committed with other posts) and nothing is ever
+    rewritten. The log is read once into per-wedding lists kept in
+    (created_at, id) order, which pages are bisected out of.
+    """
+
+    def __init__(self, base_path: Path):
+        self.base_path = base_path
+        self._by_wedding = {}
+        self._by_id = {}
+        self._journal = None
+        self._lock = threading.Lock()
+
+    def _ensure_loaded(self):
+        if self._journal is not None:
+            return
+        journals = JournalWriter.existing_journals(self.base_path)
+        complete = True
+        for _, path in journals:
+            with open(path, 'rb') as f:
+                for line in f:
+                    complete = line.endswith(b'\n')
+                    try:
+                        self._add(json.loads(line))
+                    except ValueError:
+                        # A torn final record from a crash mid-append.
+                        continue
+        for entries in self._by_wedding.values():
+            entries.sort(key=guestbook_key)
+        # Keep appending to the last file, unless it ends in a torn record
+        generation = journals[-1][0] if journals else 1
+        self._journal = JournalWriter(self.base_path, generation if complete else generation + 1)
+
+    def _add(self, entry: dict):
+        self._by_id[entry["id"]] = entry
+        bisect.insort(self._by_wedding.setdefault(entry["wedding_id"], []), entry, key=guestbook_key)
+
+    def load(self):
+        with self._lock:
+            self._ensure_loaded()
+
+    def get(self, entry_id: str) -> Optional[dict]:
+        with self._lock:
+            self._ensure_loaded()
+            entry = self._by_id.get(entry_id)
+            return dict(entry) if entry is not None else None
+
+    async def append(self, entry: dict):
+        # Keep what a reload would give back (datetimes as str)
+        entry = {k: str(v) if isinstance(v, datetime) else v for k, v in entry.items()}
+        with self._lock:
+            self._ensure_loaded()
+            self._add(entry)
+            durable = self._journal.append(encode_json(entry) + b'\n')
+        await asyncio.wrap_future(durable)
+
+    def page(self, wedding_id: str, limit: int, before: Optional[tuple] = None) -> list:
+        """Up to ``limit`` entries older than ``before`` (created_at, id), newest first."""
+        with self._lock:
+            self._ensure_loaded()
+            entries = self._by_wedding.get(wedding_id, [])
+            end = bisect.bisect_left(entries, before, key=guestbook_key) if before else len(entries)
+            return [dict(entry) for entry in reversed(entries[max(0, end - limit):end])]
+
+    def close(self):
+        with self._lock:
+            if self._journal is not None:
+                self._journal.close()
+                self._journal = None
+                self._by_wedding, self._by_id = {}, {}
+
+guestbook_log = GuestbookLog(GUESTBOOK_LOG)
+
+# Content-addressed photo storage
+# Gallery photos are stored once under blobs/<xx>/<sha256> and the wedding
+# document only holds their URLs, so wedding reads and writes no longer move
+# image bytes through Mongo, the JSON files and the encoder.
+BLOB_SIGNATURES = [
+    (b'\xff\xd8\xff', 'image/jpeg'),
+    (b'\x89PNG\r\n\x1a\n', 'image/png'),
+    (b'GIF87a', 'image/gif'),
+    (b'GIF89a', 'image/gif'),
+]
+
+def sniff_image_type(head: bytes) -> Optional[str]:
+    """Content type from the first 16 bytes of an image, or None."""
+    for signature, content_type in BLOB_SIGNATURES:
+        if head.startswith(signature):
+            return content_type
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        return 'image/webp'
+    if head[4:12] in (b'ftypavif', b'ftypavis'):
+        return 'image/avif'
+    return None
+
+class BlobTooLargeError(Exception):
+    pass
+
+class BlobStore:
+    """Files named by the SHA-256 of their bytes, so each photo is stored once."""
+
+    DIGEST_RE = re.compile(r'^[0-9a-f]{64}$')
+
+    def __init__(self, root: Path):
+        self.root = root
+
+    @classmethod
+    def is_digest(cls, value: str) -> bool:
+        return bool(cls.DIGEST_RE.match(value))
+
+    def path(self, digest: str) -> Path:
+        return self.root / digest[:2] / digest
+
+    def exists(self, digest: str) -> bool:
+        return self.path(digest).is_file()
+
+    def put_stream(self, stream, max_bytes: int = BLOB_MAX_BYTES) -> tuple:
+        """Copy a binary file object into the store; returns (digest, size).
+
+        The bytes are hashed while they are written to a temp file, which is
+        then renamed to its digest, or dropped if that blob already exists.
+        """
+        tmp_dir = self.root / 'tmp'
+        tmp_dir.mkdir(parents=True, exist_ok=True)
+        fd, tmp_name = tempfile.mkstemp(dir=tmp_dir)
+        try:
+            sha, size = hashlib.sha256(), 0
+            with os.fdopen(fd, 'wb') as f:
+                while chunk := stream.read(BLOB_CHUNK_BYTES):
+                    size += len(chunk)
+                    if size > max_bytes:
+                        raise BlobTooLargeError(max_bytes)
+                    sha.update(chunk)
+                    f.write(chunk)
+                f.flush()
+                os.fsync(f.fileno())
+            digest = sha.hexdigest()
+            target = self.path(digest)
+            if target.exists():
+                os.unlink(tmp_name)
+            else:
+                target.parent.mkdir(exist_ok=True)
+                os.replace(tmp_name, target)
+            return digest, size
+        except BaseException:
+            Path(tmp_name).unlink(missing_ok=True)
+            raise
+
+    def put_bytes(self, data: bytes) -> tuple:
+        digest = hashlib.sha256(data).hexdigest()
+        if not self.exists(digest):
+            self.put_stream(io.BytesIO(data), max_bytes=len(data))
+        return digest, len(data)
+
+    def head(self, digest: str, size: int = 16) -> bytes:
+        with open(self.path(digest), 'rb') as f:
+            return f.read(size)
+
+    def iter_range(self, digest: str, start: int, end: int):
+        """Yield bytes ``start``..``end`` (inclusive) in chunks."""
+        with open(self.path(digest), 'rb') as f:
+            f.seek(start)
+            remaining = end - start + 1
+            while remaining > 0:
+                chunk = f.read(min(BLOB_CHUNK_BYTES, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                yield chunk
+
+blob_store = BlobStore(BLOB_DIR)
+
+def blob_url(digest: str) -> str:
+    return f"{BLOB_PUBLIC_BASE_URL}/api/blobs/{digest}"
+
+def is_inline_photo(photo) -> bool:
+    return isinstance(photo, str) and photo.startswith('data:')
+
+def decode_inline_photo(photo) -> Optional[bytes]:
+    """Image bytes of a base64 ``data:`` URL, or None for anything else."""
+    if not is_inline_photo(photo):
+        return None
+    header, sep, payload = photo.partition(',')
+    if not sep or not header.endswith(';base64'):
+        return None
+    try:
+        data = base64.b64decode(payload, validate=True)
+    except binascii.Error:
+        return None
+    return data if sniff_image_type(data[:16]) else None
+
+def externalize_inline_photo(photo):
+    """Store an inline image as a blob and return its URL; other values pass through."""
+    data = decode_inline_photo(photo)
+    if data is None:
+        return photo
+    digest, _ = blob_store.put_bytes(data)
+    return blob_url(digest)
+
+def externalize_inline_photos(photos: list) -> list:
+    return [externalize_inline_photo(photo) for photo in photos]
+
+async def externalize_photos_in_update(update: dict):
+    """Replace inline gallery photos in a ``$set``/``$push`` update with blob URLs."""
+    photos = update.get("$set", {}).get("gallery_photos")
+    if isinstance(photos, list) and any(map(is_inline_photo, photos)):
+        update["$set"]["gallery_photos"] = await asyncio.to_thread(externalize_inline_photos, photos)
+    pushed = update.get("$push", {}).get("gallery_photos")
+    if pushed and any(map(is_inline_photo, pushed["$each"])):
+        pushed["$each"] = await asyncio.to_thread(externalize_inline_photos, pushed["$each"])
+
+def parse_byte_range(range_header: Optional[str], size: int) -> Optional[tuple]:
+    """(start, end) for a single ``bytes=`` range, None to send everything.
+
+    Multiple or malformed ranges are ignored (the whole blob is sent), as
+    RFC 9110 allows; a range past the end is a 416.
+    """
+    if not range_header or not range_header.startswith('bytes='):
+        return None
+    match = re.fullmatch(r'(\d*)-(\d*)', range_header[len('bytes='):].strip())
+    if not match or match.groups() == ('', ''):
+        return None
+    first, last = match.groups()
+    if first:
+        start, end = int(first), min(int(last), size - 1) if last else size - 1
+        if last and int(last) < start:
+            return None
+    else:
+        # Suffix range: the last N bytes ("bytes=-0" is unsatisfiable)
+        suffix = int(last)
+        start, end = (max(size - suffix, 0) if suffix else size), size - 1
+    if start >= size:
+        raise HTTPException(
+            status_code=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE,
+            detail="Requested range not satisfiable",
+            headers={"Content-Range": f"bytes */{size}"}
+        )
+    return start, end
+
+# Gallery photo derivatives
+# Thumbnails and responsive widths are rendered in worker processes and kept
+# next to the blobs under blobs/derived/<xx>/<sha256>/, one file per size, so
+# each (photo, size) pair is rendered once. Public responses list them as
+# srcset candidates once they exist.
+BLOB_URL_RE = re.compile(r'/api/blobs/([0-9a-f]{64})$')
+
+def blob_digest_from_url(photo) -> Optional[str]:
+    if not isinstance(photo, str) or not photo.startswith(BLOB_PUBLIC_BASE_URL):
+        return None
+    match = BLOB_URL_RE.fullmatch(photo[len(BLOB_PUBLIC_BASE_URL):])
+    return match.group(1) if match else None
+
+def derivative_url(digest: str, variant: str) -> str:
+    return f"{blob_url(digest)}/{variant}{imaging.EXTENSION}"
+
+class DerivativePipeline:
+    """Queues derivative rendering for blobs on a ProcessPoolExecutor."""
+
+    VARIANT_RE = re.compile(r'^(thumb|w\d+)\.webp$')
+    MANIFEST_CACHE_SIZE = 4096
+
+    def __init__(self, root: Path, workers: int, max_pending: int):
+        self.root = root
+        self.workers = workers
+        self.max_pending = max_pending
+        self.enabled = imaging is not None and workers > 0
+        self._executor = None
+        self._pending = {}  # digest -> wedding ids whose cached responses to drop when done
+        self._failed = set()
+        self._manifests = OrderedDict()
+        self.rendered = 0
+        self.failures = 0
+        self.dropped = 0
+
+    def dir(self, digest: str) -> Path:
+        return self.root / digest[:2] / digest
+
+    def variant_path(self, digest: str, variant: str) -> Path:
+        return self.dir(digest) / variant
+
+    def _remember(self, digest: str, manifest: dict):
+        self._manifests[digest] = manifest
+        self._manifests.move_to_end(digest)
+        while len(self._manifests) > self.MANIFEST_CACHE_SIZE:
+            self._manifests.popitem(last=False)
+
+    def manifest(self, digest: str) -> Optional[dict]:
+        """The rendered variants of a blob, or None (reads a file on a miss)."""
+        manifest = self._manifests.get(digest)
+        if manifest is None and imaging is not None:
+            try:
+                manifest = json.loads((self.dir(digest) / imaging.MANIFEST).read_bytes())
+            except (FileNotFoundError, ValueError):
+                return None
+            self._remember(digest, manifest)
+        return manifest
+
+    def is_complete(self, manifest: Optional[dict]) -> bool:
+        if manifest is None:
+            return False
+        wanted = {f"w{w}" for w in DERIVATIVE_WIDTHS if w < manifest["width"]} | {"thumb"}
+        return wanted <= manifest["variants"].keys()
+
+    def missing(self, digests) -> list:
+        """Digests among ``digests`` that still need rendering (does file I/O)."""
+        if not self.enabled:
+            return []
+        return [d for d in digests if d not in self._failed and not self.is_complete(self.manifest(d))]
+
+    def schedule(self, digests, wedding_id: str = None):
+        """Start rendering ``digests`` (from ``missing``) without waiting for it."""
+        for digest in digests:
+            if digest in self._pending:
+                if wedding_id:
+                    self._pending[digest].add(wedding_id)
+                continue
+            if len(self._pending) >= self.max_pending:
+                self.dropped += 1
+                continue
+            if self._executor is None:
+                # spawn: workers start clean instead of forking our threads
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers, mp_context=multiprocessing.get_context('spawn')
+                )
+            self._pending[digest] = {wedding_id} if wedding_id else set()
+            future = asyncio.get_running_loop().run_in_executor(
+                self._executor, imaging.render_derivatives,
+                str(blob_store.path(digest)), str(self.dir(digest)),
+                DERIVATIVE_WIDTHS, DERIVATIVE_THUMB_SIZE, DERIVATIVE_QUALITY,
+            )
+            future.add_done_callback(lambda f, digest=digest: self._done(digest, f))
+
+    def _done(self, digest: str, future):
+        wedding_ids = self._pending.pop(digest, ())
+        if future.cancelled():
+            return
+        error = future.exception()
+        if error is not None:
+            # Not retried until restart; the original photo is still served.
+            self.failures += 1
+            self._failed.add(digest)
+            log_event(logging.WARNING, "derivatives.failed", digest=digest, error=repr(error))
+            return
+        self.rendered += 1
+        self._remember(digest, future.result())
+        for wedding_id in wedding_ids:
+            wedding_cache.invalidate(wedding_id)
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def stats(self):
+        return {
+            "enabled": self.enabled,
+            "workers": self.workers,
+            "pending": len(self._pending),
+            "rendered": self.rendered,
+            "failures": self.failures,
+            "dropped": self.dropped,
+        }
+
+derivative_pipeline = DerivativePipeline(BLOB_DIR / 'derived', DERIVATIVE_WORKERS, DERIVATIVE_MAX_PENDING)
+
+def gallery_images(photos: list) -> tuple:
+    """``gallery_images`` entries for ``photos`` and the digests still to render.
+
+    Each entry has ``src``; blob photos with derivatives also get ``srcset``
+    (every rendered width plus the original), ``thumb`` and the original
+    ``width``/``height``.
+    """
+    images, digests = [], []
+    for photo in photos:
+        image = {"src": photo}
+        digest = blob_digest_from_url(photo)
+        manifest = derivative_pipeline.manifest(digest) if digest and derivative_pipeline.enabled else None
+        if manifest is not None:
+            variants = manifest["variants"]
+            candidates = [(v["width"], derivative_url(digest, name))
+                          for name, v in variants.items() if name != "thumb"]
+            candidates.append((manifest["width"], photo))
+            image.update(
+                srcset=", ".join(f"{url} {width}w" for width, url in sorted(candidates)),
+                thumb=derivative_url(digest, "thumb") if "thumb" in variants else photo,
+                width=manifest["width"],
+                height=manifest["height"],
+            )
+        if digest:
+            digests.append(digest)
+        images.append(image)
+    return images, derivative_pipeline.missing(digests)
+
+async def schedule_wedding_derivatives(wedding: dict):
+    """Queue rendering for the wedding's photos that have no derivatives yet."""
+    if not derivative_pipeline.enabled:
+        return
+    photos = wedding.get("gallery_photos") or []
+    digests = [d for d in map(blob_digest_from_url, photos) if d]
+    if digests:
+        derivative_pipeline.schedule(await asyncio.to_thread(derivative_pipeline.missing, digests), wedding["id"])
+
+# Field selection for wedding reads
+def parse_wedding_fields(fields: Optional[str]) -> Optional[tuple]:
+    """Parse a ``?fields=a,b`` selector into a sorted tuple of field names.
+
+    ``id`` is always included. None means "the whole document".
+    """
+    if not fields:
+        return None
+    selected = {name.strip() for name in fields.split(",") if name.strip()}
+    unknown = sorted(selected - set(WeddingData.model_fields))
+    if unknown:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unknown fields: {', '.join(unknown)}"
+        )
+    return tuple(sorted(selected | {"id"}))
+
+def wedding_projection(fields: Optional[tuple], public: bool) -> dict:
+    if fields:
+        # Public readers never get user_id, even if they ask for it.
+        return {name: 1 for name in fields if not (public and name == "user_id")}
+    return {"user_id": 0} if public else {}
+
+# Read-through cache for public wedding lookups
+class PublicWedding:
+    """A wedding as served to guests: the rendered body and its ETag.
+
+    The body is rendered once, when the cache is filled, and compressed at
+    most once per encoding, so conditional requests and cache hits never
+    re-serialize or re-compress the document.
+    """
+
+    __slots__ = ("id", "body", "etag", "compressed", "interim")
+
+    def __init__(self, wedding: dict, wedding_id: Optional[str] = None):
+        # ``wedding`` comes from a public projection, so user_id is already gone.
+        # Other public payloads of a wedding (a guestbook page) pass its id.
+        self.id = wedding_id or wedding["id"]
+        self.body = encode_json(wedding)
+        self.etag = '"' + hashlib.sha256(self.body).hexdigest()[:32] + '"'
+        self.compressed = {}  # encoding -> final body, filled on first request
+        self.interim = {}  # encoding -> body served until the dense pass lands
+
+    def compress(self, encoding: str) -> tuple:
+        """(body, final) for ``encoding``; ``final`` is False for an interim body."""
+        body = self.compressed.get(encoding)
+        if body is not None:
+            return body, True
+        body = self.interim.get(encoding)
+        if body is None:
+            body = compress_body(self.body, encoding)
+            if len(self.body) > PRECOMPRESS_MAX_BYTES:
+                self.compressed[encoding] = body
+                return body, True
+            self.interim[encoding] = body
+            precompressor.submit(self, encoding)
+        return body, False
+
+    def precompress(self, encoding: str):
+        self.compressed[encoding] = compress_body(self.body, encoding, precompress=True)
+        self.interim.pop(encoding, None)
+
+class Precompressor:
+    """Runs the dense compression passes of cached payloads on a thread pool.
+
+    Passes beyond ``max_pending`` are skipped; those payloads keep their
+    interim body until they leave the cache.
+    """
+
+    def __init__(self, workers: int, max_pending: int):
+        self.workers = workers
+        self.max_pending = max_pending
+        self._executor = None
+        self._pending = 0
+        self._lock = threading.Lock()
+        self.completed = 0
+        self.skipped = 0
+        self.failed = 0
+
+    def submit(self, payload: PublicWedding, encoding: str):
+        with self._lock:
+            if self._pending >= self.max_pending:
+                self.skipped += 1
+                return
+            self._pending += 1
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="precompress")
+        self._executor.submit(self._run, payload, encoding)
+
+    def _run(self, payload: PublicWedding, encoding: str):
+        try:
+            payload.precompress(encoding)
+        except Exception as e:
+            self.failed += 1
+            log_event(logging.WARNING, "precompress.failed", wedding_id=payload.id, error=str(e))
+        finally:
+            with self._lock:
+                self._pending -= 1
+                self.completed += 1
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def stats(self):
+        return {
+            "workers": self.workers,
+            "pending": self._pending,
+            "completed": self.completed,
+            "skipped": self.skipped,
+            "failed": self.failed,
+        }
+
+precompressor = Precompressor(PRECOMPRESS_WORKERS, PRECOMPRESS_MAX_PENDING)
+
+class WeddingCache:
+    """Bounded LRU + TTL cache of ``PublicWedding`` payloads.
+
+    Entries are keyed by lookup kind and field selection, e.g.
+    ``("custom_url", "emma-and-james", None)``, and tagged with the wedding id so a save can drop every key that points
+    at that wedding. Concurrent misses for the same key share one DB fetch.
+
+    Invalidation is per process; with several workers the TTL bounds how long
+    another worker can keep serving a stale copy.
+    """
+
+    def __init__(self, max_entries: int, ttl_seconds: float):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()  # key -> (expires_at, value, tag)
+        self._keys_by_tag = {}
+        self._inflight = {}
+        # Bumped on every invalidation; a load that overlaps one is returned
+        # to its callers but not cached, since it may predate the write.
+        self._invalidation_epoch = 0
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    async def get_or_load(self, key, loader):
+        entry = self._entries.get(key)
+        if entry is not None:
+            if entry[0] > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self._drop(key)
+            self.expirations += 1
+
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            self.coalesced += 1
+            return await asyncio.shield(inflight)
+
+        self.misses += 1
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        epoch = self._invalidation_epoch
+        try:
+            value = await loader()
+        except BaseException as e:
+            if self._inflight.get(key) is future:
+                del self._inflight[key]
+            if isinstance(e, asyncio.CancelledError):
+                future.cancel()
+            else:
+                future.set_exception(e)
+                future.exception()  # waiters re-raise it; don't warn if there are none
+            raise
+        if self._inflight.get(key) is future:
+            del self._inflight[key]
+        future.set_result(value)
+        if value is not None and epoch == self._invalidation_epoch:
+            self._store(key, value, value.id)
+        return value
+
+    def _store(self, key, value, tag):
+        if key in self._entries:
+            self._drop(key)
+        self._entries[key] = (time.monotonic() + self.ttl_seconds, value, tag)
+        self._keys_by_tag.setdefault(tag, set()).add(key)
+        while len(self._entries) > self.max_entries:
+            oldest = next(iter(self._entries))
+            self._drop(oldest)
+            self.evictions += 1
+
+    def _drop(self, key):
+        _, _, tag = self._entries.pop(key)
+        keys = self._keys_by_tag.get(tag)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._keys_by_tag[tag]
+
+    def invalidate(self, wedding_id: str):
+        """Drop every cached lookup that resolved to ``wedding_id``."""
+        self._invalidation_epoch += 1
+        self.invalidations += 1
+        for key in list(self._keys_by_tag.get(wedding_id, ())):
+            self._drop(key)
+        # Later readers must not join a fetch that may predate this write.
+        self._inflight.clear()
+
+    def clear(self):
+        self._invalidation_epoch += 1
+        self._entries.clear()
+        self._keys_by_tag.clear()
+        self._inflight.clear()
+
+    def stats(self):
+        lookups = self.hits + self.misses + self.coalesced
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "invalidations": self.invalidations,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+wedding_cache = WeddingCache(WEDDING_CACHE_MAX_ENTRIES, WEDDING_CACHE_TTL_SECONDS)
+
+async def get_public_wedding_cached(wedding_id: str = None, user_id: str = None, custom_url: str = None,
+                                    fields: Optional[tuple] = None):
+    if wedding_id:
+        key = ("id", wedding_id, fields)
+    elif user_id:
+        key = ("user_id", user_id, fields)
+    else:
+        key = ("custom_url", custom_url, fields)
+
+    async def load():
+        wedding = await get_wedding_from_db(
+            wedding_id=wedding_id, user_id=user_id, custom_url=custom_url,
+            projection=wedding_projection(fields, public=True),
+        )
+        if not wedding:
+            return None
+        if wedding.get("gallery_photos"):
+            wedding["gallery_images"], missing = await asyncio.to_thread(gallery_images, wedding["gallery_photos"])
+            derivative_pipeline.schedule(missing, wedding["id"])
+        return PublicWedding(wedding)
+
+    return await wedding_cache.get_or_load(key, load)
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    # If-None-Match uses weak comparison, so W/"x" matches "x".
+    candidates = (tag.strip().removeprefix("W/") for tag in if_none_match.split(","))
+    return etag in candidates
+
+async def public_wedding_response(request: Request, wedding: PublicWedding,
+                                  cache_control: str = PUBLIC_CACHE_CONTROL) -> Response:
+    encoding = None
+    if len(wedding.body) >= COMPRESSION_MIN_BYTES:
+        encoding = negotiate_encoding(request.headers.get("accept-encoding"))
+    # Each content coding is its own representation, with its own strong ETag
+    etag = f'{wedding.etag[:-1]}-{encoding}"' if encoding else wedding.etag
+    if encoding and encoding not in wedding.compressed:
+        # The interim body has other bytes than the dense one: weak ETag
+        etag = "W/" + etag
+    headers = {"ETag": etag, "Cache-Control": cache_control, "Vary": "Accept-Encoding"}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    if encoding is None:
+        return Response(content=wedding.body, media_type="application/json", headers=headers)
+    body = wedding.compressed.get(encoding) or wedding.interim.get(encoding)
+    if body is None:
+        body, final = await asyncio.to_thread(wedding.compress, encoding)
+        if final:
+            headers["ETag"] = etag.removeprefix("W/")
+    headers["Content-Encoding"] = encoding
+    return Response(content=body, media_type="application/json", headers=headers)
+
+# Password hashing
+# Hashing and verification run on a bounded thread pool: pbkdf2 (hashlib),
+# bcrypt and argon2 release the GIL while they work, so the pool hashes in
+# parallel and the event loop keeps serving other requests. Once the workers
+# are busy and PASSWORD_HASH_MAX_QUEUE jobs are waiting, new logins get a
+# 503 instead of queueing without bound.
+pwd_context = CryptContext(schemes=PASSWORD_SCHEMES, deprecated="auto")
+
+class PasswordPoolSaturated(Exception):
+    pass
+
+class PasswordHasher:
+    def __init__(self, context: CryptContext, workers: int, max_queue: int):
+        self.context = context
+        self.workers = workers
+        self.max_queue = max_queue
+        self._executor = None
+        self._in_flight = 0
+        self._dummy_hash = None
+        self.completed = 0
+        self.rejected = 0
+
+    async def _run(self, func, *args):
+        if self._in_flight >= self.workers + self.max_queue:
+            self.rejected += 1
+            raise PasswordPoolSaturated()
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="password")
+        self._in_flight += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+        finally:
+            self._in_flight -= 1
+            self.completed += 1
+
+    async def hash(self, password: str) -> str:
+        return await self._run(self.context.hash, password)
+
+    async def verify(self, password: str, stored: str) -> tuple:
+        """(matches, new_hash); ``new_hash`` is set when ``stored`` should be replaced.
+
+        A stored value that is not a known hash is a plaintext password from
+        before hashing; on a match it is upgraded, unless the pool is full
+        (then the next login does it).
+        """
+        if self.context.identify(stored, required=False) is None:
+            if not hmac.compare_digest(password.encode(), stored.encode()):
+                return False, None
+            try:
+                return True, await self.hash(password)
+            except PasswordPoolSaturated:
+                return True, None
+        # Also rehashes when the stored scheme or its rounds are deprecated
+        return await self._run(self.context.verify_and_update, password, stored)
+
+    async def verify_dummy(self, password: str):
+        """Do the work of a failed ``verify``, for logins with an unknown username.
+
+        Without it those answer without hashing anything, and the response
+        time tells which usernames exist.
+        """
+        if self._dummy_hash is None:
+            self._dummy_hash = await self.hash(secrets.token_urlsafe(16))
+        await self._run(self.context.verify, password, self._dummy_hash)
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def stats(self):
+        return {
+            "schemes": list(self.context.schemes()),
+            "workers": self.workers,
+            "max_queue": self.max_queue,
+            "in_flight": self._in_flight,
+            "completed": self.completed,
+            "rejected": self.rejected,
+        }
+
+password_hasher = PasswordHasher(pwd_context, PASSWORD_HASH_WORKERS, PASSWORD_HASH_MAX_QUEUE)
+
+def password_pool_busy() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="Server is busy, please try again",
+        headers={"Retry-After": "1"}
+    )
+
+# Simple authentication helper functions
+def create_simple_session(user_id: str) -> str:
+    session_id = str(uuid.uuid4())
+    active_sessions[session_id] = {
+        "user_id": user_id,
+        "created_at": datetime.utcnow()
+    }
+    return session_id
+
+def get_current_user_simple(session_id: str = None):
+    if not session_id or session_id not in active_sessions:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid session"
+        )
+    
+    session = active_sessions[session_id]
+    # This will be handled as async in the route functions
+    return session["user_id"]
+
+# Auth Routes
+@api_router.post("/auth/register", response_model=AuthResponse)
+async def register(user_data: UserRegister):
+    username_taken = HTTPException(
+        status_code=status.HTTP_400_BAD_REQUEST,
+        detail="Username already registered"
+    )
+    
+    # Check if user already exists (indexed username lookup)
+    if await get_user_by_username_from_db(user_data.username):
+        raise username_taken
+    
+    try:
+        password_hash = await password_hasher.hash(user_data.password)
+    except PasswordPoolSaturated:
+        raise password_pool_busy()
+    user = User(
+        username=user_data.username,
+        password=password_hash
+    )
+    
+    # Save to database; this also catches a concurrent registration
+    if not await create_user_in_db(user.model_dump()):
+        raise username_taken
+    
+    # Create simple session
+    session_id = create_simple_session(user.id)
+    
+    return AuthResponse(
+        session_id=session_id,
+        user_id=user.id,
+        username=user.username,
+        success=True
+    )
+
+@api_router.post("/auth/login", response_model=AuthResponse)
+async def login(user_data: UserLogin):
+    user_info = await get_user_by_username_from_db(user_data.username)
+    
+    matches = False
+    if user_info:
+        try:
+            matches, new_hash = await password_hasher.verify(user_data.password, user_info["password"])
+        except PasswordPoolSaturated:
+            raise password_pool_busy()
+        if matches and new_hash:
+            # Transparent upgrade of plaintext / outdated hashes; a failure
+            # here must not fail the login.
+            try:
+                await update_user_fields_in_db(
+                    user_info["id"], {"password": new_hash}, expected={"password": user_info["password"]}
+                )
+            except Exception as e:
+                log_event(logging.WARNING, "auth.rehash_failed", user_id=user_info["id"], error=str(e))
+    else:
+        try:
+            await password_hasher.verify_dummy(user_data.password)
+        except PasswordPoolSaturated:
+            raise password_pool_busy()
+    
+    if matches:
+        # Create simple session
+        session_id = create_simple_session(user_info["id"])
+        
+        return AuthResponse(
+            session_id=session_id,
+            user_id=user_info["id"],
+            username=user_info["username"],
+            success=True
+        )
+    
+    raise HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Incorrect username or password"
+    )
+
+# Partial wedding updates (PATCH)
+# Fields the server owns; clients may not patch them.
+WEDDING_PROTECTED_FIELDS = {"id", "user_id", "created_at", "updated_at", "version"}
+_wedding_field_adapters = {}
+
+def _wedding_field_adapter(field: str, element: bool = False) -> TypeAdapter:
+    key = (field, element)
+    if key not in _wedding_field_adapters:
+        annotation = WeddingData.model_fields[field].annotation
+        if element:
+            annotation = get_args(annotation)[0]
+        _wedding_field_adapters[key] = TypeAdapter(annotation)
+    return _wedding_field_adapters[key]
+
+def _check_wedding_field(field: str, element: bool = False):
+    if field not in WeddingData.model_fields or field in WEDDING_PROTECTED_FIELDS:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=f"Field '{field}' cannot be updated"
+        )
+    if element and get_origin(WeddingData.model_fields[field].annotation) is not list:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=f"Field '{field}' is not a list"
+        )
+
+def _validate_wedding_field(field: str, value, element: bool = False):
+    _check_wedding_field(field, element)
+    try:
+        return _wedding_field_adapter(field, element).validate_python(value)
+    except ValidationError as e:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail={"field": field, "errors": e.errors(include_url=False)}
+        )
+
+def build_wedding_update(request_data: dict) -> dict:
+    """Turn a PATCH body into a Mongo update document.
+
+    The body is either a partial wedding document (every key is ``$set``) or
+    ``{"ops": [...]}`` with JSON-Patch style operations on top-level fields:
+
+    - ``add``/``replace`` at ``/field`` sets the field
+    - ``add`` at ``/field/-`` appends to a list field (``$push``)
+    - ``remove`` at ``/field`` resets an optional field to its default
+    - ``pull`` at ``/field`` (extension) removes list items matching ``value``
+      (``$pull``; a dict value matches items containing those keys)
+
+    Only the touched fields are validated against ``WeddingData``. A
+    top-level ``version`` is the optimistic-locking token, not a field.
+    """
+    ops = request_data.get("ops")
+    if ops is None:
+        ops = [
+            {"op": "replace", "path": f"/{field}", "value": value}
+            for field, value in request_data.items() if field not in ("session_id", "version")
+        ]
+    if not isinstance(ops, list) or not ops:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="No fields to update"
+        )
+
+    set_fields, push_fields, pull_fields = {}, {}, {}
+    for op in ops:
+        if not isinstance(op, dict):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Each operation must be an object"
+            )
+        kind = op.get("op")
+        parts = str(op.get("path", "")).lstrip("/").split("/")
+        field = parts[0]
+        if kind in ("add", "replace") and len(parts) == 1:
+            set_fields[field] = _validate_wedding_field(field, op.get("value"))
+        elif kind == "add" and parts[1:] == ["-"]:
+            item = _validate_wedding_field(field, op.get("value"), element=True)
+            push_fields.setdefault(field, []).append(item)
+        elif kind == "remove" and len(parts) == 1:
+            _check_wedding_field(field)
+            field_info = WeddingData.model_fields[field]
+            if field_info.is_required():
+                raise HTTPException(
+                    status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                    detail=f"Field '{field}' is required and cannot be removed"
+                )
+            set_fields[field] = _validate_wedding_field(
+                field, field_info.get_default(call_default_factory=True)
+            )
+        elif kind == "pull" and len(parts) == 1:
+            _check_wedding_field(field, element=True)
+            pull_fields[field] = op.get("value")
+        else:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Unsupported operation: {kind} {op.get('path')}"
+            )
+
+    touched = [set(set_fields), set(push_fields), set(pull_fields)]
+    if (touched[0] & touched[1]) or (touched[0] & touched[2]) or (touched[1] & touched[2]):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="A field can only be changed by one kind of operation per request"
+        )
+
+    update = {"$set": {**set_fields, "updated_at": datetime.utcnow()}}
+    if push_fields:
+        update["$push"] = {field: {"$each": items} for field, items in push_fields.items()}
+    if pull_fields:
+        update["$pull"] = pull_fields
+    return update
+
+def expected_version_from(request_data: dict):
+    version = request_data.get("version")
+    if version is None:
+        return None
+    if not isinstance(version, int) or isinstance(version, bool):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="version must be an integer"
+        )
+    return version
+
+async def apply_wedding_update(user_id: str, update: dict, expected_version: int = None):
+    try:
+        wedding = await update_wedding_fields_in_db(user_id, update, expected_version)
+    except VersionConflictError as e:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail={
+                "message": "Wedding was modified by another editor. Reload and try again.",
+                "current_version": e.current_version,
+            }
+        )
+    
+    if not wedding:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
             detail="Wedding data not found"
         )
+    return wedding
+
+# Custom URL slugs
+# custom_url values are normalized to lowercase a-z/0-9/hyphen slugs and
+# registered in the slugs collection, whose id is the slug, so the unique
+# index decides who owns one. Renaming keeps the old slug as an alias that
+# redirects (308) to the new one, up to SLUG_MAX_ALIASES per wedding.
+# Released slugs stay as ownerless records, free for anyone to claim.
+# Each worker keeps the taken slugs in a set for the availability check.
+SLUG_MIN_LENGTH = 3
+SLUG_MAX_LENGTH = 63
+# Frontend routes and words we want to keep for ourselves
+RESERVED_SLUGS = frozenset({
+    "about", "admin", "api", "app", "assets", "blog", "contact", "dashboard", "faq", "gallery",
+    "guestbook", "help", "home", "login", "logout", "party", "privacy", "profile", "public",
+    "register", "registry", "rsvp", "schedule", "settings", "signup", "static", "story",
+    "support", "terms", "wedding", "weddings", "www",
+})
+
+def normalize_slug(value: str) -> str:
+    # "Émma & James " -> "emma-james"
+    ascii_value = unicodedata.normalize("NFKD", value).encode("ascii", "ignore").decode()
+    return re.sub(r"[^a-z0-9]+", "-", ascii_value.casefold()).strip("-")
+
+def slug_problem(slug: str) -> Optional[str]:
+    if len(slug) < SLUG_MIN_LENGTH:
+        return f"must be at least {SLUG_MIN_LENGTH} letters or digits"
+    if len(slug) > SLUG_MAX_LENGTH:
+        return f"must be at most {SLUG_MAX_LENGTH} characters"
+    if slug in RESERVED_SLUGS:
+        return "is reserved"
+    return None
+
+class SlugSet:
+    """The slugs in use (registered or held by a legacy wedding), per worker.
+
+    Claims on this worker are added immediately; other workers' claims show
+    up with the next reload, so the set answers "is this probably free?"
+    while the unique index has the final say.
+    """
+
+    def __init__(self, refresh_seconds: float):
+        self.refresh_seconds = refresh_seconds
+        self._slugs = set()
+        self._loaded_at = None
+        self._refresh_task = None
+
+    def replace(self, slugs):
+        self._slugs = set(slugs)
+        self._loaded_at = time.monotonic()
+
+    def add(self, slug: str):
+        self._slugs.add(slug)
+
+    def discard(self, slug: str):
+        self._slugs.discard(slug)
+
+    def __contains__(self, slug: str) -> bool:
+        if (self._loaded_at is None or time.monotonic() - self._loaded_at > self.refresh_seconds) \
+                and (self._refresh_task is None or self._refresh_task.done()):
+            self._refresh_task = asyncio.create_task(refresh_slug_set())
+        return slug in self._slugs
+
+    def stats(self):
+        return {
+            "slugs": len(self._slugs),
+            "age_seconds": round(time.monotonic() - self._loaded_at, 1) if self._loaded_at else None,
+        }
+
+slug_set = SlugSet(SLUG_SET_REFRESH_SECONDS)
+
+async def refresh_slug_set():
+    try:
+        if mongo_available():
+            slugs = [doc["id"] async for doc in db.slugs.find({"wedding_id": {"$ne": None}}, {"_id": 0, "id": 1})]
+            slugs += [doc["custom_url"] async for doc in db.weddings.find(
+                {"custom_url": {"$nin": [None, ""]}}, {"_id": 0, "custom_url": 1})]
+        else:
+            slugs = [doc["id"] for doc in slugs_store.all().values() if doc.get("wedding_id")]
+            slugs += [doc["custom_url"] for doc in weddings_store.all().values() if doc.get("custom_url")]
+        slug_set.replace(slugs)
+    except Exception as e:
+        log_event(logging.WARNING, "slugs.refresh_failed", error=str(e))
+
+async def get_slug_from_db(slug: str) -> Optional[dict]:
+    if mongo_available():
+        try:
+            return await db.slugs.find_one({"id": slug}, {"_id": 0})
+        except Exception as e:
+            mongo_failed("get_slug", e)
+    
+    # Fallback to JSON
+    return slugs_store.get(slug)
+
+async def set_slug_in_db(slug: str, wedding_id: str, canonical: bool) -> bool:
+    """Point ``slug`` at ``wedding_id`` unless another wedding owns it; True on success."""
+    fields = {"wedding_id": wedding_id, "canonical": canonical, "updated_at": datetime.utcnow()}
+    if mongo_available():
+        try:
+            # Matches our own or an ownerless record; if another wedding
+            # owns the slug, the upsert collides with its id instead.
+            await db.slugs.update_one(
+                {"id": slug, "$or": [{"wedding_id": wedding_id}, {"wedding_id": None}]},
+                {"$set": fields},
+                upsert=True,
+            )
+            return True
+        except DuplicateKeyError:
+            return False
+        except Exception as e:
+            mongo_failed("set_slug", e)
+    
+    # Fallback to JSON
+    updated = await slugs_store.update_one_async(
+        "id", slug, {"$set": fields}, where=lambda doc: doc.get("wedding_id") in (None, wedding_id)
+    )
+    if updated is None and not await slugs_store.insert_if_absent_async("id", slug, {"id": slug, **fields}):
+        return False
+    note_fallback_write("slugs", slug)
+    return True
+
+async def release_slug_in_db(slug: str, wedding_id: str):
+    fields = {"wedding_id": None, "canonical": False, "updated_at": datetime.utcnow()}
+    if mongo_available():
+        try:
+            await db.slugs.update_one({"id": slug, "wedding_id": wedding_id}, {"$set": fields})
+            return
+        except Exception as e:
+            mongo_failed("release_slug", e)
+    
+    # Fallback to JSON
+    if await slugs_store.update_one_async("id", slug, {"$set": fields},
+                                          where=lambda doc: doc.get("wedding_id") == wedding_id):
+        note_fallback_write("slugs", slug)
+
+async def get_wedding_aliases_from_db(wedding_id: str) -> list:
+    """Alias slugs of a wedding, most recently renamed away from first."""
+    if mongo_available():
+        try:
+            return await db.slugs.find(
+                {"wedding_id": wedding_id, "canonical": False}, {"_id": 0}
+            ).sort("updated_at", -1).to_list(length=None)
+        except Exception as e:
+            mongo_failed("get_wedding_aliases", e)
+    
+    # Fallback to JSON
+    aliases = [doc for doc in slugs_store.find_many("wedding_id", wedding_id) if not doc.get("canonical")]
+    return sorted(aliases, key=lambda doc: str(doc["updated_at"]), reverse=True)
+
+async def claim_custom_url(update: dict, user_id: str, wedding_id: str = None) -> Optional[tuple]:
+    """Normalize and reserve the custom_url an update sets.
+
+    Rewrites ``update["$set"]["custom_url"]`` to its slug. When the slug
+    changes, returns (wedding_id, new_slug, old_slug) for
+    ``settle_custom_url`` once the wedding write is done; None otherwise.
+    ``wedding_id`` is given for a wedding that is being created.
+    """
+    fields = update.get("$set", {})
+    if "custom_url" not in fields:
+        return None
+    # PUT and POST bodies reach here unvalidated; reject non-strings with 422
+    raw = _validate_wedding_field("custom_url", fields["custom_url"]) or ""
+    slug = normalize_slug(raw)
+    problem = slug_problem(slug) if raw.strip() else None
+    if problem:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=f"custom_url {problem}"
+        )
+    fields["custom_url"] = slug
+
+    old = ""
+    if wedding_id is None:
+        current = await get_wedding_from_db(user_id=user_id, projection={"id": 1, "custom_url": 1})
+        if current is None:
+            return None  # the update itself answers 404
+        wedding_id, old = current["id"], current.get("custom_url") or ""
+    if slug == old:
+        return None
+
+    taken = HTTPException(
+        status_code=status.HTTP_409_CONFLICT,
+        detail="This custom URL is already taken"
+    )
+    if slug:
+        # Weddings from before the registry hold their slug without a record
+        holder = await get_wedding_from_db(custom_url=slug, projection={"id": 1})
+        if holder is not None and holder["id"] != wedding_id:
+            raise taken
+        if not await set_slug_in_db(slug, wedding_id, canonical=True):
+            raise taken
+        slug_set.add(slug)
+    return (wedding_id, slug, old)
+
+async def settle_custom_url(change: Optional[tuple], saved: bool):
+    """Finish a slug change: keep the old slug as an alias, or undo the claim."""
+    if change is None:
+        return
+    wedding_id, slug, old = change
+    if not saved:
+        if slug:
+            await release_slug_in_db(slug, wedding_id)
+            slug_set.discard(slug)
+        return
+    if old:
+        await set_slug_in_db(old, wedding_id, canonical=False)
+        for alias in (await get_wedding_aliases_from_db(wedding_id))[SLUG_MAX_ALIASES:]:
+            await release_slug_in_db(alias["id"], wedding_id)
+            slug_set.discard(alias["id"])
+
+async def slug_owned_by_user(slug: str, user_id: str) -> bool:
+    """Whether ``slug`` is the current slug or an alias of the user's wedding."""
+    registered = await get_slug_from_db(slug)
+    if not registered or not registered.get("wedding_id"):
+        return False
+    wedding = await get_wedding_from_db(user_id=user_id, projection={"id": 1})
+    return wedding is not None and wedding["id"] == registered["wedding_id"]
+
+@api_router.get("/custom-url/available")
+async def custom_url_available(slug: str, session_id: Optional[str] = None):
+    """Whether ``slug`` can be claimed; with a ``session_id``, the caller's
+    own slugs count as available, since they may keep or reclaim them."""
+    normalized = normalize_slug(slug)
+    problem = slug_problem(normalized)
+    if problem:
+        return {"slug": normalized, "available": False, "reason": problem}
+    if normalized in slug_set and not (
+        session_id and await slug_owned_by_user(normalized, get_current_user_simple(session_id))
+    ):
+        return {"slug": normalized, "available": False, "reason": "is already taken"}
+    return {"slug": normalized, "available": True}
+
+# Simple Wedding Data Routes using MongoDB
+@api_router.post("/wedding")
+async def create_wedding_data(request_data: dict):
+    session_id = request_data.get('session_id')
+    if not session_id:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Session ID required"
+        )
+    
+    user_id = get_current_user_simple(session_id)
+    
+    # Remove session_id and server-owned fields before creating the wedding
+    wedding_create_data = {k: v for k, v in request_data.items()
+                           if k != 'session_id' and k not in WEDDING_PROTECTED_FIELDS}
+    
+    await externalize_photos_in_update({"$set": wedding_create_data})
+    # Validate the whole document before reserving its slug
+    try:
+        wedding = WeddingData(user_id=user_id, **wedding_create_data)
+    except ValidationError as e:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=e.errors(include_url=False)
+        )
+    
+    wedding_doc = wedding.model_dump()
+    slug_change = await claim_custom_url({"$set": wedding_doc}, user_id, wedding_doc["id"])
+    try:
+        created = await create_wedding_in_db(wedding_doc)
+    except BaseException:
+        await settle_custom_url(slug_change, False)
+        raise
+    await settle_custom_url(slug_change, created)
+    if not created:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="User already has a wedding card. Use update endpoint instead."
+        )
+    await schedule_wedding_derivatives(wedding_doc)
+    return FastJSONResponse(wedding_doc)
+
+@api_router.put("/wedding")
+async def update_wedding_data(request_data: dict):
+    session_id = request_data.get('session_id')
+    if not session_id:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Session ID required"
+        )
+    
+    user_id = get_current_user_simple(session_id)
     
-    # Remove session_id from the data before updating
-    updated_data = {k: v for k, v in request_data.items() if k != 'session_id'}
+    # Remove session_id and server-owned fields; the rest is validated like
+    # a PATCH and set in one atomic update (fields the client did not resend
+    # are kept).
+    updated_data = {k: _validate_wedding_field(k, v) for k, v in request_data.items()
+                    if k != 'session_id' and k not in WEDDING_PROTECTED_FIELDS}
     updated_data["updated_at"] = datetime.utcnow()
-    updated_data["user_id"] = user_id
-    updated_data["id"] = existing_wedding["id"]
+    update = {"$set": updated_data}
+    await externalize_photos_in_update(update)
+    
+    slug_change = await claim_custom_url(update, user_id)
+    try:
+        wedding = await apply_wedding_update(user_id, update, expected_version_from(request_data))
+    except BaseException:
+        await settle_custom_url(slug_change, False)
+        raise
+    await settle_custom_url(slug_change, True)
+    await schedule_wedding_derivatives(wedding)
+    return FastJSONResponse(wedding)
+
+@api_router.patch("/wedding")
+async def patch_wedding_data(request_data: dict):
+    session_id = request_data.get('session_id')
+    if not session_id:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Session ID required"
+        )
     
-    await save_wedding_to_db(updated_data)
-    return updated_data
+    user_id = get_current_user_simple(session_id)
+    update = build_wedding_update(request_data)
+    await externalize_photos_in_update(update)
+    slug_change = await claim_custom_url(update, user_id)
+    try:
+        wedding = await apply_wedding_update(user_id, update, expected_version_from(request_data))
+    except BaseException:
+        await settle_custom_url(slug_change, False)
+        raise
+    await settle_custom_url(slug_change, True)
+    await schedule_wedding_derivatives(wedding)
+    return FastJSONResponse(wedding)
 
 @api_router.get("/wedding")
-async def get_wedding_data(session_id: str):
+async def get_wedding_data(session_id: str, fields: Optional[str] = None):
     user_id = get_current_user_simple(session_id)
-    wedding = await get_wedding_from_db(user_id=user_id)
+    wedding = await get_wedding_from_db(
+        user_id=user_id, projection=wedding_projection(parse_wedding_fields(fields), public=False)
+    )
     
     if not wedding:
         raise HTTPException(
@@ -399,11 +3122,11 @@ async def get_wedding_data(session_id: str):
             detail="Wedding data not found"
         )
     
-    return wedding
+    return FastJSONResponse(wedding)
 
 @api_router.get("/wedding/public/{wedding_id}")
-async def get_public_wedding_data(wedding_id: str):
-    wedding = await get_wedding_from_db(wedding_id=wedding_id)
+async def get_public_wedding_data(wedding_id: str, request: Request, fields: Optional[str] = None):
+    wedding = await get_public_wedding_cached(wedding_id=wedding_id, fields=parse_wedding_fields(fields))
     
     if not wedding:
         raise HTTPException(
@@ -411,30 +3134,37 @@ async def get_public_wedding_data(wedding_id: str):
             detail="Wedding not found"
         )
     
-    # Remove sensitive data for public access
-    public_data = {k: v for k, v in wedding.items() if k not in ["user_id"]}
-    return public_data
+    return await public_wedding_response(request, wedding)
 
 @api_router.get("/wedding/public/custom/{custom_url}")
-async def get_public_wedding_by_custom_url(custom_url: str):
-    print(f"🔍 Searching for wedding with custom URL: {custom_url}")
-    wedding = await get_wedding_from_db(custom_url=custom_url)
+async def get_public_wedding_by_custom_url(custom_url: str, request: Request, fields: Optional[str] = None):
+    wedding = await get_public_wedding_cached(custom_url=custom_url, fields=parse_wedding_fields(fields))
     
     if not wedding:
-        print(f"❌ No wedding found with custom URL: {custom_url}")
+        # An old slug kept as an alias, or a differently written one
+        # ("Emma-And-James"): redirect to where the wedding is now.
+        registered = await get_slug_from_db(normalize_slug(custom_url))
+        if registered and registered.get("wedding_id"):
+            current = await get_public_wedding_cached(wedding_id=registered["wedding_id"], fields=("id", "custom_url"))
+            if current is not None:
+                target = orjson.loads(current.body).get("custom_url")
+                if target != custom_url:
+                    url = (f"/api/wedding/public/custom/{target}" if target
+                           else f"/api/wedding/public/{registered['wedding_id']}")
+                    if request.url.query:
+                        url += "?" + request.url.query
+                    return RedirectResponse(url, status_code=status.HTTP_308_PERMANENT_REDIRECT)
+        log_event(logging.DEBUG, "public_wedding.not_found", custom_url=custom_url)
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Wedding not found with this custom URL"
         )
     
-    print(f"✅ Found wedding for custom URL: {custom_url}")
-    # Remove sensitive data for public access
-    public_data = {k: v for k, v in wedding.items() if k not in ["user_id"]}
-    return public_data
+    return await public_wedding_response(request, wedding)
 
 @api_router.get("/wedding/public/user/{user_id}")
-async def get_public_wedding_by_user_id(user_id: str):
-    wedding = await get_wedding_from_db(user_id=user_id)
+async def get_public_wedding_by_user_id(user_id: str, request: Request, fields: Optional[str] = None):
+    wedding = await get_public_wedding_cached(user_id=user_id, fields=parse_wedding_fields(fields))
     
     if not wedding:
         raise HTTPException(
@@ -442,9 +3172,549 @@ async def get_public_wedding_by_user_id(user_id: str):
             detail="Wedding not found for this user"
         )
     
-    # Remove sensitive data for public access
-    public_data = {k: v for k, v in wedding.items() if k not in ["user_id"]}
-    return public_data
+    return await public_wedding_response(request, wedding)
+
+# RSVP ingestion
+# A submission is validated, given an id derived from the wedding and the
+# guest (email, else phone, else name) and put in an in-memory buffer; the
+# request returns 202 without waiting for storage. A background task writes
+# the buffer in batches (one bulk upsert to Mongo, or one JSON store
+# persist). The same guest submitting again replaces their earlier answer,
+# so client retries never create duplicates.
+RSVP_ID_NAMESPACE = uuid.uuid5(uuid.NAMESPACE_URL, "https://weddingcard/rsvp")
+
+def rsvp_guest_key(rsvp: RSVPCreate) -> str:
+    if rsvp.email and rsvp.email.strip():
+        return "email:" + rsvp.email.strip().casefold()
+    digits = re.sub(r"\D", "", rsvp.phone or "")
+    if len(digits) >= 7:
+        return "phone:" + digits
+    return "name:" + " ".join(rsvp.name.split()).casefold()
+
+def rsvp_id(wedding_id: str, guest_key: str) -> str:
+    return str(uuid.uuid5(RSVP_ID_NAMESPACE, f"{wedding_id}:{guest_key}"))
+
+async def save_rsvps_to_db(docs: list):
+    """Upsert a batch of RSVPs by id, keeping each one's first created_at,
+    and apply the resulting changes to the weddings' stats."""
+    if mongo_available():
+        operations = [
+            UpdateOne(
+                {"id": doc["id"]},
+                {"$set": {k: v for k, v in doc.items() if k != "created_at"},
+                 "$setOnInsert": {"created_at": doc["created_at"]}},
+                upsert=True,
+            )
+            for doc in docs
+        ]
+        try:
+            previous = await db.rsvps.find(
+                {"id": {"$in": [doc["id"] for doc in docs]}}, RSVP_STATS_PROJECTION
+            ).to_list(length=None)
+            try:
+                await db.rsvps.bulk_write(operations, ordered=False)
+            except BulkWriteError as e:
+                # Another worker inserted the same new guest first; retried,
+                # the upsert updates that document instead.
+                errors = e.details["writeErrors"]
+                if any(error.get("code") != 11000 for error in errors):
+                    raise
+                await db.rsvps.bulk_write([operations[error["index"]] for error in errors], ordered=False)
+        except BulkWriteError:
+            raise
+        except Exception as e:
+            mongo_failed("save_rsvps", e)
+        else:
+            await apply_rsvp_stats_deltas(rsvp_stats_deltas(docs, {doc["id"]: doc for doc in previous}))
+            return
+
+    # Fallback to JSON
+    docs = [dict(doc) for doc in docs]
+    previous = {}
+    for doc in docs:
+        existing = rsvps_store.get(doc["id"])
+        if existing is not None:
+            previous[doc["id"]] = existing
+            doc["created_at"] = existing["created_at"]
+    await rsvps_store.put_many_async(docs)
+    for doc in docs:
+        note_fallback_write("rsvps", doc["id"])
+    await apply_rsvp_stats_deltas(rsvp_stats_deltas(docs, previous))
+
+# RSVP statistics
+# Each wedding has one stats document (headcounts and meal choices) that is
+# kept current with $inc: when a batch of RSVPs is written, the difference
+# between each guest's previous and new answer is added to it. Reading the
+# dashboard numbers is then a single document lookup. If the two ever drift
+# apart (say, a crash between the RSVP write and the $inc),
+# ``manage.py rebuild-rsvp-stats`` recounts from the stored RSVPs.
+RSVP_STAT_FIELDS = ("responses", "attending", "declined", "guests", "plus_ones")
+RSVP_STATS_PROJECTION = {"_id": 0, "id": 1, "wedding_id": 1, "attendance": 1, "guests": 1, "meal_choice": 1}
+
+def normalize_meal_choice(meal_choice: Optional[str]) -> Optional[str]:
+    # Becomes part of a field name ("meals.<choice>") in the stats document
+    slug = re.sub(r"[^a-z0-9]+", "-", (meal_choice or "").casefold()).strip("-")
+    return slug or None
+
+def rsvp_contribution(rsvp: Optional[dict]) -> Counter:
+    """What one RSVP adds to its wedding's stats, as $inc amounts."""
+    counts = Counter()
+    if rsvp is None:
+        return counts
+    counts["responses"] += 1
+    if rsvp.get("attendance") == "yes":
+        guests = int(rsvp.get("guests") or 1)
+        counts["attending"] += 1
+        counts["guests"] += guests
+        counts["plus_ones"] += guests - 1
+        if rsvp.get("meal_choice"):
+            counts["meals." + rsvp["meal_choice"]] += 1
+    else:
+        counts["declined"] += 1
+    return counts
+
+def rsvp_stats_deltas(docs: list, previous: dict) -> dict:
+    """wedding_id -> non-zero $inc amounts for writing ``docs`` over ``previous`` (by id)."""
+    deltas = {}
+    for doc in docs:
+        delta = deltas.setdefault(doc["wedding_id"], Counter())
+        delta.update(rsvp_contribution(doc))
+        delta.subtract(rsvp_contribution(previous.get(doc["id"])))
+    return {wedding_id: {key: amount for key, amount in delta.items() if amount}
+            for wedding_id, delta in deltas.items() if any(delta.values())}
+
+def rsvp_stats_doc(wedding_id: str, counts: Counter, updated_at: Optional[datetime]) -> dict:
+    return {
+        "id": wedding_id,
+        "wedding_id": wedding_id,
+        **{field: counts.get(field, 0) for field in RSVP_STAT_FIELDS},
+        "meals": {key.split(".", 1)[1]: amount for key, amount in counts.items()
+                  if key.startswith("meals.") and amount},
+        "updated_at": updated_at,
+    }
+
+async def apply_rsvp_stats_deltas(deltas: dict):
+    if not deltas:
+        return
+    now = datetime.utcnow()
+    if mongo_available():
+        try:
+            await db.rsvp_stats.bulk_write([
+                UpdateOne({"id": wedding_id},
+                          {"$inc": delta, "$set": {"updated_at": now}, "$setOnInsert": {"wedding_id": wedding_id}},
+                          upsert=True)
+                for wedding_id, delta in deltas.items()
+            ], ordered=False)
+            return
+        except Exception as e:
+            # The RSVPs are already written; only the counters are behind,
+            # and the replay's recount fixes them whatever the error was.
+            stale_rsvp_stats.update(deltas)
+            if isinstance(e, MONGO_CONNECTIVITY_ERRORS):
+                mongo_failed("update_rsvp_stats", e)
+            else:
+                log_event(logging.ERROR, "mongo.op_error", op="update_rsvp_stats", error=str(e))
+            return
+
+    # Fallback to JSON
+    for wedding_id, delta in deltas.items():
+        update = {"$inc": delta, "$set": {"updated_at": now}}
+        if await rsvp_stats_store.update_one_async("id", wedding_id, update) is None:
+            await rsvp_stats_store.put_async(apply_update_ops({"id": wedding_id, "wedding_id": wedding_id}, update))
+        if MONGO_ENABLED:
+            stale_rsvp_stats.add(wedding_id)
+
+async def get_rsvp_stats_from_db(wedding_id: str) -> Optional[dict]:
+    if mongo_available():
+        try:
+            return await db.rsvp_stats.find_one({"id": wedding_id}, {"_id": 0})
+        except Exception as e:
+            mongo_failed("get_rsvp_stats", e)
+    
+    # Fallback to JSON
+    return rsvp_stats_store.get(wedding_id)
+
+async def rebuild_rsvp_stats_in_mongo(wedding_ids=None) -> int:
+    """Recount stats documents from the stored RSVPs; returns how many weddings have RSVPs.
+
+    ``wedding_ids`` limits the rebuild to those weddings; by default every
+    wedding is recounted. Stats of weddings without RSVPs are removed
+    (zeroed by ``rebuild_rsvp_stats_in_json``, its JSON store counterpart).
+    """
+    now = datetime.utcnow()
+    totals = {}
+    query = {"wedding_id": {"$in": list(wedding_ids)}} if wedding_ids is not None else {}
+    async for rsvp in db.rsvps.find(query, RSVP_STATS_PROJECTION):
+        totals.setdefault(rsvp["wedding_id"], Counter()).update(rsvp_contribution(rsvp))
+    emptied = set(wedding_ids) if wedding_ids is not None else set(await db.rsvp_stats.distinct("id"))
+    emptied -= totals.keys()
+    operations = [ReplaceOne({"id": wedding_id}, rsvp_stats_doc(wedding_id, counts, now), upsert=True)
+                  for wedding_id, counts in totals.items()]
+    if emptied:
+        operations.append(DeleteMany({"id": {"$in": list(emptied)}}))
+    if operations:
+        await db.rsvp_stats.bulk_write(operations, ordered=False)
+    return len(totals)
+
+async def rebuild_rsvp_stats_in_json(wedding_ids=None) -> int:
+    now = datetime.utcnow()
+    totals = {}
+    for rsvp in rsvps_store.all().values():
+        if wedding_ids is None or rsvp["wedding_id"] in wedding_ids:
+            totals.setdefault(rsvp["wedding_id"], Counter()).update(rsvp_contribution(rsvp))
+    emptied = set(wedding_ids) if wedding_ids is not None else set(rsvp_stats_store.all())
+    emptied -= totals.keys()
+    docs = [rsvp_stats_doc(wedding_id, counts, now) for wedding_id, counts in totals.items()]
+    docs += [rsvp_stats_doc(wedding_id, Counter(), now) for wedding_id in emptied
+             if rsvp_stats_store.get(wedding_id) is not None]
+    if docs:
+        await rsvp_stats_store.put_many_async(docs)
+    return len(totals)
+
+class RsvpWriteBuffer:
+    """Pending RSVPs by id, written by a background task in batches.
+
+    The flush task is started by the first submission, so the buffer also
+    works where startup events never run. A failed or cancelled batch is put
+    back (unless the guest has resubmitted since) and retried on the next
+    flush.
+    """
+
+    def __init__(self, batch_size: int, interval: float, max_pending: int, writer):
+        self.batch_size = batch_size
+        self.interval = interval
+        self.max_pending = max_pending
+        self._writer = writer
+        self._pending = {}
+        self._wake = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._task = None
+        self._closing = False
+        self.accepted = 0
+        self.coalesced = 0
+        self.rejected = 0
+        self.written = 0
+        self.batches = 0
+        self.failures = 0
+
+    def submit(self, doc: dict) -> bool:
+        """Queue ``doc``; False when the buffer is full."""
+        previous = self._pending.get(doc["id"])
+        if previous is not None:
+            self.coalesced += 1
+            doc = {**doc, "created_at": previous["created_at"]}
+        elif len(self._pending) >= self.max_pending:
+            self.rejected += 1
+            return False
+        self._pending[doc["id"]] = doc
+        self.accepted += 1
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+        if len(self._pending) >= self.batch_size:
+            self._wake.set()
+        return True
+
+    async def _run(self):
+        while not self._closing:
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            await self.flush()
+
+    async def flush(self):
+        async with self._flush_lock:
+            while self._pending:
+                ids = list(itertools.islice(self._pending, self.batch_size))
+                batch = [self._pending.pop(doc_id) for doc_id in ids]
+                try:
+                    await self._writer(batch)
+                except BaseException as e:
+                    for doc in batch:
+                        self._pending.setdefault(doc["id"], doc)
+                    if not isinstance(e, Exception):
+                        raise
+                    self.failures += 1
+                    log_event(logging.ERROR, "rsvp.flush_failed", batch=len(batch), error=str(e))
+                    return
+                self.written += len(batch)
+                self.batches += 1
+
+    async def close(self):
+        task, self._task = self._task, None
+        if task is not None:
+            # Let the loop finish the batch it is writing rather than
+            # cancelling it halfway, and stop it after that flush.
+            self._closing = True
+            self._wake.set()
+            try:
+                await task
+            finally:
+                self._closing = False
+        await self.flush()
+
+    def stats(self):
+        return {
+            "pending": len(self._pending),
+            "accepted": self.accepted,
+            "coalesced": self.coalesced,
+            "rejected": self.rejected,
+            "written": self.written,
+            "batches": self.batches,
+            "failures": self.failures,
+        }
+
+rsvp_buffer = RsvpWriteBuffer(RSVP_FLUSH_BATCH_SIZE, RSVP_FLUSH_INTERVAL_SECONDS, RSVP_MAX_PENDING,
+                              writer=save_rsvps_to_db)
+
+def encode_keyset_cursor(doc: dict) -> str:
+    created_at = doc["created_at"]
+    if isinstance(created_at, datetime):
+        created_at = created_at.isoformat()
+    raw = encode_json([created_at, doc["id"]])
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_keyset_cursor(cursor: str) -> tuple:
+    try:
+        created_at, doc_id = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        return datetime.fromisoformat(created_at), str(doc_id)
+    except (ValueError, TypeError, binascii.Error):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor"
+        )
+
+async def list_rsvps_from_db(wedding_id: str, limit: int, after: Optional[tuple] = None) -> list:
+    """RSVPs of a wedding in (created_at, id) order, starting after ``after``."""
+    if mongo_available():
+        try:
+            query = {"wedding_id": wedding_id}
+            if after:
+                created_at, doc_id = after
+                query["$or"] = [{"created_at": {"$gt": created_at}},
+                                {"created_at": created_at, "id": {"$gt": doc_id}}]
+            cursor = db.rsvps.find(query, {"_id": 0}).sort([("created_at", 1), ("id", 1)]).limit(limit)
+            return await cursor.to_list(length=limit)
+        except Exception as e:
+            mongo_failed("list_rsvps", e)
+
+    # Fallback to JSON (datetimes are stored as str(), which sorts correctly)
+    docs = sorted(rsvps_store.find_many("wedding_id", wedding_id),
+                  key=lambda doc: (doc["created_at"], doc["id"]))
+    if after:
+        position = (str(after[0]), after[1])
+        docs = [doc for doc in docs if (doc["created_at"], doc["id"]) > position]
+    return docs[:limit]
+
+async def require_public_wedding(wedding_id: str):
+    # A cached id-only lookup, so guest posts don't each hit the database
+    if await get_public_wedding_cached(wedding_id=wedding_id, fields=("id",)) is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Wedding not found"
+        )
+
+@api_router.post("/wedding/{wedding_id}/rsvp", status_code=status.HTTP_202_ACCEPTED)
+async def submit_rsvp(wedding_id: str, rsvp: RSVPCreate):
+    await require_public_wedding(wedding_id)
+    guest_key = rsvp_guest_key(rsvp)
+    now = datetime.utcnow()
+    doc = {
+        "id": rsvp_id(wedding_id, guest_key),
+        "wedding_id": wedding_id,
+        "guest_key": guest_key,
+        **rsvp.model_dump(),
+        "meal_choice": normalize_meal_choice(rsvp.meal_choice),
+        "created_at": now,
+        "updated_at": now,
+    }
+    if not rsvp_buffer.submit(doc):
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Server is busy, please try again",
+            headers={"Retry-After": "1"}
+        )
+    return {"id": doc["id"], "status": "accepted"}
+
+@api_router.get("/wedding/rsvps")
+async def list_rsvps(session_id: str, limit: int = 50, cursor: Optional[str] = None):
+    user_id = get_current_user_simple(session_id)
+    wedding = await get_wedding_from_db(user_id=user_id, projection={"id": 1})
+    if not wedding:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Wedding data not found"
+        )
+    limit = max(1, min(limit, RSVP_PAGE_SIZE_MAX))
+    after = decode_keyset_cursor(cursor) if cursor else None
+    # One extra row tells whether there is a next page
+    rsvps = await list_rsvps_from_db(wedding["id"], limit + 1, after)
+    next_cursor = encode_keyset_cursor(rsvps[limit - 1]) if len(rsvps) > limit else None
+    return FastJSONResponse({"rsvps": rsvps[:limit], "next_cursor": next_cursor})
+
+@api_router.get("/wedding/stats")
+async def get_rsvp_stats(session_id: str):
+    user_id = get_current_user_simple(session_id)
+    wedding = await get_wedding_from_db(user_id=user_id, projection={"id": 1})
+    if not wedding:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Wedding data not found"
+        )
+    stats = await get_rsvp_stats_from_db(wedding["id"])
+    if stats is None:
+        stats = rsvp_stats_doc(wedding["id"], Counter(), None)
+    # Choices everyone has switched away from stay behind at 0
+    stats["meals"] = {choice: count for choice, count in (stats.get("meals") or {}).items() if count}
+    return FastJSONResponse(stats)
+
+# Guestbook
+# Entries live in their own collection (or the append-only GuestbookLog), so
+# posting one never touches the wedding document. Pages are read newest
+# first with a (created_at, id) keyset cursor; the first page of each
+# wedding is cached and served with an ETag like a public wedding.
+guestbook_cache = WeddingCache(GUESTBOOK_CACHE_MAX_ENTRIES, GUESTBOOK_CACHE_TTL_SECONDS)
+
+async def save_guestbook_entry_to_db(entry: dict):
+    if mongo_available():
+        try:
+            await db.guestbook.insert_one(dict(entry))
+            return
+        except Exception as e:
+            mongo_failed("save_guestbook_entry", e)
+
+    # Fallback to JSON
+    await guestbook_log.append(entry)
+    note_fallback_write("guestbook", entry["id"])
+
+async def list_guestbook_from_db(wedding_id: str, limit: int, before: Optional[tuple] = None) -> list:
+    """Entries of a wedding newest first, starting before ``before`` (created_at, id)."""
+    if mongo_available():
+        try:
+            query = {"wedding_id": wedding_id}
+            if before:
+                created_at, entry_id = before
+                query["$or"] = [{"created_at": {"$lt": created_at}},
+                                {"created_at": created_at, "id": {"$lt": entry_id}}]
+            cursor = db.guestbook.find(query, {"_id": 0}).sort([("created_at", -1), ("id", -1)]).limit(limit)
+            return await cursor.to_list(length=limit)
+        except Exception as e:
+            mongo_failed("list_guestbook", e)
+
+    # Fallback to JSON
+    return guestbook_log.page(wedding_id, limit, (str(before[0]), before[1]) if before else None)
+
+async def guestbook_page(wedding_id: str, limit: int, before: Optional[tuple] = None) -> dict:
+    # One extra row tells whether there is a next page
+    entries = await list_guestbook_from_db(wedding_id, limit + 1, before)
+    next_cursor = encode_keyset_cursor(entries[limit - 1]) if len(entries) > limit else None
+    return {"entries": entries[:limit], "next_cursor": next_cursor}
+
+@api_router.post("/wedding/{wedding_id}/guestbook", status_code=status.HTTP_201_CREATED)
+async def post_guestbook_entry(wedding_id: str, entry: GuestbookEntryCreate):
+    await require_public_wedding(wedding_id)
+    doc = {
+        "id": str(uuid.uuid4()),
+        "wedding_id": wedding_id,
+        **entry.model_dump(),
+        "created_at": datetime.utcnow(),
+    }
+    await save_guestbook_entry_to_db(doc)
+    guestbook_cache.invalidate(wedding_id)
+    return FastJSONResponse(doc, status_code=status.HTTP_201_CREATED)
+
+@api_router.get("/wedding/{wedding_id}/guestbook")
+async def get_guestbook(wedding_id: str, request: Request, limit: int = GUESTBOOK_PAGE_SIZE,
+                        cursor: Optional[str] = None):
+    limit = max(1, min(limit, GUESTBOOK_PAGE_SIZE_MAX))
+    if cursor:
+        return FastJSONResponse(await guestbook_page(wedding_id, limit, decode_keyset_cursor(cursor)))
+    if limit != GUESTBOOK_PAGE_SIZE:
+        await require_public_wedding(wedding_id)
+        return FastJSONResponse(await guestbook_page(wedding_id, limit))
+
+    async def load():
+        if await get_public_wedding_cached(wedding_id=wedding_id, fields=("id",)) is None:
+            return None
+        return PublicWedding(await guestbook_page(wedding_id, limit), wedding_id)
+
+    page = await guestbook_cache.get_or_load(wedding_id, load)
+    if page is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Wedding not found"
+        )
+    return await public_wedding_response(request, page, cache_control=GUESTBOOK_CACHE_CONTROL)
+
+# Gallery photo uploads and downloads
+@api_router.post("/wedding/photos")
+async def upload_wedding_photo(session_id: str, file: UploadFile = File(...)):
+    """Store an image in the blob store; add the returned URL to gallery_photos."""
+    user_id = get_current_user_simple(session_id)
+    try:
+        content_type = sniff_image_type(await file.read(16))
+        if content_type is None:
+            raise HTTPException(
+                status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+                detail="Only JPEG, PNG, GIF, WebP and AVIF images can be uploaded"
+            )
+        await file.seek(0)
+        digest, size = await asyncio.to_thread(blob_store.put_stream, file.file)
+    except BlobTooLargeError:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"Photos are limited to {BLOB_MAX_BYTES} bytes"
+        )
+    finally:
+        await file.close()
+    
+    log_event(logging.INFO, "blob.stored", digest=digest, size=size, user_id=user_id)
+    if derivative_pipeline.enabled:
+        derivative_pipeline.schedule(await asyncio.to_thread(derivative_pipeline.missing, [digest]))
+    return {"digest": digest, "url": blob_url(digest), "size": size, "content_type": content_type}
+
+@api_router.get("/blobs/{digest}")
+async def get_blob(digest: str, request: Request):
+    if not BlobStore.is_digest(digest):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Blob not found")
+    try:
+        size = (await asyncio.to_thread(blob_store.path(digest).stat)).st_size
+    except FileNotFoundError:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Blob not found")
+    
+    etag = f'"{digest}"'
+    headers = {"ETag": etag, "Cache-Control": BLOB_CACHE_CONTROL, "Accept-Ranges": "bytes"}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    
+    byte_range = parse_byte_range(request.headers.get("range"), size)
+    start, end = byte_range or (0, size - 1)
+    headers["Content-Length"] = str(end - start + 1)
+    if byte_range:
+        headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+    content_type = sniff_image_type(await asyncio.to_thread(blob_store.head, digest))
+    return StreamingResponse(
+        blob_store.iter_range(digest, start, end),
+        status_code=status.HTTP_206_PARTIAL_CONTENT if byte_range else status.HTTP_200_OK,
+        media_type=content_type or "application/octet-stream",
+        headers=headers,
+    )
+
+@api_router.get("/blobs/{digest}/{variant}")
+async def get_blob_derivative(digest: str, variant: str, request: Request):
+    """A rendered thumbnail or width of a blob (see DerivativePipeline)."""
+    if not BlobStore.is_digest(digest) or not DerivativePipeline.VARIANT_RE.match(variant):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Blob not found")
+    path = derivative_pipeline.variant_path(digest, variant)
+    if not await asyncio.to_thread(path.is_file):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Blob not found")
+    
+    etag = f'"{digest}-{variant}"'
+    headers = {"ETag": etag, "Cache-Control": BLOB_CACHE_CONTROL}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return FileResponse(path, media_type="image/webp", headers=headers)
 
 # Get user profile - Simple version
 @api_router.get("/profile")
@@ -464,6 +3734,233 @@ async def get_profile(session_id: str):
         "created_at": user_data["created_at"]
     }
 
+# Runtime counters for caches and storage
+@api_router.get("/metrics")
+async def get_metrics():
+    return {
+        "wedding_cache": wedding_cache.stats(),
+        "derivatives": derivative_pipeline.stats(),
+        "precompressor": precompressor.stats(),
+        "password_hasher": password_hasher.stats(),
+        "admission": admission_stats(),
+        "rsvp_buffer": rsvp_buffer.stats(),
+        "guestbook_cache": guestbook_cache.stats(),
+        "slug_set": slug_set.stats(),
+        "stale_rsvp_stats": len(stale_rsvp_stats),
+        "mongo_breaker": {
+            **mongo_breaker.stats(),
+            "pending_replay": {name: len(ids) for name, ids in pending_replay.items()},
+            "replayed": dict(replayed_writes),
+            "replay_conflicts": dict(replay_conflicts),
+        },
+    }
+
+# Health probes for the orchestrator
+@api_router.get("/health/live")
+async def health_live():
+    # The event loop is answering; nothing else is checked.
+    return {"status": "alive"}
+
+@api_router.get("/health/ready")
+async def health_ready():
+    if mongo_ready:
+        storage = "mongo" if mongo_breaker.state == CircuitBreaker.CLOSED else "json_fallback"
+    else:
+        storage = "json"
+    ready = app_ready and (mongo_ready or not READY_REQUIRES_MONGO)
+    body = {
+        "status": "ready" if ready else "starting",
+        "storage": storage,
+        "mongo": {
+            "enabled": MONGO_ENABLED,
+            "connected": mongo_ready,
+            "connect_attempts": mongo_connect_status["attempts"],
+            "breaker": mongo_breaker.state,
+        },
+        "uptime_seconds": round(time.monotonic() - PROCESS_STARTED_AT, 1),
+        "startup": dict(startup_timings),
+    }
+    return JSONResponse(body, status_code=status.HTTP_200_OK if ready else status.HTTP_503_SERVICE_UNAVAILABLE)
+
+# Admin NDJSON export/import
+# Exports stream one document per line in ``id`` order straight from a Mongo
+# cursor (or the JSON store), so memory stays flat however large the
+# collection is; ``?after=<id>`` resumes an interrupted export. Imports read
+# the upload incrementally and upsert it by ``id`` in batches; ``?skip=N``
+# resumes after the ``committed_lines`` reported by an interrupted import.
+ADMIN_COLLECTIONS = {
+    # collection -> (JSON store, fields that must be unique, required fields)
+    "users": (users_store, ("username",), ("id", "username")),
+    "weddings": (weddings_store, ("user_id",), ("id", "user_id")),
+    "rsvps": (rsvps_store, (), ("id", "wedding_id")),
+    "slugs": (slugs_store, (), ("id",)),
+}
+ADMIN_IMPORT_MAX_ERRORS = 100
+ADMIN_IMPORT_HISTORY = 20
+# import_id -> progress of running and recent imports
+admin_imports = OrderedDict()
+
+def require_admin(x_admin_token: Optional[str] = Header(None)):
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
+    if not x_admin_token or not hmac.compare_digest(x_admin_token.encode(), ADMIN_TOKEN.encode()):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Invalid admin token"
+        )
+
+def admin_collection(collection: str):
+    if collection not in ADMIN_COLLECTIONS:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Unknown collection '{collection}'"
+        )
+    return ADMIN_COLLECTIONS[collection]
+
+async def iter_collection(collection: str, after: Optional[str] = None):
+    """Documents of ``collection`` in ``id`` order, starting after ``after``."""
+    if mongo_available():
+        query = {"id": {"$gt": after}} if after else {}
+        cursor = db[collection].find(query, {"_id": 0}).sort("id", 1).batch_size(ADMIN_EXPORT_BATCH_SIZE)
+        try:
+            async for doc in cursor:
+                yield doc
+        except Exception as e:
+            # Too late to switch to the JSON store; the client resumes with ?after=
+            mongo_failed("admin_export", e)
+            raise
+        return
+    docs = ADMIN_COLLECTIONS[collection][0].all()
+    for doc_id in sorted(docs):
+        if after is None or doc_id > after:
+            yield docs[doc_id]
+
+async def export_ndjson(collection: str, after: Optional[str]):
+    lines = []
+    async for doc in iter_collection(collection, after):
+        lines.append(encode_json(doc))
+        if len(lines) >= ADMIN_EXPORT_BATCH_SIZE:
+            yield b"\n".join(lines) + b"\n"
+            lines = []
+    if lines:
+        yield b"\n".join(lines) + b"\n"
+
+async def import_batch(collection: str, docs: list) -> list:
+    """Upsert ``docs`` by id; returns (index, error) for the ones that failed."""
+    store, unique, _ = ADMIN_COLLECTIONS[collection]
+    if mongo_available():
+        try:
+            await db[collection].bulk_write(
+                [ReplaceOne({"id": doc["id"]}, _restore_datetimes(doc), upsert=True) for doc in docs],
+                ordered=False,
+            )
+            return []
+        except BulkWriteError as e:
+            return [(error["index"], error.get("errmsg", "write error")) for error in e.details["writeErrors"]]
+        except Exception as e:
+            mongo_failed("admin_import", e)
+    rejected = await store.put_many_async(docs, unique=unique)
+    rejected_set = set(rejected)
+    for i, doc in enumerate(docs):
+        if i not in rejected_set:
+            note_fallback_write(collection, doc["id"])
+    return [(i, f"duplicate {'/'.join(unique)}") for i in rejected]
+
+@api_router.get("/admin/export/{collection}", dependencies=[Depends(require_admin)])
+async def admin_export(collection: str, after: Optional[str] = None):
+    admin_collection(collection)
+    filename = f"{collection}-{datetime.utcnow():%Y%m%dT%H%M%S}.ndjson"
+    return StreamingResponse(
+        export_ndjson(collection, after),
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+@api_router.post("/admin/import/{collection}", dependencies=[Depends(require_admin)])
+async def admin_import(collection: str, request: Request, skip: int = 0, import_id: Optional[str] = None):
+    """Upsert NDJSON documents from the request body, one batch at a time.
+
+    Returns the final progress; ``GET /api/admin/imports`` shows it while the
+    import runs. Bad lines are reported and skipped, not fatal.
+    """
+    _, _, required = admin_collection(collection)
+    import_id = import_id or str(uuid.uuid4())
+    progress = {
+        "import_id": import_id, "collection": collection, "status": "running",
+        "started_at": datetime.utcnow().isoformat(), "skipped": skip,
+        "lines": 0, "imported": 0, "failed": 0, "committed_lines": skip, "errors": [],
+    }
+    admin_imports[import_id] = progress
+    admin_imports.move_to_end(import_id)
+    while len(admin_imports) > ADMIN_IMPORT_HISTORY:
+        admin_imports.popitem(last=False)
+
+    def fail(line_no: int, error: str):
+        progress["failed"] += 1
+        if len(progress["errors"]) < ADMIN_IMPORT_MAX_ERRORS:
+            progress["errors"].append({"line": line_no, "error": error})
+
+    batch = []  # (line number, doc)
+
+    async def flush(last_line: int):
+        if batch:
+            failures = await import_batch(collection, [doc for _, doc in batch])
+            for i, error in failures:
+                fail(batch[i][0], error)
+            progress["imported"] += len(batch) - len(failures)
+            batch.clear()
+        progress["committed_lines"] = last_line
+        log_event(logging.INFO, "admin.import_progress", import_id=import_id, collection=collection,
+                  committed_lines=last_line, imported=progress["imported"], failed=progress["failed"])
+
+    def parse(line_no: int, line: bytes):
+        line = line.strip()
+        if not line:
+            return
+        try:
+            doc = orjson.loads(line)
+        except orjson.JSONDecodeError as e:
+            fail(line_no, f"invalid JSON: {e}")
+            return
+        missing = [field for field in required if not isinstance(doc, dict) or not doc.get(field)]
+        if missing:
+            fail(line_no, f"missing {', '.join(missing)}")
+            return
+        batch.append((line_no, doc))
+
+    line_no, pending = 0, b""
+    try:
+        async for chunk in request.stream():
+            pending += chunk
+            *lines, pending = pending.split(b"\n")
+            for line in lines:
+                line_no += 1
+                if line_no > skip:
+                    parse(line_no, line)
+                    if len(batch) >= ADMIN_IMPORT_BATCH_SIZE:
+                        await flush(line_no)
+        if pending.strip():
+            line_no += 1
+            if line_no > skip:
+                parse(line_no, pending)
+        await flush(line_no)
+    except Exception as e:
+        progress["status"] = "failed"
+        progress["error"] = str(e)
+        log_event(logging.ERROR, "admin.import_failed", import_id=import_id, error=str(e),
+                  committed_lines=progress["committed_lines"])
+        raise
+    finally:
+        progress["lines"] = line_no
+        if collection == "weddings":
+            wedding_cache.clear()
+    progress["status"] = "done"
+    return progress
+
+@api_router.get("/admin/imports", dependencies=[Depends(require_admin)])
+async def admin_import_status():
+    return list(admin_imports.values())
+
 # Test endpoint to verify connectivity
 @api_router.get("/test")
 async def test_endpoint():
@@ -477,29 +3974,51 @@ async def root():
 # Include the router in the main app
 app.include_router(api_router)
 
+# Innermost, so 429/503 responses still get CORS headers
+app.add_middleware(AdmissionMiddleware)
+
+app.add_middleware(CompressionMiddleware, minimum_size=COMPRESSION_MIN_BYTES)
+
 app.add_middleware(
     CORSMiddleware,
     allow_credentials=True,
     allow_origins=["http://localhost:3000", "http://127.0.0.1:3000", "*"],
-    allow_methods=["GET", "POST", "PUT", "DELETE", "OPTIONS"],
+    allow_methods=["GET", "POST", "PUT", "PATCH", "DELETE", "OPTIONS"],
     allow_headers=["*"],
     expose_headers=["*"],
 )
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
-logger = logging.getLogger(__name__)
-
-# Startup event to connect to MongoDB
+# Startup event: serve from the JSON store right away and connect to MongoDB
+# in the background, switching over once it is reachable.
 @app.on_event("startup")
 async def startup_event():
-    await connect_to_mongo()
+    global compaction_task, mongo_connect_task, app_ready
+    for store in json_stores:
+        await asyncio.to_thread(store.load)
+    await asyncio.to_thread(guestbook_log.load)
+    await refresh_slug_set()
+    if JSON_STORE_MODE == "journal":
+        compaction_task = asyncio.create_task(compact_json_stores_periodically())
+    if MONGO_ENABLED:
+        mongo_connect_task = asyncio.create_task(connect_to_mongo_with_retry())
+    app_ready = True
+    startup_timings["ready_ms"] = round((time.monotonic() - PROCESS_STARTED_AT) * 1000, 1)
 
 # Simple cleanup on shutdown
 @app.on_event("shutdown")
 async def cleanup():
     active_sessions.clear()
-    await close_mongo_connection()
\ No newline at end of file
+    if compaction_task is not None:
+        compaction_task.cancel()
+    if mongo_connect_task is not None:
+        mongo_connect_task.cancel()
+    mongo_breaker.stop()
+    derivative_pipeline.shutdown()
+    precompressor.shutdown()
+    password_hasher.shutdown()
+    # Write out accepted RSVPs while Mongo and the JSON stores are still open
+    await rsvp_buffer.close()
+    for store in json_stores:
+        await asyncio.to_thread(store.close)
+    await asyncio.to_thread(guestbook_log.close)
+    await close_mongo_connection()
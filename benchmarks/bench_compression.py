@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""Response compression: CPU cost vs. bytes saved.
+
+Compresses the rendered public JSON of small/typical/huge wedding documents
+with gzip and brotli at several levels and reports the time per response,
+the compressed size and the bytes saved per millisecond of CPU. The
+server's defaults are marked: the dynamic level is paid on every response,
+the precompress level once per cached public wedding (up to
+PRECOMPRESS_MAX_BYTES).
+"""
+
+import argparse
+import gzip
+import sys
+
+from bench_serialization import SHAPES, make_wedding, time_per_call
+from common import import_server, write_results
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+GZIP_LEVELS = [1, 6, 9]
+BROTLI_QUALITIES = [1, 5, 9, 11]
+
+
+def codecs():
+    for level in GZIP_LEVELS:
+        yield "gzip", level, lambda body, level=level: gzip.compress(body, compresslevel=level, mtime=0)
+    if brotli is not None:
+        for quality in BROTLI_QUALITIES:
+            yield "br", quality, lambda body, quality=quality: brotli.compress(body, quality=quality)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--seconds", type=float, default=0.5, help="minimum time per measurement")
+    parser.add_argument("--output", help="write results as JSON to this file")
+    args = parser.parse_args()
+
+    server = import_server()
+    defaults = {
+        ("gzip", server.COMPRESSION_GZIP_LEVEL): "dynamic",
+        ("br", server.COMPRESSION_BROTLI_QUALITY): "dynamic",
+        ("gzip", server.PRECOMPRESS_GZIP_LEVEL): "precompress",
+        ("br", server.PRECOMPRESS_BROTLI_QUALITY): "precompress",
+    }
+    if brotli is None:
+        print("⚠️  brotli is not installed; measuring gzip only")
+
+    results = {}
+    for name, shape in SHAPES.items():
+        doc = make_wedding(**shape)
+        body = server.encode_json({k: v for k, v in doc.items() if k not in ("_id", "user_id")})
+        encode_us = time_per_call(server.encode_json, doc, args.seconds)
+        print(f"{name}: {len(body):,} bytes of JSON (encoding takes {encode_us:.1f} µs)")
+        rows = []
+        for encoding, level, compress in codecs():
+            us = time_per_call(compress, body, args.seconds)
+            size = len(compress(body))
+            saved = len(body) - size
+            row = {
+                "encoding": encoding,
+                "level": level,
+                "us": round(us, 2),
+                "bytes": size,
+                "ratio": round(len(body) / size, 2),
+                "bytes_saved": saved,
+                "kb_saved_per_cpu_ms": round(saved / 1024 / (us / 1000), 1),
+                "role": defaults.get((encoding, level)),
+            }
+            rows.append(row)
+            marker = f"  ← {row['role']}" if row["role"] else ""
+            print(f"   {encoding:>4} {level:>2}: {us:10.1f} µs  {size:>9,} bytes  {row['ratio']:5.2f}x  "
+                  f"{row['kb_saved_per_cpu_ms']:8.1f} KB saved/CPU ms{marker}")
+        results[name] = {"json_bytes": len(body), "encode_us": round(encode_us, 2), "codecs": rows}
+
+    write_results(args.output, results)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
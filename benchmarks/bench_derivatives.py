@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""Derivative rendering throughput per core.
+
+Renders the gallery derivatives (responsive WebP widths plus a thumbnail,
+as configured for the server) for a batch of synthetic photos on a
+ProcessPoolExecutor with 1..N workers, and reports photos/s overall and per
+worker. Scaling close to linear means the pipeline is CPU-bound in the
+workers, not serialized somewhere.
+"""
+
+import argparse
+import io
+import os
+import random
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from common import BACKEND_DIR, write_results
+
+sys.path.insert(0, str(BACKEND_DIR))
+import imaging  # noqa: E402
+from PIL import Image, ImageDraw  # noqa: E402
+
+
+def make_photo(width, height, seed):
+    """A JPEG with enough detail that encoding isn't trivially cheap."""
+    rng = random.Random(seed)
+    image = Image.new("RGB", (width, height), (rng.randrange(256), rng.randrange(256), rng.randrange(256)))
+    draw = ImageDraw.Draw(image)
+    for _ in range(400):
+        x, y = rng.randrange(width), rng.randrange(height)
+        r = rng.randrange(10, width // 6)
+        draw.ellipse((x - r, y - r, x + r, y + r),
+                     fill=(rng.randrange(256), rng.randrange(256), rng.randrange(256)))
+    buffer = io.BytesIO()
+    image.save(buffer, "JPEG", quality=90)
+    return buffer.getvalue()
+
+
+def run(sources, out_root, workers, args):
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [
+            pool.submit(imaging.render_derivatives, str(source), str(out_root / f"{workers}-{i}"),
+                        args.widths, args.thumb_size, args.quality)
+            for i, source in enumerate(sources)
+        ]
+        for future in futures:
+            future.result()
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--photos", type=int, default=24)
+    parser.add_argument("--size", default="2400x1600", help="source photo WIDTHxHEIGHT")
+    parser.add_argument("--workers", type=int, nargs="+",
+                        help="worker counts to try (default: 1, 2, 4, ... up to the CPU count)")
+    parser.add_argument("--widths", type=int, nargs="+", default=[320, 640, 1280])
+    parser.add_argument("--thumb-size", type=int, default=256)
+    parser.add_argument("--quality", type=int, default=80)
+    parser.add_argument("--output", help="write results as JSON to this file")
+    args = parser.parse_args()
+
+    cpus = os.cpu_count() or 1
+    workers = args.workers or sorted({min(2 ** i, cpus) for i in range(cpus.bit_length() + 1)})
+    width, height = map(int, args.size.lower().split("x"))
+
+    results = {"photos": args.photos, "size": args.size, "widths": args.widths, "cpu_count": cpus, "runs": []}
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        sources = []
+        for i in range(args.photos):
+            path = tmp / f"source-{i}.jpg"
+            path.write_bytes(make_photo(width, height, i))
+            sources.append(path)
+
+        print(f"🖼  {args.photos} photos at {args.size}, widths {args.widths} + {args.thumb_size}px thumb")
+        baseline = None
+        for count in workers:
+            seconds = run(sources, tmp / "out", count, args)
+            rate = args.photos / seconds
+            baseline = baseline or rate / count
+            run_result = {
+                "workers": count,
+                "seconds": round(seconds, 3),
+                "photos_per_second": round(rate, 2),
+                "photos_per_second_per_worker": round(rate / count, 2),
+                "scaling_efficiency": round(rate / count / baseline, 3),
+            }
+            results["runs"].append(run_result)
+            print(f"   {count:>3} worker(s): {rate:7.2f} photos/s  {rate / count:6.2f} per worker  "
+                  f"efficiency {run_result['scaling_efficiency']:.0%}")
+
+    write_results(args.output, results)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""Login latency as the user base grows.
+
+Seeds the users store (JSON fallback by default, or a real MongoDB with
+--mongo-url) with N users for each requested size and times the /auth/login
+handler for random existing users. With the username index the p99 should
+stay flat from 1k to 1M users; --compare-scan also times the old
+"load every user and loop" lookup for the smaller sizes.
+
+Passwords are hashed with single-round pbkdf2 so the lookup stays visible;
+the (constant) hashing cost is measured by bench_password_hashing.py.
+"""
+
+import argparse
+import asyncio
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from passlib.context import CryptContext
+
+from common import import_server, summarize, write_results
+
+FAST_CONTEXT = CryptContext(schemes=["pbkdf2_sha256"], pbkdf2_sha256__default_rounds=1)
+PASSWORD_HASH = FAST_CONTEXT.hash("pw")
+
+
+def seed_json_store(server, size, directory):
+    users = {
+        f"user-{i}": {"id": f"user-{i}", "username": f"bench{i}", "password": PASSWORD_HASH,
+                      "created_at": "2025-01-01 00:00:00"}
+        for i in range(size)
+    }
+    path = Path(directory) / f"users-{size}.json"
+    server.save_json_file(path, users)
+    store = server.JsonStore(path, indexes=("username",))
+    store.load()
+    server.users_store = store
+    server.db = None
+
+
+async def seed_mongo(server, size):
+    await server.db.users.drop()
+    batch = []
+    for i in range(size):
+        batch.append({"id": f"user-{i}", "username": f"bench{i}", "password": PASSWORD_HASH})
+        if len(batch) == 10000:
+            await server.db.users.insert_many(batch)
+            batch = []
+    if batch:
+        await server.db.users.insert_many(batch)
+    await server.ensure_indexes()
+
+
+async def time_logins(server, size, iterations):
+    samples = []
+    for _ in range(iterations):
+        i = random.randrange(size)
+        start = time.perf_counter()
+        await server.login(server.UserLogin(username=f"bench{i}", password="pw"))
+        samples.append((time.perf_counter() - start) * 1000)
+    return summarize(samples)
+
+
+async def load_all_users(server):
+    # The lookup login used before the username index: read every user.
+    if server.mongo_available():
+        return {user["id"]: user async for user in server.db.users.find({}, {"_id": 0})}
+    return server.users_store.all()
+
+
+async def time_full_scans(server, size, iterations):
+    samples = []
+    for _ in range(iterations):
+        username = f"bench{random.randrange(size)}"
+        start = time.perf_counter()
+        users = await load_all_users(server)
+        next(u for u in users.values() if u["username"] == username)
+        samples.append((time.perf_counter() - start) * 1000)
+    return summarize(samples)
+
+
+async def run(args):
+    server = import_server(args.mongo_url)
+    server.password_hasher = server.PasswordHasher(FAST_CONTEXT, workers=1, max_queue=1)
+    if args.mongo_url:
+        server.DB_NAME = args.db_name
+        if not await server.connect_to_mongo():
+            print("❌ Could not connect to MongoDB")
+            return 1
+
+    results = {"backend": "mongo" if args.mongo_url else "json", "sizes": {}}
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in args.sizes:
+            print(f"\n🌱 Seeding {size:,} users...")
+            if args.mongo_url:
+                await seed_mongo(server, size)
+            else:
+                seed_json_store(server, size, tmp)
+            entry = {"login": await time_logins(server, size, args.iterations)}
+            if args.compare_scan and size <= args.scan_max_size:
+                entry["full_scan"] = await time_full_scans(server, size, max(1, args.iterations // 20))
+            results["sizes"][str(size)] = entry
+            line = f"   login p50={entry['login']['p50_ms']}ms p99={entry['login']['p99_ms']}ms"
+            if "full_scan" in entry:
+                line += f" | full scan p99={entry['full_scan']['p99_ms']}ms"
+            print(line)
+
+    if args.mongo_url:
+        await server.db.users.drop()
+        await server.close_mongo_connection()
+    write_results(args.output, results)
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 10_000, 100_000, 1_000_000])
+    parser.add_argument("--iterations", type=int, default=2000)
+    parser.add_argument("--mongo-url", help="benchmark against this MongoDB instead of the JSON store")
+    parser.add_argument("--db-name", default="weddingcard_bench")
+    parser.add_argument("--compare-scan", action="store_true",
+                        help="also time the old load-all-users scan")
+    parser.add_argument("--scan-max-size", type=int, default=100_000)
+    parser.add_argument("--output", help="write results as JSON to this file")
+    return asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""Login password verification: throughput per core and event-loop impact.
+
+Verifies passwords through ``server.PasswordHasher`` with 1..N pool workers
+and reports logins/s overall and per worker (hashlib, bcrypt and argon2
+release the GIL, so this should scale with cores). It then compares the
+event loop's responsiveness while the same verifications run inline in the
+handler versus on the pool: the inline case is what every other request on
+the worker would see.
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+from common import import_server, summarize, write_results
+
+
+async def verify_throughput(server, stored, workers, logins):
+    hasher = server.PasswordHasher(server.pwd_context, workers, max_queue=logins)
+    start = time.perf_counter()
+    results = await asyncio.gather(*(hasher.verify("pw", stored) for _ in range(logins)))
+    seconds = time.perf_counter() - start
+    hasher.shutdown()
+    assert all(ok for ok, _ in results)
+    return seconds
+
+
+async def loop_lag_while(work, interval=0.001):
+    """Latency samples (ms) of a 1 ms ticker while ``work`` runs."""
+    samples, done = [], False
+
+    async def ticker():
+        while not done:
+            start = time.perf_counter()
+            await asyncio.sleep(interval)
+            samples.append((time.perf_counter() - start - interval) * 1000)
+
+    task = asyncio.create_task(ticker())
+    await work()
+    done = True
+    await task
+    return summarize(samples)
+
+
+async def run(args):
+    server = import_server()
+    stored = server.pwd_context.hash("pw")
+    cpus = os.cpu_count() or 1
+    workers = args.workers or sorted({min(2 ** i, cpus) for i in range(cpus.bit_length() + 1)})
+    results = {"schemes": server.PASSWORD_SCHEMES, "cpu_count": cpus, "logins": args.logins, "runs": []}
+
+    print(f"🔐 {', '.join(server.PASSWORD_SCHEMES)}: {args.logins} verifications per run")
+    baseline = None
+    for count in workers:
+        seconds = await verify_throughput(server, stored, count, args.logins)
+        rate = args.logins / seconds
+        baseline = baseline or rate / count
+        run_result = {
+            "workers": count,
+            "logins_per_second": round(rate, 1),
+            "logins_per_second_per_worker": round(rate / count, 1),
+            "scaling_efficiency": round(rate / count / baseline, 3),
+        }
+        results["runs"].append(run_result)
+        print(f"   {count:>3} worker(s): {rate:8.1f} logins/s  {rate / count:7.1f} per worker  "
+              f"efficiency {run_result['scaling_efficiency']:.0%}")
+
+    lag_logins = max(1, args.logins // 4)
+
+    async def inline():
+        for _ in range(lag_logins):
+            server.pwd_context.verify("pw", stored)
+            await asyncio.sleep(0)
+
+    pool = server.PasswordHasher(server.pwd_context, cpus, max_queue=lag_logins)
+
+    async def pooled():
+        await asyncio.gather(*(pool.verify("pw", stored) for _ in range(lag_logins)))
+
+    results["loop_lag_inline"] = await loop_lag_while(inline)
+    results["loop_lag_pool"] = await loop_lag_while(pooled)
+    pool.shutdown()
+    for name in ("inline", "pool"):
+        lag = results[f"loop_lag_{name}"]
+        print(f"   event loop lag, verify {name:<6}: p50 {lag['p50_ms']:7.2f} ms  p99 {lag['p99_ms']:7.2f} ms  "
+              f"max {lag['max_ms']:7.2f} ms")
+
+    write_results(args.output, results)
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--logins", type=int, default=200, help="verifications per worker count")
+    parser.add_argument("--workers", type=int, nargs="+",
+                        help="pool sizes to try (default: 1, 2, 4, ... up to the CPU count)")
+    parser.add_argument("--output", help="write results as JSON to this file")
+    return asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
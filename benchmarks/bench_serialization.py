@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""Wedding document serialization: legacy path vs. the orjson fast path.
+
+The legacy path is what every read used to do: copy the document through
+the recursive ``serialize_mongo_doc`` (kept here for comparison), run it
+through FastAPI's ``jsonable_encoder`` and render it with stdlib json. The
+fast path is ``server.encode_json`` on the document as read with an
+``{"_id": 0}`` projection.
+"""
+
+import argparse
+import json
+import sys
+import time
+import uuid
+from datetime import datetime
+
+from bson import ObjectId
+from fastapi.encoders import jsonable_encoder
+
+from common import import_server, write_results
+
+
+def legacy_serialize_mongo_doc(doc):
+    if doc is None:
+        return None
+    if isinstance(doc, dict):
+        result = {}
+        for key, value in doc.items():
+            if key == '_id':
+                continue
+            elif isinstance(value, ObjectId):
+                result[key] = str(value)
+            elif isinstance(value, dict):
+                result[key] = legacy_serialize_mongo_doc(value)
+            elif isinstance(value, list):
+                result[key] = [legacy_serialize_mongo_doc(item) if isinstance(item, dict) else item
+                               for item in value]
+            else:
+                result[key] = value
+        return result
+    return doc
+
+
+def legacy_render(doc):
+    content = jsonable_encoder(legacy_serialize_mongo_doc(doc))
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, indent=None,
+                      separators=(",", ":")).encode("utf-8")
+
+
+def make_wedding(events, photos, party, faqs, registry):
+    now = datetime.utcnow()
+    return {
+        "_id": ObjectId(),
+        "id": str(uuid.uuid4()),
+        "user_id": str(uuid.uuid4()),
+        "couple_name_1": "Emma",
+        "couple_name_2": "James",
+        "wedding_date": "2025-08-15",
+        "venue_name": "Sunset Garden Estate",
+        "venue_location": "Napa Valley, California",
+        "their_story": "We met at a coffee shop on a rainy Tuesday morning. " * 8,
+        "schedule_events": [
+            {"time": f"{10 + i % 10}:00", "title": f"Event {i}", "description": "Details " * 10,
+             "location": "Main hall", "created_at": now}
+            for i in range(events)
+        ],
+        "gallery_photos": [f"/api/blobs/{uuid.uuid4().hex}{uuid.uuid4().hex}" for _ in range(photos)],
+        "bridal_party": [{"name": f"Bridesmaid {i}", "role": "Bridesmaid", "bio": "Friend " * 12}
+                         for i in range(party)],
+        "groom_party": [{"name": f"Groomsman {i}", "role": "Groomsman", "bio": "Friend " * 12,
+                         "ref": ObjectId()} for i in range(party)],
+        "faqs": [{"question": f"Question {i}?", "answer": "Answer " * 20} for i in range(faqs)],
+        "theme": "classic",
+        "custom_url": "emma-and-james",
+        "story_timeline": [{"year": 2015 + i, "title": f"Chapter {i}", "text": "Story " * 25}
+                           for i in range(events)],
+        "registry_items": [{"name": f"Item {i}", "price": 49.99 + i, "url": "https://example.com/item",
+                            "purchased": i % 3 == 0} for i in range(registry)],
+        "honeymoon_fund": {"goal": 5000, "raised": 1250.5},
+        "important_info": {"dress_code": "Garden formal", "parking": "On site"},
+        "created_at": now,
+        "updated_at": now,
+        "version": 7,
+    }
+
+
+SHAPES = {
+    "small": dict(events=2, photos=3, party=2, faqs=2, registry=2),
+    "typical": dict(events=12, photos=40, party=6, faqs=10, registry=25),
+    "huge": dict(events=200, photos=1500, party=40, faqs=120, registry=600),
+}
+
+
+def time_per_call(func, doc, min_seconds):
+    iterations, elapsed = 0, 0.0
+    start = time.perf_counter()
+    while elapsed < min_seconds:
+        for _ in range(10):
+            func(doc)
+        iterations += 10
+        elapsed = time.perf_counter() - start
+    return elapsed / iterations * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--seconds", type=float, default=1.0, help="minimum time per measurement")
+    parser.add_argument("--output", help="write results as JSON to this file")
+    args = parser.parse_args()
+
+    server = import_server()
+    results = {}
+    for name, shape in SHAPES.items():
+        doc = make_wedding(**shape)
+        projected = {k: v for k, v in doc.items() if k != "_id"}  # what find_one(..., {"_id": 0}) returns
+        legacy_us = time_per_call(legacy_render, doc, args.seconds)
+        fast_us = time_per_call(server.encode_json, projected, args.seconds)
+        results[name] = {
+            "bytes": len(server.encode_json(projected)),
+            "legacy_us": round(legacy_us, 2),
+            "fast_us": round(fast_us, 2),
+            "speedup": round(legacy_us / fast_us, 2),
+        }
+        print(f"{name:>8}: {results[name]['bytes']:>9,} bytes  legacy {legacy_us:10.1f} µs  "
+              f"fast {fast_us:9.1f} µs  ({results[name]['speedup']}x)")
+
+    write_results(args.output, results)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
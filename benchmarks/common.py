@@ -0,0 +1,50 @@
+"""Shared helpers for the backend benchmark scripts."""
+
+import json
+import os
+import statistics
+import sys
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent / 'backend'
+
+
+def import_server(mongo_url=None):
+    """Import ``backend/server.py`` without touching the configured cluster.
+
+    Unless a Mongo URL is given explicitly, the module is pointed at an
+    address nothing listens on so benchmarks never hit a real database.
+    """
+    os.environ['MONGO_URL'] = mongo_url or 'mongodb://127.0.0.1:1/?serverSelectionTimeoutMS=100'
+    if str(BACKEND_DIR) not in sys.path:
+        sys.path.insert(0, str(BACKEND_DIR))
+    import server
+    return server
+
+
+def percentile(sorted_samples, pct):
+    if not sorted_samples:
+        return 0.0
+    index = min(len(sorted_samples) - 1, int(round(pct / 100 * (len(sorted_samples) - 1))))
+    return sorted_samples[index]
+
+
+def summarize(samples_ms):
+    """p50/p95/p99/mean/max for a list of latencies in milliseconds."""
+    ordered = sorted(samples_ms)
+    return {
+        "count": len(ordered),
+        "mean_ms": round(statistics.fmean(ordered), 4) if ordered else 0.0,
+        "p50_ms": round(percentile(ordered, 50), 4),
+        "p95_ms": round(percentile(ordered, 95), 4),
+        "p99_ms": round(percentile(ordered, 99), 4),
+        "max_ms": round(ordered[-1], 4) if ordered else 0.0,
+    }
+
+
+def write_results(path, results):
+    if not path:
+        return
+    with open(path, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"📄 Results written to {path}")
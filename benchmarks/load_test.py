@@ -0,0 +1,354 @@
+#!/usr/bin/env python3
+"""HTTP load test for the wedding card API.
+
+Drives the ASGI app in-process through httpx (or a running server with
+--base-url) at a configurable concurrency, after seeding N users and
+weddings into one of the storage backends:
+
+  json       JSON fallback store in a temp directory (JSON_STORE_MODE applies)
+  mongomock  in-memory Mongo stand-in (mongomock-motor)
+  mongo      a real mongod given by --mongo-url (uses a throwaway database)
+
+Per scenario it reports requests, errors, RPS and p50/p95/p99 latency, and
+writes everything as JSON with --output so runs can be compared over time.
+RSVP submissions return once buffered, so rsvp_submit also reports the
+time to write out the buffer and the resulting sustained rate.
+
+Every in-process request comes from the same client address, so the
+per-IP rate limits and the concurrency cap are switched off, and the
+password hashing queue is sized for --concurrency, unless
+--admission-control is given. Requests shed with 429/503 are counted as
+"shed", apart from successes and errors, and are left out of the
+latencies; the worker that got one waits for Retry-After (at most
+--max-backoff seconds) before its next request. Against --base-url, start
+the server with RATE_LIMIT_ENABLED=false, MAX_CONCURRENT_REQUESTS=0 and
+PASSWORD_HASH_MAX_QUEUE of at least --concurrency to measure the app
+rather than the limits.
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+import uuid
+from collections import Counter
+from datetime import datetime
+from pathlib import Path
+
+import httpx
+
+from common import import_server, summarize, write_results
+
+SCENARIOS = [
+    "login",
+    "register",
+    "public_by_id",
+    "public_by_custom_url",
+    "public_by_user",
+    "public_conditional",
+    "get_private",
+    "patch_update",
+    "put_update",
+    "rsvp_submit",
+]
+
+
+def seed_documents(count, password_hash):
+    users, weddings = [], []
+    now = datetime.utcnow()
+    for i in range(count):
+        user_id = f"load-user-{i}"
+        users.append({"id": user_id, "username": f"loaduser{i}", "password": password_hash, "created_at": now})
+        weddings.append({
+            "id": f"load-wedding-{i}",
+            "user_id": user_id,
+            "couple_name_1": f"Partner A{i}",
+            "couple_name_2": f"Partner B{i}",
+            "wedding_date": "2026-06-20",
+            "venue_name": "Lakeside Pavilion",
+            "venue_location": "Lake Town",
+            "their_story": "We met at a friend's birthday party. " * 10,
+            "schedule_events": [{"time": f"{14 + j}:00", "title": f"Event {j}", "description": "Details " * 8}
+                                for j in range(6)],
+            "gallery_photos": [],
+            "bridal_party": [{"name": f"Friend {j}", "role": "Bridesmaid"} for j in range(4)],
+            "groom_party": [{"name": f"Friend {j}", "role": "Groomsman"} for j in range(4)],
+            "faqs": [{"question": f"Question {j}?", "answer": "Answer " * 12} for j in range(8)],
+            "theme": "classic",
+            "custom_url": f"load-couple-{i}",
+            "story_timeline": [],
+            "registry_items": [],
+            "honeymoon_fund": None,
+            "important_info": {},
+            "created_at": now,
+            "updated_at": now,
+            "version": 1,
+        })
+    return users, weddings
+
+
+BENCH_COLLECTIONS = ("users", "weddings", "rsvps", "rsvp_stats", "guestbook", "slugs")
+
+
+async def setup_backend(server, args, tmp_dir):
+    # One real hash for everyone: logins pay the verify cost, not a rehash
+    users, weddings = seed_documents(args.seed, server.pwd_context.hash("pw"))
+    if args.backend == "json":
+        server.MONGO_ENABLED = False
+        server.mongo_ready = False
+        journal = server.JSON_STORE_MODE == "journal"
+        users_path, weddings_path = Path(tmp_dir) / "users.json", Path(tmp_dir) / "weddings.json"
+        server.save_json_file(users_path, {u["id"]: u for u in users})
+        server.save_json_file(weddings_path, {w["id"]: w for w in weddings})
+        server.users_store = server.JsonStore(users_path, indexes=("username",), journal=journal)
+        server.weddings_store = server.JsonStore(weddings_path, indexes=("user_id", "custom_url"),
+                                                 journal=journal)
+        server.rsvps_store = server.JsonStore(Path(tmp_dir) / "rsvps.json", indexes=("wedding_id",),
+                                              journal=journal)
+        server.rsvp_stats_store = server.JsonStore(Path(tmp_dir) / "rsvp_stats.json", journal=journal)
+        server.slugs_store = server.JsonStore(Path(tmp_dir) / "slugs.json", indexes=("wedding_id",),
+                                              journal=journal)
+        server.guestbook_log = server.GuestbookLog(Path(tmp_dir) / "guestbook")
+        server.json_stores = (server.users_store, server.weddings_store, server.rsvps_store,
+                              server.rsvp_stats_store, server.slugs_store)
+        for store in server.json_stores:
+            store.load()
+        return
+
+    if args.backend == "mongomock":
+        from mongomock_motor import AsyncMongoMockClient
+        server.client = AsyncMongoMockClient()
+    else:
+        from motor.motor_asyncio import AsyncIOMotorClient
+        server.client = AsyncIOMotorClient(args.mongo_url, **server.mongo_client_options())
+    server.db = server.client[args.db_name]
+    for collection in BENCH_COLLECTIONS:
+        await server.db[collection].drop()
+    await server.ensure_indexes()
+    for start in range(0, len(users), 5000):
+        await server.db.users.insert_many(users[start:start + 5000])
+        await server.db.weddings.insert_many(weddings[start:start + 5000])
+    server.mongo_ready = True
+
+
+async def teardown_backend(server, args):
+    # Stops the flush task the first RSVP started, after a last flush
+    await server.rsvp_buffer.close()
+    server.password_hasher.shutdown()
+    if args.backend in ("mongomock", "mongo"):
+        for collection in BENCH_COLLECTIONS:
+            await server.db[collection].drop()
+        server.client.close()
+    else:
+        for store in server.json_stores:
+            store.close()
+        server.guestbook_log.close()
+
+
+class Scenario:
+    """Builds one request for a scenario; ``check`` decides success."""
+
+    def __init__(self, name, seed, sessions):
+        self.name = name
+        self.seed = seed
+        self.sessions = sessions
+        self.etags = {}
+
+    def build(self):
+        i = random.randrange(self.seed)
+        if self.name == "login":
+            return "POST", "/api/auth/login", {"json": {"username": f"loaduser{i}", "password": "pw"}}, 200
+        if self.name == "register":
+            return "POST", "/api/auth/register", {
+                "json": {"username": f"reg-{uuid.uuid4().hex}", "password": "pw"}}, 200
+        if self.name == "public_by_id":
+            return "GET", f"/api/wedding/public/load-wedding-{i}", {}, 200
+        if self.name == "public_by_custom_url":
+            return "GET", f"/api/wedding/public/custom/load-couple-{i}", {}, 200
+        if self.name == "public_by_user":
+            return "GET", f"/api/wedding/public/user/load-user-{i}", {}, 200
+        if self.name == "public_conditional":
+            # A guest reloading the page: most requests revalidate an ETag
+            i %= 50
+            etag = self.etags.get(i)
+            headers = {"If-None-Match": etag} if etag else {}
+            return "GET", f"/api/wedding/public/load-wedding-{i}", {"headers": headers}, (304 if etag else 200)
+        if self.name == "rsvp_submit":
+            # Guests of a few popular weddings right before the deadline;
+            # one in ten is a retry or a changed answer from an earlier guest
+            guest = random.randrange(1_000_000) if random.random() < 0.9 else random.randrange(100)
+            return "POST", f"/api/wedding/load-wedding-{i % 20}/rsvp", {"json": {
+                "name": f"Guest {guest}", "email": f"guest{guest}@example.com",
+                "attendance": random.choice(["yes", "no"]), "guests": random.randint(1, 4),
+            }}, 202
+
+        user_index, session_id = random.choice(self.sessions)
+        if self.name == "get_private":
+            return "GET", "/api/wedding", {"params": {"session_id": session_id}}, 200
+        if self.name == "patch_update":
+            return "PATCH", "/api/wedding", {
+                "json": {"session_id": session_id, "venue_name": f"Venue {random.random()}"}}, 200
+        if self.name == "put_update":
+            return "PUT", "/api/wedding", {"json": {
+                "session_id": session_id,
+                "couple_name_1": f"Partner A{user_index}", "couple_name_2": f"Partner B{user_index}",
+                "wedding_date": "2026-06-20", "venue_name": f"Venue {random.random()}",
+                "venue_location": "Lake Town", "their_story": "Updated story.",
+                "faqs": [{"question": "Parking?", "answer": "Yes"}],
+            }}, 200
+        raise ValueError(self.name)
+
+    def observe(self, path, response):
+        if self.name == "public_conditional" and response.status_code == 200:
+            self.etags[int(path.rsplit("-", 1)[1])] = response.headers.get("etag")
+
+
+SHED_STATUSES = (429, 503)
+
+
+def retry_after_seconds(response, cap):
+    try:
+        return min(float(response.headers.get("retry-after", "")), cap)
+    except ValueError:
+        return min(0.1, cap)
+
+
+async def run_scenario(http, scenario, args):
+    latencies, errors, shed, statuses = [], 0, 0, Counter()
+    deadline = time.perf_counter() + args.duration
+    remaining = args.requests
+
+    async def worker():
+        nonlocal errors, shed, remaining
+        while time.perf_counter() < deadline and (remaining is None or remaining > 0):
+            if remaining is not None:
+                remaining -= 1
+            method, path, kwargs, expected = scenario.build()
+            start = time.perf_counter()
+            try:
+                response = await http.request(method, path, **kwargs)
+                statuses[response.status_code] += 1
+                ok = response.status_code == expected
+                scenario.observe(path, response)
+            except httpx.HTTPError:
+                statuses["transport_error"] += 1
+                ok, response = False, None
+            if response is not None and response.status_code in SHED_STATUSES:
+                # Load shed on purpose: neither a success nor an app error,
+                # and its fast rejection would flatter the latencies
+                shed += 1
+                await asyncio.sleep(retry_after_seconds(response, args.max_backoff))
+                continue
+            latencies.append((time.perf_counter() - start) * 1000)
+            if not ok:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+    elapsed = time.perf_counter() - started
+    result = summarize(latencies)
+    succeeded = len(latencies) - errors
+    result.update({"succeeded": succeeded, "errors": errors, "shed": shed,
+                   "statuses": {str(k): v for k, v in sorted(statuses.items(), key=str)},
+                   "seconds": round(elapsed, 3),
+                   "rps": round(succeeded / elapsed, 1) if elapsed else 0.0})
+    return result
+
+
+async def run(args):
+    server = import_server()
+    # Per-request access logging would dominate the measurement
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    logging.getLogger("server").setLevel(logging.WARNING)
+    if not args.admission_control:
+        server.rate_limit_backend = None
+        server.concurrency_limiter = None
+        # Every worker may be waiting on a hash at once; none should get a 503
+        server.password_hasher = server.PasswordHasher(
+            server.pwd_context, server.PASSWORD_HASH_WORKERS,
+            max(server.PASSWORD_HASH_MAX_QUEUE, args.concurrency))
+    results = {
+        "timestamp": datetime.utcnow().isoformat(),
+        "config": {
+            "backend": args.backend, "seed": args.seed, "concurrency": args.concurrency,
+            "duration": args.duration, "requests": args.requests,
+            "target": args.base_url or "in-process",
+            "json_store_mode": server.JSON_STORE_MODE,
+            "admission_control": args.admission_control,
+            "python": platform.python_version(), "cpu_count": os.cpu_count(),
+        },
+        "scenarios": {},
+    }
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        if args.base_url:
+            http = httpx.AsyncClient(base_url=args.base_url, timeout=30)
+            sessions = []
+            for i in range(min(args.seed, 100)):
+                r = await http.post("/api/auth/login", json={"username": f"loaduser{i}", "password": "pw"})
+                if r.status_code == 200:
+                    sessions.append((i, r.json()["session_id"]))
+        else:
+            await setup_backend(server, args, tmp_dir)
+            http = httpx.AsyncClient(transport=httpx.ASGITransport(app=server.app),
+                                     base_url="http://loadtest", timeout=30)
+            sessions = [(i, server.create_simple_session(f"load-user-{i}")) for i in range(min(args.seed, 100))]
+
+        print(f"🚀 {args.backend} backend, {args.seed:,} weddings, concurrency {args.concurrency}")
+        async with http:
+            for name in args.scenarios:
+                if name in ("get_private", "patch_update", "put_update") and not sessions:
+                    print(f"   skipping {name}: no sessions (seed the target server first)")
+                    continue
+                result = await run_scenario(http, Scenario(name, args.seed, sessions), args)
+                if name == "rsvp_submit" and not args.base_url:
+                    # 202 only means "buffered": count the time to write it all out
+                    drain_started = time.perf_counter()
+                    await server.rsvp_buffer.flush()
+                    drain = time.perf_counter() - drain_started
+                    result["drain_seconds"] = round(drain, 3)
+                    result["sustained_rps"] = round(result["succeeded"] / (result["seconds"] + drain), 1)
+                results["scenarios"][name] = result
+                print(f"   {name:<22} {result['rps']:>9.1f} rps  p50 {result['p50_ms']:>7.2f} ms  "
+                      f"p95 {result['p95_ms']:>7.2f} ms  p99 {result['p99_ms']:>7.2f} ms  "
+                      f"errors {result['errors']}  shed {result['shed']}"
+                      + (f"  {result['statuses']}" if result["errors"] or result["shed"] else "")
+                      + (f"  sustained {result['sustained_rps']} rps" if "sustained_rps" in result else ""))
+
+        if not args.base_url:
+            results["metrics"] = {"wedding_cache": server.wedding_cache.stats(),
+                                  "admission": server.admission_stats(),
+                                  "rsvp_buffer": server.rsvp_buffer.stats()}
+            await teardown_backend(server, args)
+
+    write_results(args.output, results)
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--backend", choices=["json", "mongomock", "mongo"], default="json")
+    parser.add_argument("--mongo-url", default="mongodb://localhost:27017")
+    parser.add_argument("--db-name", default="weddingcard_loadtest")
+    parser.add_argument("--base-url", help="load a running server instead of the in-process app "
+                                           "(it must already contain the seeded loaduser* accounts)")
+    parser.add_argument("--seed", type=int, default=1000, help="users/weddings to seed")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=5.0, help="seconds per scenario")
+    parser.add_argument("--requests", type=int, help="stop a scenario after this many requests")
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=SCENARIOS)
+    parser.add_argument("--admission-control", action="store_true",
+                        help="keep the in-process app's rate limits, concurrency cap and hashing queue")
+    parser.add_argument("--max-backoff", type=float, default=1.0,
+                        help="longest wait, in seconds, after a 429/503 before the next request")
+    parser.add_argument("--output", help="write results as JSON to this file")
+    return asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
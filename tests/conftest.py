@@ -0,0 +1,129 @@
+import os
+import sys
+from pathlib import Path
+
+import httpx
+import pytest
+from passlib.context import CryptContext
+
+# Import the app without MongoDB and without rate limits
+os.environ["MONGO_URL"] = ""
+os.environ["RATE_LIMIT_ENABLED"] = "false"
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+import server  # noqa: E402
+
+# Single-round hashing keeps registration and login fast in tests
+FAST_CONTEXT = CryptContext(schemes=["pbkdf2_sha256"], pbkdf2_sha256__default_rounds=1)
+
+WEDDING = {
+    "couple_name_1": "Emma",
+    "couple_name_2": "James",
+    "wedding_date": "2026-06-14",
+    "venue_name": "Rose Garden",
+    "venue_location": "Bath",
+    "their_story": "We met at university.",
+}
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture
+def json_backend(tmp_path, monkeypatch):
+    """The server module with Mongo off and every JSON store under ``tmp_path``."""
+    monkeypatch.setattr(server, "MONGO_ENABLED", False)
+    monkeypatch.setattr(server, "mongo_ready", False)
+    monkeypatch.setattr(server, "client", None)
+    monkeypatch.setattr(server, "db", None)
+    stores = {
+        "users_store": server.JsonStore(tmp_path / "users.json", indexes=("username",)),
+        "weddings_store": server.JsonStore(tmp_path / "weddings.json", indexes=("user_id", "custom_url")),
+        "rsvps_store": server.JsonStore(tmp_path / "rsvps.json", indexes=("wedding_id",)),
+        "rsvp_stats_store": server.JsonStore(tmp_path / "rsvp_stats.json"),
+        "slugs_store": server.JsonStore(tmp_path / "slugs.json", indexes=("wedding_id",)),
+    }
+    for name, store in stores.items():
+        monkeypatch.setattr(server, name, store)
+    monkeypatch.setattr(server, "json_stores", tuple(stores.values()))
+    monkeypatch.setattr(server, "ADMIN_COLLECTIONS", {
+        name: (stores[f"{name}_store"], *rest) for name, (_, *rest) in server.ADMIN_COLLECTIONS.items()
+    })
+    guestbook_log = server.GuestbookLog(tmp_path / "guestbook")
+    monkeypatch.setattr(server, "guestbook_log", guestbook_log)
+    monkeypatch.setattr(server, "REPLAY_CONFLICTS_FILE", tmp_path / "replay_conflicts.jsonl")
+    monkeypatch.setattr(server, "blob_store", server.BlobStore(tmp_path / "blobs"))
+    monkeypatch.setattr(server, "derivative_pipeline", server.DerivativePipeline(
+        tmp_path / "blobs" / "derived", workers=0, max_pending=0))
+
+    monkeypatch.setattr(server, "wedding_cache", server.WeddingCache(
+        server.WEDDING_CACHE_MAX_ENTRIES, server.WEDDING_CACHE_TTL_SECONDS))
+    monkeypatch.setattr(server, "guestbook_cache", server.WeddingCache(
+        server.GUESTBOOK_CACHE_MAX_ENTRIES, server.GUESTBOOK_CACHE_TTL_SECONDS))
+    slug_set = server.SlugSet(server.SLUG_SET_REFRESH_SECONDS)
+    slug_set.replace([])
+    monkeypatch.setattr(server, "slug_set", slug_set)
+    monkeypatch.setattr(server, "password_hasher", server.PasswordHasher(FAST_CONTEXT, workers=2, max_queue=64))
+    monkeypatch.setattr(server, "active_sessions", {})
+
+    collections = ("users", "weddings", "rsvps", "guestbook", "slugs")
+    monkeypatch.setattr(server, "pending_replay", {name: set() for name in collections})
+    monkeypatch.setattr(server, "replayed_writes", {name: 0 for name in collections})
+    monkeypatch.setattr(server, "replay_conflicts", {name: 0 for name in collections})
+    monkeypatch.setattr(server, "stale_rsvp_stats", set())
+    monkeypatch.setattr(server, "replay_task", None)
+    monkeypatch.setattr(server, "mongo_breaker", server.CircuitBreaker(
+        server.MONGO_BREAKER_FAILURE_THRESHOLD,
+        server.MONGO_BREAKER_WINDOW_SECONDS,
+        server.MONGO_BREAKER_PROBE_INTERVAL_SECONDS,
+        probe=server.ping_mongo,
+        on_recover=server.replay_fallback_writes,
+        drained=server.fallback_writes_drained,
+    ))
+    yield server
+    server.mongo_breaker.stop()
+    guestbook_log.close()
+
+
+@pytest.fixture(params=["json", "mongomock"])
+async def backend(request, json_backend, monkeypatch):
+    """The server on the JSON fallback, and again on an in-memory Mongo."""
+    if request.param == "mongomock":
+        mongomock_motor = pytest.importorskip("mongomock_motor")
+        mongo_client = mongomock_motor.AsyncMongoMockClient()
+        monkeypatch.setattr(server, "client", mongo_client)
+        monkeypatch.setattr(server, "db", mongo_client["weddingcard_test"])
+        monkeypatch.setattr(server, "MONGO_ENABLED", True)
+        monkeypatch.setattr(server, "mongo_ready", True)
+        await server.ensure_indexes()
+    rsvp_buffer = server.RsvpWriteBuffer(
+        server.RSVP_FLUSH_BATCH_SIZE, server.RSVP_FLUSH_INTERVAL_SECONDS, server.RSVP_MAX_PENDING,
+        writer=server.save_rsvps_to_db,
+    )
+    monkeypatch.setattr(server, "rsvp_buffer", rsvp_buffer)
+    yield server
+    await rsvp_buffer.close()
+
+
+@pytest.fixture
+async def client(backend):
+    transport = httpx.ASGITransport(app=server.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as http_client:
+        yield http_client
+
+
+@pytest.fixture
+def create_couple(client):
+    """Registers a user with a wedding; returns (session_id, wedding)."""
+
+    async def create(username: str, **fields):
+        response = await client.post("/api/auth/register", json={"username": username, "password": "pw"})
+        assert response.status_code == 200, response.text
+        session_id = response.json()["session_id"]
+        response = await client.post("/api/wedding", json={"session_id": session_id, **WEDDING, **fields})
+        assert response.status_code == 200, response.text
+        return session_id, response.json()
+
+    return create
@@ -0,0 +1,82 @@
+import orjson
+import pytest
+
+import server
+
+pytestmark = pytest.mark.anyio
+
+ADMIN = {"X-Admin-Token": "secret"}
+
+
+@pytest.fixture
+def admin_token(monkeypatch):
+    monkeypatch.setattr(server, "ADMIN_TOKEN", "secret")
+
+
+def ndjson(*docs):
+    return b"".join(orjson.dumps(doc) + b"\n" for doc in docs)
+
+
+async def export(client, collection, **params):
+    response = await client.get(f"/api/admin/export/{collection}", params=params, headers=ADMIN)
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+    return [orjson.loads(line) for line in response.content.splitlines()]
+
+
+async def test_admin_routes_need_the_token(client, monkeypatch):
+    assert (await client.get("/api/admin/export/users", headers=ADMIN)).status_code == 404
+
+    monkeypatch.setattr(server, "ADMIN_TOKEN", "secret")
+    assert (await client.get("/api/admin/export/users")).status_code == 403
+    assert (await client.get("/api/admin/export/users", headers={"X-Admin-Token": "nope"})).status_code == 403
+    assert (await client.get("/api/admin/export/sessions", headers=ADMIN)).status_code == 404
+
+
+async def test_export_and_import_round_trip(client, create_couple, admin_token):
+    for i in range(3):
+        await create_couple(f"ndjson-{i}", custom_url=f"ndjson-couple-{i}")
+    weddings = await export(client, "weddings")
+    assert [wedding["id"] for wedding in weddings] == sorted(wedding["id"] for wedding in weddings)
+    assert len(weddings) == 3
+
+    resumed = await export(client, "weddings", after=weddings[0]["id"])
+    assert resumed == weddings[1:]
+
+    # Importing the export again changes nothing
+    response = await client.post("/api/admin/import/weddings", content=ndjson(*weddings), headers=ADMIN)
+    assert response.status_code == 200
+    assert response.json()["imported"] == 3
+    assert await export(client, "weddings") == weddings
+
+    edited = {**weddings[0], "venue_name": "Old Mill"}
+    response = await client.post("/api/admin/import/weddings", content=ndjson(edited), headers=ADMIN)
+    assert response.json()["status"] == "done"
+    response = await client.get(f"/api/wedding/public/{edited['id']}")
+    assert response.json()["venue_name"] == "Old Mill"
+
+
+async def test_import_reports_bad_lines_and_resumes(client, admin_token, monkeypatch):
+    monkeypatch.setattr(server, "ADMIN_IMPORT_BATCH_SIZE", 2)
+    body = b"\n".join([
+        orjson.dumps({"id": "u1", "username": "alice", "password": "x"}),
+        b"{not json",
+        orjson.dumps({"id": "u2"}),
+        orjson.dumps({"id": "u3", "username": "carol", "password": "x"}),
+        b"",
+        orjson.dumps({"id": "u4", "username": "dave", "password": "x"}),
+    ])
+
+    response = await client.post("/api/admin/import/users", content=body, headers=ADMIN)
+
+    progress = response.json()
+    assert (progress["lines"], progress["imported"], progress["failed"]) == (6, 3, 2)
+    assert [error["line"] for error in progress["errors"]] == [2, 3]
+    assert "missing username" in progress["errors"][1]["error"]
+    assert [user["id"] for user in await export(client, "users")] == ["u1", "u3", "u4"]
+
+    response = await client.post("/api/admin/import/users", params={"skip": 4, "import_id": "resume"},
+                                 content=body, headers=ADMIN)
+    assert response.json()["imported"] == 1
+    response = await client.get("/api/admin/imports", headers=ADMIN)
+    assert response.json()[-1]["import_id"] == "resume"
@@ -0,0 +1,117 @@
+import anyio
+import pytest
+
+import server
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def rate_limits(monkeypatch):
+    """Memory rate limits with a burst of 2 and a token every 2 seconds per class."""
+    monkeypatch.setattr(server, "rate_limit_backend", server.MemoryRateLimitBackend())
+    monkeypatch.setattr(server, "rate_limited", server.Counter())
+    monkeypatch.setattr(server, "RATE_LIMIT_ROUTE_CLASSES", [
+        (pattern, methods, name, 0.5, 2) for pattern, methods, name, _, _ in server.RATE_LIMIT_ROUTE_CLASSES
+    ])
+
+
+async def test_requests_over_the_burst_get_429(client, rate_limits, monkeypatch):
+    url = "/api/custom-url/available"
+    statuses = [(await client.get(url, params={"slug": "emma-james"})).status_code for _ in range(3)]
+    assert statuses == [200, 200, 429]
+
+    response = await client.get(url, params={"slug": "emma-james"})
+    assert response.headers["retry-after"] == "2"
+    assert response.json() == {"detail": "Too many requests"}
+    assert server.rate_limited["custom_url"] == 2
+
+    # Other route classes and exempt paths have their own budget
+    assert (await client.get("/api/wedding/public/missing")).status_code == 404
+    assert (await client.get("/api/health/live")).status_code == 200
+
+    # Behind a proxy, each forwarded client gets its own bucket
+    monkeypatch.setattr(server, "RATE_LIMIT_PROXY_HOPS", 1)
+    response = await client.get(url, params={"slug": "emma-james"}, headers={"X-Forwarded-For": "203.0.113.7"})
+    assert response.status_code == 200
+
+
+async def test_guestbook_reads_are_not_rate_limited(client, create_couple, rate_limits):
+    _, wedding = await create_couple("admission-guestbook")
+    url = f"/api/wedding/{wedding['id']}/guestbook"
+    entry = {"name": "Guest", "message": "Congratulations!"}
+
+    assert [(await client.post(url, json=entry)).status_code for _ in range(3)] == [201, 201, 429]
+    for _ in range(5):
+        assert (await client.get(url)).status_code == 200
+
+
+def test_route_class_matches_path_and_method():
+    assert server.route_class("/api/auth/login", "POST")[0] == "auth"
+    assert server.route_class("/api/wedding/w1/guestbook", "POST")[0] == "guestbook"
+    assert server.route_class("/api/wedding/w1/guestbook", "GET") is None
+    assert server.route_class("/api/wedding", "PUT") is None
+
+
+def test_memory_buckets_refill_and_stay_bounded(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(server.time, "monotonic", lambda: now[0])
+    backend = server.MemoryRateLimitBackend(max_keys=2)
+
+    assert [backend.take("a", 1.0, 2) for _ in range(3)] == [0.0, 0.0, 1.0]
+    now[0] += 1
+    assert backend.take("a", 1.0, 2) == 0.0
+
+    backend.take("b", 1.0, 2)
+    backend.take("c", 1.0, 2)
+    assert len(backend) == 2
+
+
+def test_sqlite_buckets_are_shared_between_instances(tmp_path):
+    path = str(tmp_path / "ratelimit.db")
+    first, second = server.SqliteRateLimitBackend(path), server.SqliteRateLimitBackend(path)
+
+    assert first.take("auth:1.2.3.4", 0.1, 2) == 0.0
+    assert second.take("auth:1.2.3.4", 0.1, 2) == 0.0
+    assert first.take("auth:1.2.3.4", 0.1, 2) > 0
+    assert first.errors == second.errors == 0
+
+
+async def test_full_queue_gets_503(client, monkeypatch):
+    limiter = server.ConcurrencyLimiter(limit=1, max_queue=0, max_wait=1)
+    monkeypatch.setattr(server, "concurrency_limiter", limiter)
+    assert await limiter.acquire()
+
+    response = await client.get("/api/test")
+    assert response.status_code == 503
+    assert response.headers["retry-after"] == "1"
+    assert (await client.get("/api/health/live")).status_code == 200
+    assert limiter.shed == 1
+
+    limiter.release()
+    assert (await client.get("/api/test")).status_code == 200
+    assert limiter.in_flight == 0
+
+
+async def test_queued_requests_wait_for_a_slot_or_time_out(client, monkeypatch):
+    limiter = server.ConcurrencyLimiter(limit=1, max_queue=1, max_wait=0.5)
+    monkeypatch.setattr(server, "concurrency_limiter", limiter)
+    assert await limiter.acquire()
+    responses = []
+
+    async def request():
+        responses.append(await client.get("/api/test"))
+
+    async with anyio.create_task_group() as tg:
+        tg.start_soon(request)
+        await anyio.sleep(0.05)
+        assert limiter.stats()["waiting"] == 1
+        limiter.release()
+    assert responses[0].status_code == 200
+
+    assert await limiter.acquire()
+    response = await client.get("/api/test")
+    assert response.status_code == 503
+    assert limiter.timed_out == 1
+    limiter.release()
+
@@ -0,0 +1,78 @@
+import threading
+
+import anyio
+import pytest
+
+import server
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_concurrent_registrations_of_one_username(client):
+    responses = []
+
+    async def register():
+        responses.append(await client.post("/api/auth/register", json={"username": "bob", "password": "pw"}))
+
+    async with anyio.create_task_group() as tg:
+        for _ in range(5):
+            tg.start_soon(register)
+
+    assert sorted(response.status_code for response in responses) == [200, 400, 400, 400, 400]
+    response = await client.post("/api/auth/login", json={"username": "bob", "password": "pw"})
+    assert response.status_code == 200
+
+
+async def test_unknown_username_still_verifies_a_hash(client, monkeypatch):
+    verify_dummy = server.password_hasher.verify_dummy
+    dummy_verifications = []
+
+    async def spy(password):
+        dummy_verifications.append(password)
+        await verify_dummy(password)
+
+    monkeypatch.setattr(server.password_hasher, "verify_dummy", spy)
+    await client.post("/api/auth/register", json={"username": "alice", "password": "pw"})
+
+    wrong_password = await client.post("/api/auth/login", json={"username": "alice", "password": "nope"})
+    unknown_user = await client.post("/api/auth/login", json={"username": "mallory", "password": "nope"})
+
+    assert wrong_password.status_code == unknown_user.status_code == 401
+    assert wrong_password.json() == unknown_user.json()
+    assert dummy_verifications == ["nope"]
+
+
+async def test_saturated_hashing_pool_answers_503(client, monkeypatch):
+    hasher = server.PasswordHasher(server.password_hasher.context, workers=1, max_queue=0)
+    monkeypatch.setattr(server, "password_hasher", hasher)
+    release = threading.Event()
+    monkeypatch.setattr(hasher.context, "hash", lambda password: release.wait() and "unused")
+    responses = []
+
+    async def register(username):
+        responses.append(await client.post("/api/auth/register", json={"username": username, "password": "pw"}))
+
+    async with anyio.create_task_group() as tg:
+        tg.start_soon(register, "first")
+        await anyio.sleep(0.05)
+        await register("second")
+        release.set()
+    hasher.shutdown()
+
+    busy = responses[0]
+    assert busy.status_code == 503
+    assert busy.headers["retry-after"] == "1"
+    assert hasher.rejected == 1
+
+
+async def test_plaintext_password_is_upgraded_on_login(client):
+    await server.create_user_in_db({"id": "u1", "username": "legacy", "password": "old-pw"})
+
+    response = await client.post("/api/auth/login", json={"username": "legacy", "password": "old-pw"})
+
+    assert response.status_code == 200
+    stored = (await server.get_user_by_username_from_db("legacy"))["password"]
+    assert stored != "old-pw"
+    assert server.password_hasher.context.verify("old-pw", stored)
+    response = await client.post("/api/auth/login", json={"username": "legacy", "password": "old-pw"})
+    assert response.status_code == 200
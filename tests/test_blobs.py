@@ -0,0 +1,98 @@
+import base64
+import hashlib
+
+import pytest
+
+import server
+
+pytestmark = pytest.mark.anyio
+
+PNG = b"\x89PNG\r\n\x1a\n" + bytes(range(256)) * 4
+
+
+async def upload(client, session_id, data, filename="photo.png"):
+    return await client.post("/api/wedding/photos", params={"session_id": session_id},
+                             files={"file": (filename, data, "application/octet-stream")})
+
+
+async def test_upload_is_stored_once_by_digest(client, create_couple):
+    session_id, _ = await create_couple("blob-upload")
+
+    first = await upload(client, session_id, PNG)
+    second = await upload(client, session_id, PNG, filename="copy.png")
+
+    assert first.status_code == 200, first.text
+    digest = hashlib.sha256(PNG).hexdigest()
+    assert first.json() == {"digest": digest, "url": f"/api/blobs/{digest}", "size": len(PNG),
+                            "content_type": "image/png"}
+    assert second.json()["digest"] == digest
+    assert server.blob_store.path(digest).read_bytes() == PNG
+
+    response = await upload(client, session_id, b"%PDF-1.7 not an image")
+    assert response.status_code == 415
+
+
+async def test_blob_download_supports_ranges(client, create_couple):
+    session_id, _ = await create_couple("blob-ranges")
+    url = (await upload(client, session_id, PNG)).json()["url"]
+
+    response = await client.get(url)
+    assert response.status_code == 200
+    assert response.content == PNG
+    assert response.headers["content-type"] == "image/png"
+    assert response.headers["accept-ranges"] == "bytes"
+    assert "immutable" in response.headers["cache-control"]
+
+    response = await client.get(url, headers={"Range": "bytes=8-15"})
+    assert response.status_code == 206
+    assert response.content == PNG[8:16]
+    assert response.headers["content-range"] == f"bytes 8-15/{len(PNG)}"
+
+    response = await client.get(url, headers={"Range": "bytes=-4"})
+    assert response.status_code == 206
+    assert response.content == PNG[-4:]
+
+    response = await client.get(url, headers={"Range": "bytes=1000-"})
+    assert response.status_code == 206
+    assert response.content == PNG[1000:]
+
+    response = await client.get(url, headers={"Range": f"bytes={len(PNG)}-"})
+    assert response.status_code == 416
+    assert response.headers["content-range"] == f"bytes */{len(PNG)}"
+
+    response = await client.get(url, headers={"If-None-Match": f'"{hashlib.sha256(PNG).hexdigest()}"'})
+    assert response.status_code == 304
+
+
+@pytest.mark.parametrize("header, expected", [
+    (None, None),
+    ("bytes=0-9", (0, 9)),
+    ("bytes=5-", (5, 99)),
+    ("bytes=-10", (90, 99)),
+    ("bytes=90-500", (90, 99)),
+    ("bytes=9-3", None),
+    ("bytes=0-1,4-5", None),
+    ("items=0-9", None),
+])
+def test_parse_byte_range(header, expected):
+    assert server.parse_byte_range(header, 100) == expected
+
+
+async def test_unknown_blob_is_404(client):
+    assert (await client.get("/api/blobs/" + "0" * 64)).status_code == 404
+    assert (await client.get("/api/blobs/not-a-digest")).status_code == 404
+
+
+async def test_inline_photos_are_moved_to_the_blob_store(client, create_couple):
+    session_id, _ = await create_couple("blob-inline")
+    inline = "data:image/png;base64," + base64.b64encode(PNG).decode()
+
+    response = await client.patch("/api/wedding", json={"session_id": session_id, "ops": [
+        {"op": "add", "path": "/gallery_photos/-", "value": inline},
+        {"op": "add", "path": "/gallery_photos/-", "value": "https://example.com/a.jpg"},
+    ]})
+
+    assert response.status_code == 200, response.text
+    digest = hashlib.sha256(PNG).hexdigest()
+    assert response.json()["gallery_photos"] == [f"/api/blobs/{digest}", "https://example.com/a.jpg"]
+    assert server.blob_store.exists(digest)
@@ -0,0 +1,205 @@
+import json
+
+import anyio
+import pytest
+from pymongo.errors import ConnectionFailure, ExecutionTimeout, OperationFailure, WriteError
+
+import server
+
+pytestmark = pytest.mark.anyio
+
+
+def make_breaker(probe=None, on_recover=None, drained=lambda: True):
+    async def ok():
+        pass
+
+    return server.CircuitBreaker(
+        failure_threshold=3, window_seconds=30, probe_interval=0,
+        probe=probe or ok, on_recover=on_recover or ok, drained=drained,
+    )
+
+
+async def wait_for_state(breaker, state):
+    with anyio.fail_after(2):
+        while breaker.state != state:
+            await anyio.sleep(0.001)
+
+
+async def test_opens_after_threshold_connectivity_failures():
+    breaker = make_breaker(probe=lambda: anyio.sleep(60))
+    try:
+        breaker.record_failure(OperationFailure("bad query"))
+        breaker.record_failure(ConnectionFailure("down"))
+        breaker.record_failure(ConnectionFailure("down"))
+        assert breaker.state == breaker.CLOSED
+        assert breaker.allow()
+
+        breaker.record_failure(ConnectionFailure("down"))
+        assert breaker.state == breaker.OPEN
+        assert not breaker.allow()
+        assert breaker.short_circuited == 1
+    finally:
+        breaker.stop()
+
+
+async def test_recovers_once_the_probe_succeeds():
+    probes = []
+    recoveries = []
+
+    async def probe():
+        probes.append(1)
+        if len(probes) < 3:
+            raise ConnectionFailure("still down")
+
+    async def on_recover():
+        recoveries.append(breaker.state)
+
+    breaker = make_breaker(probe=probe, on_recover=on_recover)
+    for _ in range(3):
+        breaker.record_failure(ConnectionFailure("down"))
+    await wait_for_state(breaker, breaker.CLOSED)
+
+    assert len(probes) == 3
+    assert recoveries == [breaker.RECOVERING]
+    assert breaker.transitions == {"closed->open": 1, "open->recovering": 1, "recovering->closed": 1}
+
+
+async def test_stays_recovering_until_the_fallback_is_drained():
+    pending = ["late write"]
+    recoveries = []
+
+    async def on_recover():
+        recoveries.append(list(pending))
+        if len(recoveries) > 1:
+            pending.clear()
+
+    breaker = make_breaker(on_recover=on_recover, drained=lambda: not pending)
+    for _ in range(3):
+        breaker.record_failure(ConnectionFailure("down"))
+    await wait_for_state(breaker, breaker.CLOSED)
+
+    assert recoveries == [["late write"], ["late write"]]
+
+
+async def test_failed_recovery_reopens_and_retries():
+    recoveries = []
+
+    async def on_recover():
+        recoveries.append(1)
+        if len(recoveries) == 1:
+            raise ConnectionFailure("dropped again")
+
+    breaker = make_breaker(on_recover=on_recover)
+    for _ in range(3):
+        breaker.record_failure(ConnectionFailure("down"))
+    await wait_for_state(breaker, breaker.CLOSED)
+
+    assert len(recoveries) == 2
+    assert breaker.transitions["recovering->open"] == 1
+
+
+@pytest.fixture
+async def mongo(json_backend, monkeypatch):
+    mongomock_motor = pytest.importorskip("mongomock_motor")
+    client = mongomock_motor.AsyncMongoMockClient()
+    monkeypatch.setattr(server, "client", client)
+    monkeypatch.setattr(server, "db", client["weddingcard_test"])
+    monkeypatch.setattr(server, "MONGO_ENABLED", True)
+    await server.ensure_indexes()
+    return server.db
+
+
+async def test_replay_copies_fallback_writes(mongo):
+    await server.weddings_store.put_async({"id": "w1", "user_id": "u1", "version": 1})
+    server.note_fallback_write("weddings", "w1")
+
+    await server.replay_fallback_writes()
+
+    assert (await mongo.weddings.find_one({"id": "w1"}))["user_id"] == "u1"
+    assert server.fallback_writes_drained()
+    assert server.replayed_writes["weddings"] == 1
+
+
+async def test_replay_drains_writes_made_while_it_runs(mongo, monkeypatch):
+    await server.weddings_store.put_async({"id": "w1", "user_id": "u1", "venue_name": "Rose Garden"})
+    server.note_fallback_write("weddings", "w1")
+    replay_doc = server.replay_doc
+
+    async def slow_replay_doc(collection, doc):
+        await anyio.sleep(0.05)
+        await replay_doc(collection, doc)
+
+    async def edit_during_replay():
+        await anyio.sleep(0.01)
+        await server.weddings_store.update_one_async("id", "w1", {"$set": {"venue_name": "Old Mill"}})
+        server.note_fallback_write("weddings", "w1")
+
+    monkeypatch.setattr(server, "replay_doc", slow_replay_doc)
+    async with anyio.create_task_group() as tg:
+        tg.start_soon(server.replay_fallback_writes)
+        tg.start_soon(edit_during_replay)
+
+    assert server.fallback_writes_drained()
+    assert (await mongo.weddings.find_one({"id": "w1"}))["venue_name"] == "Old Mill"
+
+
+async def test_replay_keeps_docs_that_mongo_rejects(mongo):
+    await mongo.weddings.insert_one({"id": "w-mongo", "user_id": "u1", "version": 1})
+    await server.weddings_store.put_async({"id": "w-json", "user_id": "u1", "version": 1})
+    server.note_fallback_write("weddings", "w-json")
+
+    await server.replay_fallback_writes()
+
+    assert server.replay_conflicts["weddings"] == 1
+    assert server.fallback_writes_drained()
+    (line,) = server.REPLAY_CONFLICTS_FILE.read_text().splitlines()
+    record = json.loads(line)
+    assert record["collection"] == "weddings"
+    assert record["doc"]["id"] == "w-json"
+
+
+class FailingCollection:
+    def __init__(self, error):
+        self.error = error
+
+    async def find_one(self, *args, **kwargs):
+        raise self.error
+
+    async def replace_one(self, *args, **kwargs):
+        raise self.error
+
+
+async def test_replay_records_any_doc_mongo_refuses(mongo, monkeypatch):
+    await server.weddings_store.put_async({"id": "w1", "user_id": "u1", "version": 1})
+    server.note_fallback_write("weddings", "w1")
+    monkeypatch.setattr(server, "db", {"weddings": FailingCollection(WriteError("document too large", 10334))})
+
+    await server.replay_fallback_writes()
+
+    assert server.replay_conflicts["weddings"] == 1
+    assert server.fallback_writes_drained()
+    assert json.loads(server.REPLAY_CONFLICTS_FILE.read_text())["doc"]["id"] == "w1"
+
+
+async def test_replay_keeps_docs_pending_while_mongo_is_unreachable(mongo, monkeypatch):
+    await server.weddings_store.put_async({"id": "w1", "user_id": "u1", "version": 1})
+    server.note_fallback_write("weddings", "w1")
+    monkeypatch.setattr(server, "db", {"weddings": FailingCollection(ExecutionTimeout("timed out"))})
+
+    with pytest.raises(ExecutionTimeout):
+        await server.replay_fallback_writes()
+
+    assert server.pending_replay["weddings"] == {"w1"}
+    assert server.replay_conflicts["weddings"] == 0
+
+
+async def test_only_connectivity_errors_fall_back_to_json(mongo, monkeypatch):
+    await server.users_store.put_async({"id": "u1", "username": "bob"})
+    monkeypatch.setattr(server, "mongo_ready", True)
+
+    monkeypatch.setattr(server, "db", type("Db", (), {"users": FailingCollection(ConnectionFailure("down"))}))
+    assert (await server.get_user_from_db("u1"))["username"] == "bob"
+
+    monkeypatch.setattr(server, "db", type("Db", (), {"users": FailingCollection(OperationFailure("bad query"))}))
+    with pytest.raises(OperationFailure):
+        await server.get_user_from_db("u1")
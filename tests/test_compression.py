@@ -0,0 +1,93 @@
+import gzip
+
+import pytest
+
+import server
+
+pytestmark = pytest.mark.anyio
+
+LONG_STORY = "We met at a friend's birthday party and never stopped talking. " * 40
+
+
+@pytest.mark.parametrize("header, encoding", [
+    (None, None),
+    ("identity", None),
+    ("gzip", "gzip"),
+    ("gzip, deflate, br", "br"),
+    ("br;q=0.5, gzip;q=0.8", "gzip"),
+    ("br;q=0, gzip;q=0", None),
+    ("*", "br"),
+    ("*;q=0.1, gzip;q=0", "br"),
+])
+def test_negotiate_encoding(header, encoding):
+    assert server.negotiate_encoding(header) == encoding
+
+
+@pytest.fixture
+def inline_precompressor(monkeypatch):
+    # Runs the dense pass as soon as it is submitted instead of on a thread
+    monkeypatch.setattr(server.precompressor, "submit", lambda payload, encoding: payload.precompress(encoding))
+
+
+async def test_public_wedding_is_served_per_encoding(client, create_couple, inline_precompressor):
+    _, wedding = await create_couple("compress-public", their_story=LONG_STORY)
+    url = f"/api/wedding/public/{wedding['id']}"
+
+    plain = await client.get(url, headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in plain.headers
+    assert plain.headers["vary"] == "Accept-Encoding"
+
+    for encoding in ("gzip", "br"):
+        # The first response carries the quick interim body under a weak ETag,
+        # later ones the densely compressed bytes under a strong one
+        first = await client.get(url, headers={"Accept-Encoding": encoding})
+        second = await client.get(url, headers={"Accept-Encoding": encoding})
+
+        for response in (first, second):
+            assert response.headers["content-encoding"] == encoding
+            assert response.headers["vary"] == "Accept-Encoding"
+            assert response.content == plain.content
+        assert first.headers["etag"] == "W/" + second.headers["etag"]
+        assert second.headers["etag"] == plain.headers["etag"][:-1] + f'-{encoding}"'
+        assert int(second.headers["content-length"]) < len(plain.content)
+
+        response = await client.get(url, headers={"Accept-Encoding": encoding,
+                                                  "If-None-Match": first.headers["etag"]})
+        assert response.status_code == 304
+
+
+async def test_small_public_wedding_is_not_compressed(client, create_couple):
+    _, wedding = await create_couple("compress-small")
+
+    response = await client.get(f"/api/wedding/public/{wedding['id']}", params={"fields": "theme"},
+                                headers={"Accept-Encoding": "gzip"})
+
+    assert "content-encoding" not in response.headers
+    assert not response.headers["etag"].endswith('-gzip"')
+
+
+async def test_other_json_responses_are_compressed_by_the_middleware(client, create_couple):
+    session_id, _ = await create_couple("compress-private", their_story=LONG_STORY)
+
+    response = await client.get("/api/wedding", params={"session_id": session_id},
+                                headers={"Accept-Encoding": "gzip"})
+
+    assert response.headers["content-encoding"] == "gzip"
+    assert "Accept-Encoding" in response.headers["vary"]
+    assert response.json()["their_story"] == LONG_STORY
+
+    response = await client.get("/api/wedding", params={"session_id": session_id},
+                                headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in response.headers
+
+
+def test_dense_pass_is_smaller_and_decodes_to_the_body(inline_precompressor):
+    payload = server.PublicWedding({"id": "w1", "their_story": LONG_STORY * 4})
+
+    interim, final = payload.compress("gzip")
+
+    assert not final
+    assert payload.compress("gzip") == (payload.compressed["gzip"], True)
+    assert not payload.interim
+    assert gzip.decompress(payload.compressed["gzip"]) == payload.body
+    assert len(payload.compressed["gzip"]) <= len(interim)
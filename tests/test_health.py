@@ -0,0 +1,23 @@
+import pytest
+
+import server
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_readiness_waits_for_the_stores_not_for_mongo(client, monkeypatch):
+    monkeypatch.setattr(server, "app_ready", False)
+    response = await client.get("/api/health/ready")
+    assert response.status_code == 503
+    assert response.json()["status"] == "starting"
+    assert (await client.get("/api/health/live")).status_code == 200
+
+    monkeypatch.setattr(server, "app_ready", True)
+    monkeypatch.setattr(server, "MONGO_ENABLED", True)
+    monkeypatch.setattr(server, "mongo_ready", False)
+    response = await client.get("/api/health/ready")
+    assert response.status_code == 200
+    assert response.json()["storage"] == "json"
+
+    monkeypatch.setattr(server, "READY_REQUIRES_MONGO", True)
+    assert (await client.get("/api/health/ready")).status_code == 503
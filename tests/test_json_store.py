@@ -0,0 +1,134 @@
+import json
+import threading
+
+import pytest
+
+import server
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def store_path(tmp_path):
+    return tmp_path / "docs.json"
+
+
+def test_put_get_and_reload(store_path):
+    store = server.JsonStore(store_path, indexes=("user_id",))
+    store.put({"id": "w1", "user_id": "u1", "venue_name": "Rose Garden"})
+    store.put({"id": "w2", "user_id": "u2", "venue_name": "Old Mill"})
+
+    assert store.get("w1")["venue_name"] == "Rose Garden"
+    assert store.find_one("user_id", "u2")["id"] == "w2"
+    assert store.get("w1", {"venue_name": 1}) == {"venue_name": "Rose Garden"}
+    assert store.get("missing") is None
+
+    reloaded = server.JsonStore(store_path, indexes=("user_id",))
+    assert reloaded.all() == store.all()
+    assert reloaded.find_one("user_id", "u1")["id"] == "w1"
+
+
+def test_put_replaces_secondary_index_entries(store_path):
+    store = server.JsonStore(store_path, indexes=("custom_url",))
+    store.put({"id": "w1", "custom_url": "emma-james"})
+    store.put({"id": "w1", "custom_url": "emma-and-james"})
+
+    assert store.find_one("custom_url", "emma-james") is None
+    assert store.find_one("custom_url", "emma-and-james")["id"] == "w1"
+
+
+def test_external_edit_is_picked_up(store_path):
+    store = server.JsonStore(store_path)
+    store.put({"id": "w1", "venue_name": "Rose Garden"})
+
+    server.save_json_file(store_path, {"w1": {"id": "w1", "venue_name": "Edited by hand"}})
+
+    assert store.get("w1")["venue_name"] == "Edited by hand"
+
+
+def test_concurrent_puts_are_not_lost(store_path):
+    store = server.JsonStore(store_path)
+    stop = threading.Event()
+
+    def read():
+        while not stop.is_set():
+            store.get("anything")
+
+    def write(writer):
+        for i in range(50):
+            store.put({"id": f"{writer}-{i}"})
+
+    readers = [threading.Thread(target=read) for _ in range(4)]
+    writers = [threading.Thread(target=write, args=(w,)) for w in range(8)]
+    for thread in readers + writers:
+        thread.start()
+    for thread in writers:
+        thread.join()
+    stop.set()
+    for thread in readers:
+        thread.join()
+
+    assert len(store.all()) == 400
+    assert len(json.loads(store_path.read_text())) == 400
+
+
+def test_journal_is_replayed_after_a_crash(store_path):
+    store = server.JsonStore(store_path, journal=True)
+    store.put({"id": "w1", "venue_name": "Rose Garden"}).result()
+    store.put({"id": "w1", "venue_name": "Old Mill"}).result()
+    store.put({"id": "w2", "venue_name": "Town Hall"}).result()
+    # A record torn by the crash is skipped
+    (journal_path,) = [path for _, path in server.JournalWriter.existing_journals(store_path)]
+    with open(journal_path, "ab") as f:
+        f.write(b'{"op":"put","doc":{"id":"w3"')
+
+    recovered = server.JsonStore(store_path, journal=True)
+    try:
+        assert not store_path.exists()
+        assert recovered.get("w1")["venue_name"] == "Old Mill"
+        assert set(recovered.all()) == {"w1", "w2"}
+    finally:
+        recovered.close()
+        store._journal.close()
+
+
+def test_compaction_folds_the_journal_into_the_snapshot(store_path):
+    store = server.JsonStore(store_path, journal=True)
+    for i in range(5):
+        store.put({"id": f"w{i}", "n": i}).result()
+
+    assert not store.compact(min_bytes=10**9)
+    assert store.compact()
+    assert len(json.loads(store_path.read_text())) == 5
+    # Only the fresh journal the writer moved on to is left
+    assert [gen for gen, _ in server.JournalWriter.existing_journals(store_path)] == [2]
+
+    store.put({"id": "w5", "n": 5}).result()
+    store.close()
+    assert server.JournalWriter.existing_journals(store_path) == []
+
+    reopened = server.JsonStore(store_path, journal=True)
+    try:
+        assert len(reopened.all()) == 6
+    finally:
+        reopened.close()
+
+
+async def test_update_one_async_checks_where(store_path):
+    store = server.JsonStore(store_path)
+    store.put({"id": "w1", "version": 2, "tags": ["a"]})
+
+    assert await store.update_one_async("id", "w1", {"$set": {"version": 3}},
+                                        where=lambda doc: doc["version"] == 1) is None
+    updated = await store.update_one_async("id", "w1", {"$set": {"version": 3}, "$push": {"tags": "b"}},
+                                           where=lambda doc: doc["version"] == 2)
+    assert updated == {"id": "w1", "version": 3, "tags": ["a", "b"]}
+    assert server.JsonStore(store_path).get("w1") == updated
+
+
+async def test_insert_if_absent_async(store_path):
+    store = server.JsonStore(store_path, indexes=("username",))
+
+    assert await store.insert_if_absent_async("username", "bob", {"id": "u1", "username": "bob"})
+    assert not await store.insert_if_absent_async("username", "bob", {"id": "u2", "username": "bob"})
+    assert list(store.all()) == ["u1"]
@@ -0,0 +1,19 @@
+import logging
+
+import server
+
+
+def test_only_the_app_logger_is_configured():
+    assert not any(isinstance(handler, server.DeferredQueueHandler) for handler in logging.getLogger().handlers)
+    assert any(isinstance(handler, server.DeferredQueueHandler) for handler in server.logger.handlers)
+    assert not server.logger.propagate
+
+
+def test_key_value_formatter_appends_fields():
+    formatter = server.KeyValueFormatter("%(levelname)s %(message)s")
+    record = logging.LogRecord("server", logging.INFO, __file__, 1, "wedding.saved", None, None)
+    record.fields = {"wedding_id": "w1", "venue": "Rose Garden", "tags": ["a", "b"], "empty": ""}
+
+    assert formatter.format(record) == (
+        'INFO wedding.saved wedding_id=w1 venue="Rose Garden" tags=["a","b"] empty=""'
+    )
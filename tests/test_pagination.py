@@ -0,0 +1,96 @@
+from datetime import datetime
+
+import anyio
+import pytest
+from fastapi import HTTPException
+
+import server
+
+pytestmark = pytest.mark.anyio
+
+
+def test_keyset_cursor_round_trip():
+    created_at = datetime(2026, 6, 14, 12, 30, 5, 123456)
+    cursor = server.encode_keyset_cursor({"created_at": created_at, "id": "r1"})
+
+    assert server.decode_keyset_cursor(cursor) == (created_at, "r1")
+
+
+@pytest.mark.parametrize("cursor", ["zz", "bm90IGpzb24", server.encode_json(["x", "r1"]).decode()])
+def test_invalid_cursor_is_rejected(cursor):
+    with pytest.raises(HTTPException) as excinfo:
+        server.decode_keyset_cursor(cursor)
+    assert excinfo.value.status_code == 400
+
+
+async def collect_pages(client, url, key, **params):
+    items, cursor = [], None
+    while True:
+        response = await client.get(url, params={**params, **({"cursor": cursor} if cursor else {})})
+        assert response.status_code == 200, response.text
+        page = response.json()
+        items += page[key]
+        cursor = page["next_cursor"]
+        if not cursor:
+            return items
+
+
+async def test_rsvps_are_paged_oldest_first(client, create_couple):
+    session_id, wedding = await create_couple("rsvp-pages")
+    for i in range(7):
+        response = await client.post(f"/api/wedding/{wedding['id']}/rsvp",
+                                     json={"name": f"Guest {i}", "email": f"guest{i}@example.com",
+                                           "attendance": "yes"})
+        assert response.status_code == 202
+    await server.rsvp_buffer.flush()
+
+    rsvps = await collect_pages(client, "/api/wedding/rsvps", "rsvps", session_id=session_id, limit=3)
+
+    assert sorted(rsvp["name"] for rsvp in rsvps) == [f"Guest {i}" for i in range(7)]
+    keys = [(datetime.fromisoformat(rsvp["created_at"]), rsvp["id"]) for rsvp in rsvps]
+    assert keys == sorted(keys)
+    assert len(set(keys)) == 7
+
+    response = await client.get("/api/wedding/rsvps", params={"session_id": session_id, "cursor": "zz"})
+    assert response.status_code == 400
+
+
+async def test_guestbook_is_paged_newest_first(client, create_couple):
+    _, wedding = await create_couple("guestbook-pages")
+    url = f"/api/wedding/{wedding['id']}/guestbook"
+    for i in range(25):
+        response = await client.post(url, json={"name": f"Guest {i}", "message": "Congratulations!"})
+        assert response.status_code == 201
+
+    entries = await collect_pages(client, url, "entries", limit=10)
+
+    assert sorted(entry["name"] for entry in entries) == sorted(f"Guest {i}" for i in range(25))
+    # Mongo keeps milliseconds, so posts in the same one are ordered by id
+    keys = [(datetime.fromisoformat(entry["created_at"]), entry["id"]) for entry in entries]
+    assert keys == sorted(keys, reverse=True)
+    assert len(set(keys)) == 25
+
+    # A post shows up on the (cached) first page right away
+    await anyio.sleep(0.002)
+    await client.post(url, json={"name": "Late guest", "message": "Sorry I missed it"})
+    first_page = (await client.get(url)).json()
+    assert first_page["entries"][0]["name"] == "Late guest"
+
+
+async def test_guestbook_first_page_revalidates(client, create_couple):
+    _, wedding = await create_couple("guestbook-etag")
+    url = f"/api/wedding/{wedding['id']}/guestbook"
+    await client.post(url, json={"name": "Guest", "message": "Congratulations!"})
+
+    response = await client.get(url)
+    etag = response.headers["etag"]
+    assert (await client.get(url, headers={"If-None-Match": etag})).status_code == 304
+
+    await client.post(url, json={"name": "Another guest", "message": "Cheers!"})
+    response = await client.get(url, headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert len(response.json()["entries"]) == 2
+
+    assert (await client.get("/api/wedding/missing/guestbook")).status_code == 404
+    response = await client.post("/api/wedding/missing/guestbook", json={"name": "Guest", "message": "Hi"})
+    assert response.status_code == 404
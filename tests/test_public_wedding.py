@@ -0,0 +1,52 @@
+import pytest
+
+pytestmark = pytest.mark.anyio
+
+IDENTITY = {"Accept-Encoding": "identity"}
+
+
+async def test_etag_revalidation_returns_304(client, create_couple):
+    _, wedding = await create_couple("etag-couple")
+    url = f"/api/wedding/public/{wedding['id']}"
+
+    response = await client.get(url, headers=IDENTITY)
+    assert response.status_code == 200
+    etag = response.headers["etag"]
+    assert etag.startswith('"') and etag.endswith('"')
+    assert "max-age" in response.headers["cache-control"]
+
+    response = await client.get(url, headers={**IDENTITY, "If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.content == b""
+    assert response.headers["etag"] == etag
+
+    response = await client.get(url, headers={**IDENTITY, "If-None-Match": f'"other", W/{etag}'})
+    assert response.status_code == 304
+    response = await client.get(url, headers={**IDENTITY, "If-None-Match": "*"})
+    assert response.status_code == 304
+
+
+async def test_etag_changes_after_an_update(client, create_couple):
+    session_id, wedding = await create_couple("etag-update", custom_url="etag-update")
+    urls = [f"/api/wedding/public/{wedding['id']}", "/api/wedding/public/custom/etag-update"]
+    etags = [(await client.get(url, headers=IDENTITY)).headers["etag"] for url in urls]
+
+    response = await client.patch("/api/wedding", json={"session_id": session_id, "venue_name": "Old Mill"})
+    assert response.status_code == 200
+
+    for url, etag in zip(urls, etags):
+        response = await client.get(url, headers={**IDENTITY, "If-None-Match": etag})
+        assert response.status_code == 200
+        assert response.headers["etag"] != etag
+        assert response.json()["venue_name"] == "Old Mill"
+
+
+async def test_fields_selection_has_its_own_etag(client, create_couple):
+    _, wedding = await create_couple("etag-fields")
+    url = f"/api/wedding/public/{wedding['id']}"
+
+    full = await client.get(url, headers=IDENTITY)
+    partial = await client.get(url, params={"fields": "couple_name_1"}, headers=IDENTITY)
+
+    assert partial.json() == {"id": wedding["id"], "couple_name_1": "Emma"}
+    assert partial.headers["etag"] != full.headers["etag"]
@@ -0,0 +1,105 @@
+import anyio
+import pytest
+
+import server
+
+pytestmark = pytest.mark.anyio
+
+
+def rsvp(doc_id, **fields):
+    return {"id": doc_id, "wedding_id": "w1", "created_at": doc_id, **fields}
+
+
+class Writer:
+    """Records the batches it is given; can be made slow or failing."""
+
+    def __init__(self, delay=0.0, fail=0):
+        self.delay = delay
+        self.fail = fail
+        self.batches = []
+
+    async def __call__(self, batch):
+        await anyio.sleep(self.delay)
+        if self.fail:
+            self.fail -= 1
+            raise RuntimeError("write failed")
+        self.batches.append([doc["id"] for doc in batch])
+
+    @property
+    def written(self):
+        return sorted(doc_id for batch in self.batches for doc_id in batch)
+
+
+async def test_resubmissions_are_coalesced():
+    writer = Writer()
+    buffer = server.RsvpWriteBuffer(batch_size=10, interval=60, max_pending=2, writer=writer)
+
+    assert buffer.submit(rsvp("a", attendance="yes"))
+    assert buffer.submit(rsvp("a", attendance="no", created_at="later"))
+    assert buffer.submit(rsvp("b"))
+    assert not buffer.submit(rsvp("c"))
+    await buffer.close()
+
+    assert writer.written == ["a", "b"]
+    assert (buffer.coalesced, buffer.rejected) == (1, 1)
+
+
+async def test_failed_batch_is_retried():
+    writer = Writer(fail=1)
+    buffer = server.RsvpWriteBuffer(batch_size=2, interval=60, max_pending=10, writer=writer)
+    for doc_id in "abc":
+        buffer.submit(rsvp(doc_id))
+
+    await buffer.flush()
+    assert writer.written == []
+    assert buffer.stats()["pending"] == 3
+
+    await buffer.close()
+    assert writer.written == ["a", "b", "c"]
+    assert buffer.failures == 1
+
+
+async def test_close_finishes_the_batch_being_written():
+    writer = Writer(delay=0.1)
+    buffer = server.RsvpWriteBuffer(batch_size=2, interval=60, max_pending=10, writer=writer)
+    for doc_id in "abcde":
+        buffer.submit(rsvp(doc_id))
+    await anyio.sleep(0.02)
+    assert buffer.stats()["pending"] == 3  # the first batch is being written
+
+    await buffer.close()
+
+    assert writer.written == ["a", "b", "c", "d", "e"]
+    assert buffer.stats()["pending"] == 0
+
+
+async def test_cancelled_flush_puts_the_batch_back():
+    writer = Writer(delay=10)
+    buffer = server.RsvpWriteBuffer(batch_size=2, interval=60, max_pending=10, writer=writer)
+    for doc_id in "ab":
+        buffer.submit(rsvp(doc_id))
+
+    with anyio.move_on_after(0.05):
+        await buffer.flush()
+
+    assert buffer.stats()["pending"] == 2
+    writer.delay = 0
+    await buffer.close()
+    assert writer.written == ["a", "b"]
+
+
+async def test_full_buffer_answers_503(client, create_couple, monkeypatch):
+    _, wedding = await create_couple("rsvp-full")
+    buffer = server.RsvpWriteBuffer(batch_size=10, interval=60, max_pending=1, writer=Writer())
+    monkeypatch.setattr(server, "rsvp_buffer", buffer)
+    url = f"/api/wedding/{wedding['id']}/rsvp"
+
+    first = await client.post(url, json={"name": "Ann", "attendance": "yes"})
+    again = await client.post(url, json={"name": "Ann", "attendance": "no"})
+    other = await client.post(url, json={"name": "Bob", "attendance": "yes"})
+
+    assert first.status_code == again.status_code == 202
+    assert first.json()["id"] == again.json()["id"]
+    assert other.status_code == 503
+    assert other.headers["retry-after"] == "1"
+    await buffer.close()
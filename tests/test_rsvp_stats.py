@@ -0,0 +1,72 @@
+import pytest
+from typer.testing import CliRunner
+
+import manage
+import server
+
+
+async def submit(client, wedding_id, **rsvp):
+    response = await client.post(f"/api/wedding/{wedding_id}/rsvp", json=rsvp)
+    assert response.status_code == 202, response.text
+
+
+@pytest.mark.anyio
+async def test_stats_follow_changed_answers(client, create_couple):
+    session_id, wedding = await create_couple("stats-couple")
+    response = await client.get("/api/wedding/stats", params={"session_id": session_id})
+    assert response.json()["responses"] == 0
+
+    await submit(client, wedding["id"], name="Ann", attendance="yes", guests=2, meal_choice="Fish")
+    await submit(client, wedding["id"], name="Bob", attendance="yes", meal_choice="Vegan")
+    await submit(client, wedding["id"], name="Cy", attendance="no")
+    await server.rsvp_buffer.flush()
+    # Bob changes his mind after his first answer was written
+    await submit(client, wedding["id"], name="Bob", attendance="no")
+    await server.rsvp_buffer.flush()
+
+    response = await client.get("/api/wedding/stats", params={"session_id": session_id})
+
+    stats = response.json()
+    assert {field: stats[field] for field in server.RSVP_STAT_FIELDS} == {
+        "responses": 3, "attending": 1, "declined": 2, "guests": 2, "plus_ones": 1,
+    }
+    assert stats["meals"] == {"fish": 1}
+
+
+def test_rebuild_command_recounts_the_json_stats(json_backend):
+    for name, attendance, guests in [("ann", "yes", 3), ("bob", "no", 1)]:
+        server.rsvps_store.put({"id": f"r-{name}", "wedding_id": "w1", "attendance": attendance,
+                                "guests": guests, "meal_choice": None})
+    server.rsvp_stats_store.put(server.rsvp_stats_doc("w1", server.Counter(responses=7), None))
+    server.rsvp_stats_store.put(server.rsvp_stats_doc("w2", server.Counter(responses=1), None))
+
+    result = CliRunner().invoke(manage.cli, ["rebuild-rsvp-stats"])
+
+    assert result.exit_code == 0, result.output
+    assert "json: 1 wedding(s) with RSVPs" in result.output
+    stats = server.JsonStore(server.rsvp_stats_store.path)
+    assert {field: stats.get("w1")[field] for field in server.RSVP_STAT_FIELDS} == {
+        "responses": 2, "attending": 1, "declined": 1, "guests": 3, "plus_ones": 2,
+    }
+    assert stats.get("w2")["responses"] == 0
+
+
+@pytest.mark.anyio
+async def test_rebuild_in_mongo_limits_to_the_given_weddings(backend):
+    if not backend.mongo_available():
+        pytest.skip("Mongo only")
+    await server.db.rsvps.insert_many([
+        {"id": "r1", "wedding_id": "w1", "attendance": "yes", "guests": 1, "meal_choice": "fish"},
+        {"id": "r2", "wedding_id": "w2", "attendance": "yes", "guests": 1},
+    ])
+    await server.db.rsvp_stats.insert_many([
+        server.rsvp_stats_doc("w1", server.Counter(responses=5), None),
+        server.rsvp_stats_doc("w2", server.Counter(responses=5), None),
+        server.rsvp_stats_doc("w3", server.Counter(responses=5), None),
+    ])
+
+    assert await server.rebuild_rsvp_stats_in_mongo({"w1", "w3"}) == 1
+
+    assert (await server.get_rsvp_stats_from_db("w1"))["meals"] == {"fish": 1}
+    assert (await server.get_rsvp_stats_from_db("w2"))["responses"] == 5
+    assert await server.get_rsvp_stats_from_db("w3") is None
@@ -0,0 +1,138 @@
+import pytest
+
+import server
+
+from .conftest import WEDDING
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.mark.parametrize("value, slug", [
+    ("emma-james", "emma-james"),
+    ("Emma & James", "emma-james"),
+    ("  Émma  and  Jämes!  ", "emma-and-james"),
+    ("--2026__wedding--", "2026-wedding"),
+    ("日本", ""),
+])
+def test_normalize_slug(value, slug):
+    assert server.normalize_slug(value) == slug
+
+
+def test_slug_problem():
+    assert server.slug_problem("emma-james") is None
+    assert "at least" in server.slug_problem("ab")
+    assert "at most" in server.slug_problem("a" * 64)
+    assert server.slug_problem("login") == "is reserved"
+
+
+async def test_custom_url_is_normalized_and_claimed(client, create_couple):
+    _, wedding = await create_couple("slug-owner", custom_url="Émma & James")
+    assert wedding["custom_url"] == "emma-james"
+
+    response = await client.get("/api/custom-url/available", params={"slug": "EMMA-James"})
+    assert response.json() == {"slug": "emma-james", "available": False, "reason": "is already taken"}
+    response = await client.get("/api/custom-url/available", params={"slug": "Tom & Ann"})
+    assert response.json() == {"slug": "tom-ann", "available": True}
+    response = await client.get("/api/custom-url/available", params={"slug": "admin"})
+    assert response.json()["reason"] == "is reserved"
+
+    session_id, _ = await create_couple("slug-rival")
+    response = await client.patch("/api/wedding", json={"session_id": session_id, "custom_url": "emma james"})
+    assert response.status_code == 409
+
+
+@pytest.mark.parametrize("custom_url, status_code", [
+    ("settings", 422),
+    ("x", 422),
+    (123, 422),
+    (["emma-james"], 422),
+])
+async def test_invalid_custom_url_is_rejected(client, create_couple, custom_url, status_code):
+    session_id, _ = await create_couple("slug-invalid")
+
+    for method in ("put", "patch"):
+        response = await client.request(method.upper(), "/api/wedding",
+                                         json={"session_id": session_id, "custom_url": custom_url})
+        assert response.status_code == status_code
+
+
+async def test_renamed_slug_redirects_to_the_new_one(client, create_couple):
+    session_id, wedding = await create_couple("slug-rename", custom_url="emma-james")
+    response = await client.put("/api/wedding", json={"session_id": session_id, "custom_url": "emma-and-james"})
+    assert response.status_code == 200
+
+    response = await client.get("/api/wedding/public/custom/emma-james", params={"fields": "id"})
+    assert response.status_code == 308
+    assert response.headers["location"] == "/api/wedding/public/custom/emma-and-james?fields=id"
+
+    response = await client.get("/api/wedding/public/custom/Emma-And-James")
+    assert response.status_code == 308
+    assert response.headers["location"] == "/api/wedding/public/custom/emma-and-james"
+
+    response = await client.get("/api/wedding/public/custom/emma-and-james")
+    assert response.status_code == 200
+    assert response.json()["id"] == wedding["id"]
+
+    # The old slug stays reserved for the redirect
+    rival_session, _ = await create_couple("slug-rename-rival")
+    response = await client.patch("/api/wedding", json={"session_id": rival_session, "custom_url": "emma-james"})
+    assert response.status_code == 409
+
+
+async def test_oldest_aliases_are_released(client, create_couple, monkeypatch):
+    monkeypatch.setattr(server, "SLUG_MAX_ALIASES", 2)
+    session_id, wedding = await create_couple("slug-aliases", custom_url="name-0")
+    for i in range(1, 4):
+        response = await client.patch("/api/wedding", json={"session_id": session_id, "custom_url": f"name-{i}"})
+        assert response.status_code == 200
+
+    aliases = await server.get_wedding_aliases_from_db(wedding["id"])
+    assert [alias["id"] for alias in aliases] == ["name-2", "name-1"]
+    response = await client.get("/api/custom-url/available", params={"slug": "name-0"})
+    assert response.json()["available"]
+
+
+async def test_own_slugs_are_available_to_their_owner(client, create_couple):
+    session_id, _ = await create_couple("slug-own", custom_url="emma-james")
+    await client.patch("/api/wedding", json={"session_id": session_id, "custom_url": "emma-and-james"})
+    rival_session, _ = await create_couple("slug-own-rival")
+
+    for slug in ("emma-james", "emma-and-james"):
+        response = await client.get("/api/custom-url/available", params={"slug": slug, "session_id": session_id})
+        assert response.json() == {"slug": slug, "available": True}
+        response = await client.get("/api/custom-url/available",
+                                    params={"slug": slug, "session_id": rival_session})
+        assert response.json()["available"] is False
+
+    response = await client.get("/api/custom-url/available", params={"slug": "emma-james", "session_id": "bad"})
+    assert response.status_code == 401
+
+
+async def test_failed_create_releases_the_slug(client, monkeypatch):
+    response = await client.post("/api/auth/register", json={"username": "slug-create", "password": "pw"})
+    session_id = response.json()["session_id"]
+
+    # Invalid documents are rejected before the slug is claimed
+    response = await client.post("/api/wedding", json={"session_id": session_id, "custom_url": "emma-james"})
+    assert response.status_code == 422
+    assert "emma-james" not in server.slug_set
+
+    async def failing_create(wedding_data):
+        raise RuntimeError("disk full")
+
+    with monkeypatch.context() as patched, pytest.raises(RuntimeError):
+        patched.setattr(server, "create_wedding_in_db", failing_create)
+        await client.post("/api/wedding", json={"session_id": session_id, **WEDDING, "custom_url": "emma-james"})
+
+    response = await client.get("/api/custom-url/available", params={"slug": "emma-james"})
+    assert response.json()["available"]
+    response = await client.post("/api/wedding", json={"session_id": session_id, **WEDDING,
+                                                       "custom_url": "emma-james"})
+    assert response.status_code == 200
+    assert response.json()["custom_url"] == "emma-james"
+
+    # A second wedding for the same user does not keep its slug either
+    response = await client.post("/api/wedding", json={"session_id": session_id, **WEDDING,
+                                                       "custom_url": "tom-ann"})
+    assert response.status_code == 409
+    assert "tom-ann" not in server.slug_set
@@ -0,0 +1,112 @@
+import anyio
+import pytest
+
+import server
+
+pytestmark = pytest.mark.anyio
+
+
+class Payload:
+    def __init__(self, wedding_id):
+        self.id = wedding_id
+
+
+def loader_for(wedding_id, calls):
+    async def load():
+        calls.append(wedding_id)
+        return Payload(wedding_id)
+
+    return load
+
+
+async def test_hits_after_first_load():
+    cache = server.WeddingCache(max_entries=10, ttl_seconds=60)
+    calls = []
+
+    first = await cache.get_or_load(("id", "w1", None), loader_for("w1", calls))
+    second = await cache.get_or_load(("id", "w1", None), loader_for("w1", calls))
+
+    assert first is second
+    assert calls == ["w1"]
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+async def test_entries_expire_after_ttl():
+    cache = server.WeddingCache(max_entries=10, ttl_seconds=0.05)
+    calls = []
+
+    await cache.get_or_load(("id", "w1", None), loader_for("w1", calls))
+    await anyio.sleep(0.1)
+    await cache.get_or_load(("id", "w1", None), loader_for("w1", calls))
+
+    assert calls == ["w1", "w1"]
+    assert cache.expirations == 1
+
+
+async def test_least_recently_used_entry_is_evicted():
+    cache = server.WeddingCache(max_entries=2, ttl_seconds=60)
+    calls = []
+
+    await cache.get_or_load(("id", "a", None), loader_for("a", calls))
+    await cache.get_or_load(("id", "b", None), loader_for("b", calls))
+    await cache.get_or_load(("id", "a", None), loader_for("a", calls))
+    await cache.get_or_load(("id", "c", None), loader_for("c", calls))
+    await cache.get_or_load(("id", "a", None), loader_for("a", calls))
+    await cache.get_or_load(("id", "b", None), loader_for("b", calls))
+
+    assert calls == ["a", "b", "c", "b"]
+    assert cache.evictions == 2
+
+
+async def test_invalidate_drops_every_key_of_the_wedding():
+    cache = server.WeddingCache(max_entries=10, ttl_seconds=60)
+    calls = []
+    keys = [("id", "w1", None), ("custom_url", "emma-james", None), ("id", "w1", ("id", "custom_url"))]
+    for key in keys:
+        await cache.get_or_load(key, loader_for("w1", calls))
+    await cache.get_or_load(("id", "w2", None), loader_for("w2", calls))
+
+    cache.invalidate("w1")
+    for key in keys:
+        await cache.get_or_load(key, loader_for("w1", calls))
+    await cache.get_or_load(("id", "w2", None), loader_for("w2", calls))
+
+    assert calls.count("w1") == 6
+    assert calls.count("w2") == 1
+
+
+async def test_concurrent_misses_share_one_load():
+    cache = server.WeddingCache(max_entries=10, ttl_seconds=60)
+    calls = []
+    results = []
+
+    async def slow_load():
+        calls.append("w1")
+        await anyio.sleep(0.05)
+        return Payload("w1")
+
+    async def get():
+        results.append(await cache.get_or_load(("id", "w1", None), slow_load))
+
+    async with anyio.create_task_group() as tg:
+        for _ in range(5):
+            tg.start_soon(get)
+
+    assert calls == ["w1"]
+    assert len({id(result) for result in results}) == 1
+    assert cache.coalesced == 4
+
+
+async def test_load_overlapping_an_invalidation_is_not_cached():
+    cache = server.WeddingCache(max_entries=10, ttl_seconds=60)
+    calls = []
+
+    async def load_during_save():
+        calls.append("w1")
+        cache.invalidate("w1")
+        return Payload("w1")
+
+    await cache.get_or_load(("id", "w1", None), load_during_save)
+    await cache.get_or_load(("id", "w1", None), loader_for("w1", calls))
+
+    assert calls == ["w1", "w1"]
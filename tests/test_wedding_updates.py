@@ -0,0 +1,148 @@
+import anyio
+import pytest
+
+from .conftest import WEDDING
+
+pytestmark = pytest.mark.anyio
+
+
+async def patch(client, session_id, **body):
+    return await client.patch("/api/wedding", json={"session_id": session_id, **body})
+
+
+async def test_patch_sets_only_the_given_fields(client, create_couple):
+    session_id, wedding = await create_couple("patch-fields", theme="garden")
+
+    response = await patch(client, session_id, venue_name="Old Mill")
+
+    assert response.status_code == 200
+    patched = response.json()
+    assert patched["venue_name"] == "Old Mill"
+    assert patched["theme"] == "garden"
+    assert patched["version"] == wedding["version"] + 1
+
+
+async def test_patch_ops(client, create_couple):
+    session_id, _ = await create_couple("patch-ops", faqs=[{"q": "Parking?", "a": "Yes"}],
+                                        honeymoon_fund={"goal": 1000})
+
+    response = await patch(client, session_id, ops=[
+        {"op": "add", "path": "/faqs/-", "value": {"q": "Kids?", "a": "Welcome"}},
+        {"op": "add", "path": "/gallery_photos/-", "value": "https://example.com/a.jpg"},
+        {"op": "replace", "path": "/theme", "value": "modern"},
+        {"op": "remove", "path": "/honeymoon_fund"},
+    ])
+    assert response.status_code == 200, response.text
+    wedding = response.json()
+    assert [faq["q"] for faq in wedding["faqs"]] == ["Parking?", "Kids?"]
+    assert wedding["gallery_photos"] == ["https://example.com/a.jpg"]
+    assert wedding["theme"] == "modern"
+    assert wedding["honeymoon_fund"] is None
+
+    response = await patch(client, session_id, ops=[{"op": "pull", "path": "/faqs", "value": {"q": "Parking?"}}])
+    assert response.status_code == 200
+    assert [faq["q"] for faq in response.json()["faqs"]] == ["Kids?"]
+
+
+@pytest.mark.parametrize("ops, status_code", [
+    ([{"op": "replace", "path": "/not_a_field", "value": 1}], 422),
+    ([{"op": "replace", "path": "/user_id", "value": "someone-else"}], 422),
+    ([{"op": "replace", "path": "/schedule_events", "value": "not a list"}], 422),
+    ([{"op": "add", "path": "/theme/-", "value": "x"}], 422),
+    ([{"op": "remove", "path": "/couple_name_1"}], 422),
+    ([{"op": "move", "path": "/theme"}], 400),
+    ([{"op": "replace", "path": "/faqs", "value": []}, {"op": "add", "path": "/faqs/-", "value": {}}], 400),
+    ([], 400),
+])
+async def test_invalid_patch_ops_are_rejected(client, create_couple, ops, status_code):
+    session_id, wedding = await create_couple("patch-invalid")
+
+    response = await patch(client, session_id, ops=ops)
+
+    assert response.status_code == status_code
+    response = await client.get("/api/wedding", params={"session_id": session_id})
+    assert response.json()["version"] == wedding["version"]
+
+
+async def test_stale_version_is_a_conflict(backend, client, create_couple):
+    if backend.mongo_available():
+        pytest.skip("mongomock matches the query again after find_one_and_update and returns None")
+    session_id, wedding = await create_couple("patch-version")
+
+    response = await patch(client, session_id, theme="modern", version=wedding["version"])
+    assert response.status_code == 200
+    response = await patch(client, session_id, theme="rustic", version=wedding["version"])
+
+    assert response.status_code == 409
+    assert response.json()["detail"]["current_version"] == wedding["version"] + 1
+
+
+async def test_concurrent_creates_make_one_wedding(client):
+    response = await client.post("/api/auth/register", json={"username": "create-race", "password": "pw"})
+    session_id = response.json()["session_id"]
+    responses = []
+
+    async def create():
+        responses.append(await client.post("/api/wedding", json={"session_id": session_id, **WEDDING}))
+
+    async with anyio.create_task_group() as tg:
+        for _ in range(5):
+            tg.start_soon(create)
+
+    assert sorted(response.status_code for response in responses) == [200, 409, 409, 409, 409]
+    (created,) = [response.json() for response in responses if response.status_code == 200]
+    response = await client.get("/api/wedding", params={"session_id": session_id})
+    assert response.json()["id"] == created["id"]
+
+
+async def test_concurrent_updates_are_not_lost(client, create_couple):
+    session_id, wedding = await create_couple("update-race")
+
+    async def add_faq(i):
+        response = await patch(client, session_id, ops=[{"op": "add", "path": "/faqs/-", "value": {"q": f"Q{i}"}}])
+        assert response.status_code == 200
+
+    async def put_venue():
+        response = await client.put("/api/wedding", json={"session_id": session_id, "venue_name": "Old Mill"})
+        assert response.status_code == 200
+
+    async with anyio.create_task_group() as tg:
+        for i in range(10):
+            tg.start_soon(add_faq, i)
+        tg.start_soon(put_venue)
+
+    response = await client.get("/api/wedding", params={"session_id": session_id})
+    stored = response.json()
+    assert sorted(faq["q"] for faq in stored["faqs"]) == sorted(f"Q{i}" for i in range(10))
+    assert stored["venue_name"] == "Old Mill"
+    assert stored["version"] == wedding["version"] + 11
+
+
+async def test_put_keeps_server_owned_fields(client, create_couple):
+    session_id, wedding = await create_couple("put-owned")
+
+    resent = {k: v for k, v in wedding.items() if k != "version"}
+    response = await client.put("/api/wedding", json={
+        **resent, "session_id": session_id, "user_id": "someone-else", "id": "other-id", "theme": "modern",
+    })
+
+    assert response.status_code == 200, response.text
+    updated = response.json()
+    assert (updated["id"], updated["user_id"]) == (wedding["id"], wedding["user_id"])
+    assert updated["theme"] == "modern"
+
+
+@pytest.mark.parametrize("field, value", [
+    ("not_a_field", 1),
+    ("$where", "1"),
+    ("faqs.0", {}),
+    ("schedule_events", "not a list"),
+])
+async def test_put_rejects_unknown_fields(client, create_couple, field, value):
+    session_id, wedding = await create_couple("put-invalid")
+
+    response = await client.put("/api/wedding", json={"session_id": session_id, field: value})
+
+    assert response.status_code == 422
+    response = await client.get("/api/wedding", params={"session_id": session_id})
+    assert response.json()["version"] == wedding["version"]